@@ -1,112 +1,79 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import datetime
 import logging
 import sys
 import os
-import re
 import django
 import nltk
-import json  # Utilisé pour stocker les positions en JSON
-from django.db import transaction, connection
-from collections import Counter
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 
 # Configurer Django
 logging.basicConfig(level=logging.INFO)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mygutenberg.settings')
 django.setup()
-from book.models import Book, Index
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from book.indexing import BATCH_SIZE, books_to_index, index_books, remove_stale_books
+from book.segments import update_segments
+from book.statistics import update_term_statistics
+from book.cache import bump_index_generation
+from book.minhash import update_signatures
+from book.trigram import TrigramIndex, trigram_index_path
+
+# Date de --since : "2025-02-01" ou "2025-02-01T03:00:00"
+def parse_since(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise argparse.ArgumentTypeError(f"Date invalide : {value}")
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
 
-# Télécharger les ressources nécessaires
-nltk.download('stopwords')
-nltk.download('punkt')
-
-# Mappage des codes de langue aux stopwords NLTK
-LANGUAGE_MAPPING = {
-    'en': 'english',
-    'fr': 'french',
-    'es': 'spanish',
-    'de': 'german',
-    'it': 'italian',
-}
-
-# Fonction pour charger les stopwords en fonction de la langue
-def load_stopwords(language):
-    try:
-        nltk_language = LANGUAGE_MAPPING.get(language, 'english')
-        return set(stopwords.words(nltk_language)) if nltk_language in stopwords.fileids() else set()
-    except Exception:
-        return set(stopwords.words('english'))
-
-# Extraction des mots et de leurs positions SANS nettoyer le texte
-def extract_words_with_positions(text, language='english'):
-    stop_words = load_stopwords(language)
-    word_positions = {}
-    
-    for match in re.finditer(r'\b\w+\b', text):  # Trouver chaque mot et sa position
-        word = match.group().lower()  # Convertir le mot en minuscules
-        pos = match.start()  # Position en caractères
-        
-        if word not in stop_words:
-            if word not in word_positions:
-                word_positions[word] = []
-            word_positions[word].append(pos) 
-    
-    return word_positions
-
-
-# Fonction pour indexer un livre
-def index_book(book):
-    try:
-        if not book.text_content:
-            logging.warning(f"Aucun texte pour le livre {book.title} (ID: {book.id})")
-            return
-
-        language = book.language.split(',')[0].strip().lower()
-        logging.info(f"Langue détectée pour le livre '{book.title}': {language}")
-
-        # Extraire les mots et leurs positions
-        word_positions_map = extract_words_with_positions(book.text_content, language)
-
-        # Créer les entrées pour l'index
-        index_entries = [
-            Index(
-                word=word,
-                book=book,
-                occurrences_count=len(positions),
-                positions=positions  # Stocker les positions sous forme de liste
-            )
-            for word, positions in word_positions_map.items()
-        ]
-
-        with transaction.atomic():
-            Index.objects.bulk_create(index_entries, ignore_conflicts=True)
-
-        connection.close()
-        logging.info(f"Indexation du livre '{book.title}' (ID: {book.id}) terminée.")
-
-    except Exception as e:
-        logging.error(f"Erreur lors de l'indexation du livre {book.title} (ID: {book.id}): {e}")
-        
-        
-# Fonction principale pour indexer les livres en parallèle
-def index_books_concurrently():
-    logging.info("Début de l'indexation des livres...")
-
-    books_to_index = Book.objects.filter(text_content__isnull=False)
-
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        future_to_book = {executor.submit(index_book, book): book for book in books_to_index}
-
-        for future in as_completed(future_to_book):
-            book = future_to_book[future]
-            try:
-                future.result()
-            except Exception as exc:
-                logging.error(f"Erreur lors de l'indexation du livre {book.title} (ID: {book.id}): {exc}")
-    
-    logging.info("Indexation des livres terminée.")
 
 if __name__ == "__main__":
-    index_books_concurrently()
+    parser = argparse.ArgumentParser(description="Indexation des livres.")
+    parser.add_argument("--segments", action="store_true",
+                        help="Écrit aussi un segment d'index dans SEARCH_SEGMENTS_DIR.")
+    parser.add_argument("--segments-dir", default=getattr(settings, "SEARCH_SEGMENTS_DIR", None))
+    parser.add_argument("--trigrams", action="store_true",
+                        help="Construit l'index de trigrammes utilisé par la recherche par regex "
+                             "(reconstruit ensuite à chaque indexation).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Nombre de processus de tokenisation (par défaut : nombre de CPU).")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Nombre de livres écrits par lot.")
+    parser.add_argument("--since", type=parse_since,
+                        help="Ne considère que les livres modifiés depuis cette date.")
+    parser.add_argument("--book-ids", type=int, nargs="+", help="Ne considère que ces livres.")
+    parser.add_argument("--force", action="store_true",
+                        help="Réindexe même les livres dont le texte et la version d'analyse n'ont pas changé.")
+    parser.add_argument("--minhash", action="store_true",
+                        help="Recalcule seulement les signatures MinHash depuis la table Index (sans réindexer).")
+    parser.add_argument("--merge-threshold", type=int, default=getattr(settings, "SEARCH_SEGMENTS_MERGE_THRESHOLD", 8),
+                        help="Nombre de segments à partir duquel ils sont fusionnés.")
+    args = parser.parse_args()
+
+    # Télécharger les ressources nécessaires
+    nltk.download('stopwords')
+
+    if args.minhash:
+        logging.info(f"{update_signatures()} signatures MinHash recalculées.")
+        sys.exit(0)
+
+    removed_ids = remove_stale_books()
+    books = books_to_index(since=args.since, book_ids=args.book_ids)
+    indexed_ids = index_books(books, workers=args.workers, batch_size=args.batch_size, force=args.force)
+    if indexed_ids or removed_ids:
+        update_term_statistics()
+    if args.segments:
+        update_segments(indexed_ids, removed_ids, args.segments_dir, args.merge_threshold)
+    # Un index de trigrammes existant est reconstruit avec les textes ajoutés ou modifiés
+    trigram_path = trigram_index_path()
+    if args.trigrams or (trigram_path and os.path.exists(trigram_path) and (indexed_ids or removed_ids)):
+        logging.info("Construction de l'index de trigrammes...")
+        TrigramIndex.from_books().save(trigram_path)
+    if indexed_ids or removed_ids or args.trigrams:
+        # Les résultats de recherche en cache sont périmés
+        logging.info(f"Génération de l'index : {bump_index_generation()}.")
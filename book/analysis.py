@@ -0,0 +1,172 @@
+"""Analyse des textes, identique à l'indexation et dans les requêtes.
+
+Chaîne d'une langue (`Analyzer`) : découpage en mots (`WORD_PATTERN`),
+minuscules, retrait des stopwords NLTK, puis racinisation Snowball
+("running" et "runs" deviennent "run"). Les analyseurs sont construits une
+fois par processus et par langue (`get_analyzer`) ; chacun garde en cache
+les racines déjà calculées. Une langue sans stemmer Snowball n'est pas
+racinisée. Un livre en plusieurs langues est analysé dans chacune : un
+mot vide dans l'une d'elles est ignoré, les autres mots sont indexés sous
+chacune de leurs racines.
+"""
+import logging
+import re
+from collections import Counter
+from functools import lru_cache
+from nltk.corpus import stopwords
+from nltk.stem.snowball import SnowballStemmer
+
+# Mappage des codes de langue aux stopwords et stemmers NLTK
+LANGUAGE_MAPPING = {
+    'en': 'english',
+    'fr': 'french',
+    'es': 'spanish',
+    'de': 'german',
+    'it': 'italian',
+    'pt': 'portuguese',
+    'nl': 'dutch',
+    'sv': 'swedish',
+    'da': 'danish',
+    'no': 'norwegian',
+    'fi': 'finnish',
+    'hu': 'hungarian',
+    'ro': 'romanian',
+    'ru': 'russian',
+}
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+# Racines gardées en cache par analyseur (le vocabulaire d'un corpus tient largement dedans)
+STEM_CACHE_SIZE = 500000
+
+
+# Fonction pour charger les stopwords en fonction de la langue (lus une fois par processus)
+@lru_cache(maxsize=None)
+def load_stopwords(language):
+    try:
+        nltk_language = LANGUAGE_MAPPING.get(language, 'english')
+        return frozenset(stopwords.words(nltk_language)) if nltk_language in stopwords.fileids() else frozenset()
+    except LookupError:
+        # Corpus NLTK absent (ex. serveur web sans `nltk.download('stopwords')`)
+        logging.warning("Stopwords NLTK indisponibles : aucun mot n'est filtré.")
+        return frozenset()
+    except Exception:
+        return frozenset(stopwords.words('english'))
+
+
+class Analyzer:
+    """Chaîne d'analyse d'une langue : minuscules, stopwords, racinisation Snowball."""
+
+    def __init__(self, language):
+        self.language = language
+        self.stop_words = load_stopwords(language)
+        nltk_language = LANGUAGE_MAPPING.get(language)
+        self.stem = SnowballStemmer(nltk_language).stem if nltk_language in SnowballStemmer.languages else str
+        # Mot en minuscules -> terme (None pour un stopword)
+        self._terms = {}
+
+    def term(self, word):
+        """Terme indexé d'un mot (en minuscules), ou None pour un stopword."""
+        try:
+            return self._terms[word]
+        except KeyError:
+            pass
+        if len(self._terms) >= STEM_CACHE_SIZE:
+            self._terms.clear()
+        term = self._terms[word] = None if word in self.stop_words else self.stem(word)
+        return term
+
+    def terms(self, text):
+        """Termes indexés d'un texte avec leur rang : `[(terme, rang)]` (les stopwords comptent dans les rangs)."""
+        terms = ((self.term(match.group().lower()), rank) for rank, match in enumerate(WORD_PATTERN.finditer(text)))
+        return [(term, rank) for term, rank in terms if term]
+
+
+@lru_cache(maxsize=None)
+def get_analyzer(language):
+    """Analyseur partagé par tout le processus pour un code de langue (ex. 'en')."""
+    return Analyzer(language)
+
+
+# Extraction des mots et de leurs positions SANS nettoyer le texte
+def extract_words_with_positions(text, language='en'):
+    """Mots indexés et leurs positions : `({mot: [rangs]}, offsets)`.
+
+    La position d'un mot est son rang dans le texte (stopwords compris, qui
+    ne sont pas indexés) ; `offsets[rang]` est l'offset en caractères du mot.
+    `language` est un code de langue ou la liste des langues du livre.
+    """
+    languages = [language] if isinstance(language, str) else list(dict.fromkeys(language)) or ['en']
+    if len(languages) > 1:
+        return _extract_multilingual(text, [get_analyzer(code) for code in languages])
+    analyzer = get_analyzer(languages[0])
+    known_terms = analyzer._terms
+    word_positions = {}
+    offsets = []
+
+    for match in WORD_PATTERN.finditer(text):  # Trouver chaque mot et sa position
+        word = match.group().lower()  # Convertir le mot en minuscules
+        term = known_terms[word] if word in known_terms else analyzer.term(word)  # Racine
+        rank = len(offsets)
+        offsets.append(match.start())  # Position en caractères
+
+        if term:
+            if term not in word_positions:
+                word_positions[term] = []
+            word_positions[term].append(rank)
+
+    return word_positions, offsets
+
+
+def _extract_multilingual(text, analyzers):
+    """Comme `extract_words_with_positions`, chaque mot racinisé dans plusieurs langues."""
+    stop_words = frozenset().union(*(analyzer.stop_words for analyzer in analyzers))
+    word_positions = {}
+    offsets = []
+    for match in WORD_PATTERN.finditer(text):
+        word = match.group().lower()
+        rank = len(offsets)
+        offsets.append(match.start())
+        if word in stop_words:
+            continue
+        for term in {analyzer.term(word) for analyzer in analyzers}:
+            word_positions.setdefault(term, []).append(rank)
+    return word_positions, offsets
+
+
+def book_languages(book):
+    """Codes des langues d'un livre (ex. ['en', 'fr'])."""
+    return language_codes(book.language)
+
+
+def language_codes(language):
+    """Langues d'un champ `Book.language` (ex. 'en, fr' -> ['en', 'fr'])."""
+    return [code.strip().lower() for code in (language or '').split(',') if code.strip()] or ['']
+
+
+def primary_language(language):
+    """Première langue d'un champ `Book.language` (ex. 'en, fr' -> 'en')."""
+    return language_codes(language)[0]
+
+
+def word_forms(text, language='en'):
+    """Mots indexés du texte tels qu'ils s'écrivent (en minuscules) : `{mot: occurrences}`.
+
+    Mêmes mots que `extract_words_with_positions` (stopwords de l'une des
+    langues exclus), mais sans racinisation : base des suggestions.
+    """
+    languages = [language] if isinstance(language, str) else list(dict.fromkeys(language)) or ['en']
+    analyzers = [get_analyzer(code) for code in languages]
+    counts = Counter(word.lower() for word in WORD_PATTERN.findall(text))
+    return {word: count for word, count in counts.items() if all(analyzer.term(word) for analyzer in analyzers)}
+
+
+def analyze_book(book_id, text, language):
+    """Tokenise un livre (exécuté dans un processus du pool d'indexation, sans Django).
+
+    Retourne `(book_id, {mot: rangs}, nombre de mots indexés, taille du texte en octets,
+    offsets des mots en caractères, {forme de surface: occurrences})`.
+    """
+    languages = language_codes(language)
+    word_positions, offsets = extract_words_with_positions(text, languages)
+    token_count = sum(len(positions) for positions in word_positions.values())
+    return book_id, word_positions, token_count, len(text.encode('utf-8')), offsets, word_forms(text, languages)
@@ -0,0 +1,177 @@
+"""Vues de recherche asynchrones pour le déploiement ASGI (`mygutenberg/asgi.py`).
+
+Mêmes paramètres et mêmes réponses que `/books/search/` et
+`/books/advanced-search/`, mais les sous-requêtes indépendantes tournent en
+parallèle : classement BM25 et filtre par auteur pour la recherche, regex
+plein texte et termes du vocabulaire pour la recherche avancée. Le code
+synchrone (index NumPy, ORM) s'exécute dans le pool de threads d'asgiref,
+le filtre par auteur avec l'ORM asynchrone.
+
+Chaque requête a une échéance (`SEARCH_ASYNC_DEADLINE` secondes, ou
+`?deadline=` plus court) : les sous-requêtes encore en cours sont abandonnées
+et la réponse, construite avec les autres, porte `partial: true` et la liste
+`timed_out`. Un thread abandonné termine son calcul en arrière-plan, son
+résultat est ignoré.
+"""
+import asyncio
+import re
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from .book_views import (full_text_matches, get_paginator, index_matches, search_results,
+                         summary_queryset)
+from .inverted_index import get_index
+from .models import Book
+from .query import QuerySyntaxError, is_boolean_query, query_terms, search_query
+from .scoring import RankedResults, bm25_search
+from .serializers import BookSummarySerializer
+
+
+def _call(function, args):
+    try:
+        return function(*args)
+    finally:
+        connections.close_all()  # Connexion ouverte par ce thread du pool
+
+
+def in_thread(function, *args):
+    """Exécute une fonction synchrone dans le pool de threads, en parallèle des autres sous-requêtes."""
+    return sync_to_async(_call, thread_sensitive=False)(function, args)
+
+
+async def run_branches(branches, deadline):
+    """Lance les sous-requêtes `{nom: coroutine}` en parallèle.
+
+    Retourne `({nom: résultat}, [noms des sous-requêtes abandonnées à l'échéance])`.
+    La première exception levée par une sous-requête terminée est propagée.
+    """
+    tasks = {name: asyncio.ensure_future(branch) for name, branch in branches.items()}
+    _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    results, errors = {}, []
+    for name, task in tasks.items():
+        if task in pending:
+            continue
+        if task.exception() is not None:
+            errors.append(task.exception())
+        else:
+            results[name] = task.result()
+    if errors:
+        raise errors[0]
+    return results, sorted(name for name, task in tasks.items() if task in pending)
+
+
+def request_deadline(request):
+    """Échéance de la requête en secondes : `?deadline=`, au plus `SEARCH_ASYNC_DEADLINE`."""
+    maximum = getattr(settings, "SEARCH_ASYNC_DEADLINE", 2.0)
+    try:
+        return min(float(request.GET.get("deadline", maximum)), maximum)
+    except ValueError:
+        return maximum
+
+
+async def author_book_ids(author):
+    return {book_id async for book_id in Book.objects.filter(authors__name__icontains=author)
+            .values_list("id", flat=True)}
+
+
+def paginated(request, scores, build, extra):
+    """Page des résultats classés, sérialisée (exécuté dans le thread des vues synchrones)."""
+    paginator = get_paginator(request)
+    page = paginator.paginate_queryset(RankedResults(scores, summary_queryset(request)), request)
+    data = paginator.get_paginated_response(build(page or [])).data
+    data.update(extra)
+    return data
+
+
+class AsyncSearchView(View):
+    """Base des vues : réponses JSON et erreurs de l'API converties comme dans DRF."""
+
+    async def get(self, request):
+        drf_request = Request(request)
+        try:
+            data, status = await self.search(drf_request)
+        except APIException as e:
+            data, status = {"detail": e.detail}, e.status_code
+        return JsonResponse(data, status=status)
+
+
+class AsyncBookSearchView(AsyncSearchView):
+    """`/books/search/` asynchrone : BM25 et filtre par auteur en parallèle."""
+
+    async def search(self, request):
+        query = request.query_params.get("q", "").strip()
+        author = request.query_params.get("author", "").strip().lower()
+        fuzzy = request.query_params.get("fuzzy", "") in ("1", "true")
+        language = request.query_params.get("lang", "").strip().lower() or None
+        if not query and not author:
+            return {"count": 0, "next": None, "previous": None, "results": []}, 200
+
+        branches = {}
+        if query:
+            index = await sync_to_async(get_index)()
+            if fuzzy or is_boolean_query(query):
+                branches["scores"] = in_thread(search_query, query, index, fuzzy, language)
+            else:
+                # L'analyse lit les langues des livres en base : hors de la boucle d'événements
+                branches["scores"] = in_thread(lambda: bm25_search(query_terms(query, language), index))
+        if author:
+            branches["author"] = author_book_ids(author)
+        try:
+            results, timed_out = await run_branches(branches, request_deadline(request))
+        except QuerySyntaxError as e:
+            return {"detail": str(e)}, 400
+
+        scores, occurrences = results.get("scores", ({}, {}))
+        if author and "author" in results:
+            books_by_author = results["author"]
+            if query:
+                scores = {book_id: score for book_id, score in scores.items() if book_id in books_by_author}
+            else:
+                scores = dict.fromkeys(books_by_author, 0.0)
+        context = {"request": request}
+
+        def build(page):
+            return search_results(page, scores, occurrences,
+                                  lambda *args, **kwargs: BookSummarySerializer(*args, context=context, **kwargs))
+
+        data = await sync_to_async(paginated)(
+            request, scores, build, {"partial": bool(timed_out), "timed_out": timed_out})
+        return data, 200
+
+
+class AsyncBookAdvancedSearchView(AsyncSearchView):
+    """`/books/advanced-search/` asynchrone : regex plein texte et termes du vocabulaire en parallèle."""
+
+    async def search(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return {"detail": "No query provided."}, 400
+        try:
+            re.compile(query)
+        except re.error as e:
+            return {"detail": f"Invalid regex: {e}"}, 400
+        index = await sync_to_async(get_index)()
+        try:
+            results, timed_out = await run_branches({
+                "full_text": in_thread(full_text_matches, query, index),
+                "terms": in_thread(index_matches, query, index),
+            }, request_deadline(request))
+        except re.error as e:
+            return {"detail": f"Invalid regex: {e}"}, 400
+
+        books_by_text, text_partial = results.get("full_text", ([], False))
+        scores, terms_partial = results.get("terms", ({}, False))
+        for book_id in books_by_text:
+            scores.setdefault(book_id, 0.0)
+        context = {"request": request}
+        data = await sync_to_async(paginated)(
+            request, scores, lambda page: BookSummarySerializer(page, many=True, context=context).data,
+            {"partial": bool(timed_out) or text_partial or terms_partial, "timed_out": timed_out})
+        return data, 200
@@ -0,0 +1,333 @@
+"""Benchmarks des recherches : corpus synthétique et rejeu d'un mélange de requêtes.
+
+- `generate_corpus` : livres au vocabulaire de Zipf (les stopwords anglais
+  en tête, puis des mots synthétiques), auteurs et langues, indexés ensuite
+  par le pipeline habituel (`index_books`, statistiques des termes).
+- `load_query_mix` / `generate_query_mix` : requêtes à rejouer, lues dans un
+  fichier JSONL (`{"endpoint": "search", "params": {"q": "..."}, "weight": 2}`)
+  ou tirées du vocabulaire indexé.
+- `run_benchmark` : rejoue le mélange dans le processus avec le client de
+  test Django, et mesure par endpoint la latence (p50 / p95 / p99), le
+  nombre de requêtes SQL et la mémoire allouée (`tracemalloc`, dans une
+  passe séparée pour ne pas fausser les temps). Les réponses hors 2xx
+  sont comptées comme erreurs, sans entrer dans les percentiles.
+
+Les résultats sont du JSON, comparables d'un commit à l'autre (`compare_results`).
+"""
+import datetime
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .analysis import WORD_PATTERN, get_analyzer, load_stopwords, primary_language
+from .cache import reset_result_cache
+from .models import Author, Book, Term, WordForm
+
+# Nom de l'endpoint dans un mélange de requêtes -> nom de l'URL
+ENDPOINTS = {
+    "search": "book-search",
+    "advanced-search": "advanced-search",
+    "highlight-search": "book-highlight-search",
+    "async-search": "async-book-search",
+    "suggest": "book-suggest",
+    "terms": "term-list",
+}
+DEFAULT_MIX = {"search": 60, "highlight-search": 20, "advanced-search": 10, "suggest": 10}
+CONSONANTS = "bcdfghjklmnprstvz"
+VOWELS = "aeiou"
+BATCH_SIZE = 500
+# Livres (et caractères de chacun) dont les mots servent aux requêtes générées
+SAMPLE_BOOKS = 200
+SAMPLE_TEXT_LENGTH = 20000
+
+
+def zipf_vocabulary(size, rng):
+    """Mots du vocabulaire par rang : stopwords anglais (les plus fréquents), puis mots synthétiques."""
+    words = sorted(load_stopwords("en"))[:size]
+    rng.shuffle(words)
+    seen = set(words)
+    while len(words) < size:
+        syllables = int(rng.integers(1, 5))
+        word = "".join(CONSONANTS[i] + VOWELS[j] for i, j in zip(rng.integers(0, len(CONSONANTS), syllables),
+                                                                 rng.integers(0, len(VOWELS), syllables)))
+        if rng.random() < 0.3:
+            word += CONSONANTS[int(rng.integers(0, len(CONSONANTS)))]
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def generate_corpus(books, vocabulary=50000, words_per_book=2000, zipf_exponent=1.1, languages=("en",),
+                    seed=0, progress=None):
+    """Crée `books` livres synthétiques (`words_per_book` mots en moyenne) ; retourne leurs identifiants."""
+    rng = np.random.default_rng(seed)
+    words = np.array(zipf_vocabulary(vocabulary, rng), dtype=object)
+    weights = 1.0 / np.arange(1, vocabulary + 1) ** zipf_exponent
+    cumulative = np.cumsum(weights / weights.sum())
+    names = [f"Synthetic Author {seed}-{i}" for i in range(max(books // 10, 1))]
+    Author.objects.bulk_create([Author(name=name) for name in names], ignore_conflicts=True)
+    author_ids = list(Author.objects.filter(name__in=names).values_list("id", flat=True))
+    Through = Book.authors.through
+    created = []
+    for start in range(0, books, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, books)):
+            length = int(rng.integers(words_per_book // 2, words_per_book * 3 // 2 + 1))
+            tokens = words[np.searchsorted(cumulative, rng.random(length), side="right").clip(max=vocabulary - 1)]
+            batch.append(Book(
+                title=f"Synthetic Book {i}",
+                language=languages[int(rng.integers(0, len(languages)))],
+                text_content=" ".join(tokens.tolist()),
+                download_count=int(rng.zipf(2.0)),
+            ))
+        with transaction.atomic():
+            batch = Book.objects.bulk_create(batch)
+            Through.objects.bulk_create(
+                Through(book_id=book.id, author_id=author_ids[int(rng.integers(0, len(author_ids)))])
+                for book in batch
+            )
+        created.extend(book.id for book in batch)
+        if progress:
+            progress(len(created))
+    return created
+
+
+def load_query_mix(path):
+    """Requêtes d'un fichier JSONL : `{"endpoint", "params" (ou "q"), "weight"}`.
+
+    L'endpoint par défaut est `search` ; sans `params` ni `q`, le titre de la ligne
+    sert de requête (un fichier comme `requests.jsonl` peut donc être rejoué).
+    """
+    mix = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            endpoint = entry.get("endpoint", "search")
+            if endpoint not in ENDPOINTS:
+                raise ValueError(f"{path}:{number} : endpoint inconnu {endpoint!r} ({', '.join(ENDPOINTS)}).")
+            text = entry.get("q") or entry.get("title", "")
+            params = entry.get("params") or {"prefix" if endpoint in ("suggest", "terms") else "q": text}
+            mix.extend([(endpoint, params)] * int(entry.get("weight", 1)))
+    return mix
+
+
+def sample_book_words(rng, books=SAMPLE_BOOKS):
+    """Mots non vides (dans l'ordre du texte) d'un échantillon de livres indexés."""
+    book_ids = list(Book.objects.filter(index_version__gt=0).values_list("id", flat=True))
+    if not book_ids:
+        return []
+    chosen = rng.choice(book_ids, size=min(books, len(book_ids)), replace=False).tolist()
+    samples = []
+    for text, language in Book.objects.filter(id__in=chosen).values_list("text_content", "language"):
+        analyzer = get_analyzer(primary_language(language))
+        words = [word.lower() for word in WORD_PATTERN.findall(text[:SAMPLE_TEXT_LENGTH])]
+        # (mot, le mot suivant du texte est aussi indexé)
+        samples.append([(word, i + 1 < len(words) and analyzer.term(words[i + 1]) is not None)
+                        for i, word in enumerate(words) if analyzer.term(word)])
+    return [words for words in samples if words]
+
+
+def generate_query_mix(count, mix=None, seed=0):
+    """Requêtes tirées des livres indexés, les mots fréquents plus souvent.
+
+    Les mots d'une requête de recherche viennent d'un même livre (expressions :
+    deux mots consécutifs) pour que chaque requête ait des résultats ;
+    suggestions et regex partent des mots du corpus (table `WordForm`).
+    """
+    rng = np.random.default_rng(seed)
+    books = sample_book_words(rng)
+    terms = list(WordForm.objects.filter(language="", document_frequency__gt=1).order_by("-document_frequency")
+                 .values_list("word", "document_frequency")[:20000])
+    if not books or not terms:
+        raise ValueError("Aucun livre indexé : générez et indexez un corpus d'abord.")
+    vocabulary = [word for word, _ in terms]
+    weights = np.sqrt(np.array([frequency for _, frequency in terms], dtype=np.float64))
+    weights /= weights.sum()
+    mix = mix or DEFAULT_MIX
+    endpoints = list(mix)
+    shares = np.array([mix[endpoint] for endpoint in endpoints], dtype=np.float64)
+
+    def term():
+        return vocabulary[int(rng.choice(len(vocabulary), p=weights))]
+
+    def book_words(n):
+        words = books[int(rng.integers(0, len(books)))]
+        return [words[i] for i in rng.choice(len(words), size=min(n, len(words)), replace=False)]
+
+    queries = []
+    for endpoint in rng.choice(endpoints, size=count, p=shares / shares.sum()):
+        endpoint = str(endpoint)
+        if endpoint == "suggest":
+            word = term()
+            params = {"prefix": word[:int(rng.integers(1, min(len(word), 4) + 1))]}
+        elif endpoint == "terms":
+            params = {"prefix": term()[:3]}
+        elif endpoint == "advanced-search":
+            word = term()
+            params = {"q": f"^{word[:3]}.*" if rng.random() < 0.5 else word}
+        elif rng.random() < 0.2:
+            words = books[int(rng.integers(0, len(books)))]
+            starts = [i for i, (_, followed) in enumerate(words) if followed]
+            if starts:
+                i = starts[int(rng.integers(0, len(starts)))]
+                params = {"q": f'"{words[i][0]} {words[i + 1][0]}"'}
+            else:
+                params = {"q": words[0][0]}
+        else:
+            params = {"q": " ".join(dict.fromkeys(word for word, _ in book_words(int(rng.integers(1, 4)))))}
+        queries.append((endpoint, params))
+    return queries
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return {}
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "mean": round(float(values.mean()), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def peak_rss_mb():
+    """Mémoire résidente maximale du processus (Mo)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10, 1)
+
+
+def run_benchmark(queries, repeat=1, warmup=10, memory_sample=20, with_cache=False, pagerank=False,
+                  host="testserver"):
+    """Rejoue les requêtes et retourne le rapport (dictionnaire sérialisable en JSON).
+
+    Les réponses hors 2xx sont comptées comme erreurs et exclues des percentiles.
+    """
+    from .inverted_index import get_index, reset_index
+
+    client = Client(HTTP_HOST=host)
+    run_settings = {"ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, host]}
+    if not with_cache:
+        run_settings.update(SEARCH_CACHE_SIZE=0, SEARCH_CACHE_BACKEND=None)
+    report = {"meta": {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "database": connection.vendor,
+        "python": platform.python_version(),
+        "books": Book.objects.count(),
+        "terms": Term.objects.count(),
+        "queries": len(queries),
+        "repeat": repeat,
+        "with_cache": with_cache,
+        "inmemory_index": getattr(settings, "SEARCH_INMEMORY_INDEX", True),
+    }}
+    with override_settings(**run_settings):
+        reset_result_cache()
+        reset_index()
+        start = time.perf_counter()
+        index = get_index()
+        report["index"] = {
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "memory_mb": round(index.memory_usage() / 2 ** 20, 1) if index is not None else None,
+        }
+        for endpoint, params in queries[:warmup]:
+            client.get(reverse(ENDPOINTS[endpoint]), params)
+
+        latencies, query_counts, errors = defaultdict(list), defaultdict(list), defaultdict(int)
+        statuses = defaultdict(lambda: defaultdict(int))
+        for _ in range(repeat):
+            for endpoint, params in queries:
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = client.get(reverse(ENDPOINTS[endpoint]), params)
+                    elapsed = (time.perf_counter() - start) * 1000
+                statuses[endpoint][str(response.status_code)] += 1
+                if 200 <= response.status_code < 300:
+                    latencies[endpoint].append(elapsed)
+                    query_counts[endpoint].append(len(captured))
+                else:
+                    errors[endpoint] += 1
+
+        # Mémoire allouée par requête, dans une passe séparée (tracemalloc ralentit Python)
+        allocations = defaultdict(list)
+        sampled = defaultdict(int)
+        tracemalloc.start()
+        try:
+            for endpoint, params in queries:
+                if sampled[endpoint] >= memory_sample:
+                    continue
+                sampled[endpoint] += 1
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                client.get(reverse(ENDPOINTS[endpoint]), params)
+                allocations[endpoint].append((tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 10)
+        finally:
+            tracemalloc.stop()
+
+    report["endpoints"] = {
+        endpoint: {
+            "requests": sum(statuses[endpoint].values()),
+            "errors": errors[endpoint],
+            "status": dict(statuses[endpoint]),
+            "latency_ms": percentiles(latencies[endpoint]),
+            "db_queries": percentiles(query_counts[endpoint]),
+            "peak_alloc_kb": percentiles(allocations[endpoint]),
+        }
+        for endpoint in sorted(statuses)
+    }
+    if pagerank:
+        report["pagerank"] = benchmark_pagerank()
+    report["meta"]["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def benchmark_pagerank():
+    """Temps de chargement du graphe stocké (`build_book_graph`) et de `compute_pagerank`."""
+    from .graph import compute_pagerank, load_similarity_graph
+
+    start = time.perf_counter()
+    graph = load_similarity_graph()
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    compute_pagerank(graph)
+    return {"nodes": graph.number_of_nodes(), "edges": graph.number_of_edges(),
+            "load_seconds": round(loaded, 3), "seconds": round(time.perf_counter() - start, 3)}
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    """Écarts de latence par endpoint : `[(endpoint, percentile, avant, après, variation, régression)]`."""
+    rows = []
+    for endpoint, stats in current.get("endpoints", {}).items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        for name in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"].get(name), stats["latency_ms"].get(name)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            rows.append((endpoint, name, old, new, change, change > tolerance))
+    return rows
@@ -1,179 +1,319 @@
 import re
 import logging
 import json
-import networkx as nx
-from fuzzywuzzy import fuzz  # Pour la distance Levenshtein
+from django.conf import settings
+from django.db.models.functions import Length, Substr
+from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework.pagination import PageNumberPagination
 from rest_framework import status
-from django.db.models import Q, Count
-from .models import Book, Index
-from .serializers import BookSerializer
+from rest_framework.exceptions import APIException
+from .cache import cached_response, get_result_cache
+from .models import Book, BookText
+from .pagination import KeysetPagination
+from .serializers import BookSerializer, BookSummarySerializer, query_param_list
+from .graph import similar_books_among
+from .minhash import similar_books
+from .inverted_index import get_index
+from .scoring import RankedResults, bm25_search
+from .suggest import get_suggester
+from .query import QuerySyntaxError, is_boolean_query, parse_query, positive_words, query_terms, search_query
+from .highlighting import build_snippets, load_positions
+from .text_storage import decompress, stored_size
+from .trigram import regex_search_books
 from nltk.tokenize import word_tokenize
 
 
+# En-tête Range d'une seule plage d'octets (`bytes=0-499`, `bytes=500-`, `bytes=-500`)
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# Requête sans métacaractère de regex, contenant plusieurs mots
+LITERAL_PHRASE = re.compile(r"[\w'’-]+(\s+[\w'’-]+)+")
+
+
 class CustomPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+
+def get_paginator(request):
+    """Pagination par curseur sur demande (`?pagination=cursor` ou `?cursor=`), sinon par numéro de page."""
+    return KeysetPagination() if KeysetPagination.requested(request) else CustomPagination()
+
+
+class OptionalCursorPaginationMixin:
+    """Vues génériques : pagination choisie par `get_paginator` à chaque requête."""
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            self._paginator = get_paginator(self.request)
+        return self._paginator
+
+
+def summary_queryset(request):
+    """Livres des listes et recherches : auteurs préchargés, texte lu seulement avec `?expand=text_content`."""
+    queryset = Book.objects.prefetch_related("authors").defer("minhash")
+    if "text_content" not in query_param_list(request, "expand"):
+        queryset = queryset.defer("text_content")
+    return queryset
+
 # Liste des livres avec pagination
-class BookListView(generics.ListAPIView):
-    queryset = Book.objects.all()
-    serializer_class = BookSerializer
+class BookListView(OptionalCursorPaginationMixin, generics.ListAPIView):
+    serializer_class = BookSummarySerializer
     pagination_class = CustomPagination 
 
+    def get_queryset(self):
+        return summary_queryset(self.request).order_by("id")
+
 class BookDetailView(APIView):
     def get(self, request, pk):
         try:
-            book = Book.objects.get(pk=pk)
-            serializer = BookSerializer(book)
+            book = Book.objects.prefetch_related("authors").defer("minhash").get(pk=pk)
+            serializer = BookSerializer(book, context={"request": request})
             return Response(serializer.data)
         except Book.DoesNotExist:
             return Response({"detail": "Book not found"}, status=status.HTTP_404_NOT_FOUND)
 
-class BookSearchView(generics.ListAPIView):
-    serializer_class = BookSerializer
+class BookTextView(APIView):
+    """Texte d'un livre, en entier ou par morceaux.
+
+    - `?offset=&length=` (en caractères) : seul le morceau demandé est lu en base (`SUBSTR`) ;
+    - en-tête `Range: bytes=début-fin` : réponse 206 en texte brut (octets UTF-8).
+
+    Si le texte complet est stocké compressé (`BookText`), il n'est décompressé que
+    si le morceau demandé dépasse `text_content` (son début).
+    """
+
+    def get(self, request, pk):
+        range_header = request.headers.get("Range")
+        if range_header:
+            return self.get_range(pk, range_header)
+        try:
+            offset = max(int(request.query_params.get("offset", 0)), 0)
+            length = request.query_params.get("length")
+            length = max(int(length), 0) if length is not None else None
+        except ValueError:
+            return Response({"detail": "Invalid offset or length."}, status=status.HTTP_400_BAD_REQUEST)
+
+        text = Substr("text_content", offset + 1, length) if length is not None else Substr("text_content", offset + 1)
+        book = Book.objects.filter(pk=pk).values(
+            "id", "full_text__codec", "full_text__length", total_length=Length("text_content"), text=text).first()
+        if book is None:
+            return Response({"detail": "Book not found"}, status=status.HTTP_404_NOT_FOUND)
+        total_length = book["total_length"] or 0
+        if book["full_text__codec"] is not None:
+            if length is not None and offset + length <= total_length and book["full_text__length"]:
+                total_length = book["full_text__length"]
+            else:  # Morceau au-delà de `text_content` : texte complet décompressé
+                stored = BookText.objects.get(book_id=pk)
+                full_text = decompress(stored.data, stored.codec)
+                book["text"] = full_text[offset:offset + length] if length is not None else full_text[offset:]
+                total_length = len(full_text)
+        return Response({
+            "id": book["id"],
+            "offset": offset,
+            "length": len(book["text"] or ""),
+            "total_length": total_length,
+            "text": book["text"] or "",
+        })
+
+    def get_range(self, pk, range_header):
+        match = BYTE_RANGE.fullmatch(range_header.strip())
+        rows = list(Book.objects.filter(pk=pk).values_list("text_content", "full_text__codec", "full_text__data")[:1])
+        if not rows:
+            return Response({"detail": "Book not found"}, status=status.HTTP_404_NOT_FOUND)
+        text, codec, compressed = rows[0]
+        # Le début du texte complet est `text_content` : ses octets suffisent si la plage y tient
+        data = (text or "").encode("utf-8")
+        size = len(data) if codec is None else stored_size(compressed, codec)
+        if size is None:
+            data = decompress(compressed, codec).encode("utf-8")
+            size = len(data)
+        if match is None or not (match.group(1) or match.group(2)):
+            return HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                                headers={"Content-Range": f"bytes */{size}"})
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:  # Suffixe : les N derniers octets
+            start, end = max(size - int(match.group(2)), 0), size - 1
+        if start >= size or start > end:
+            return HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                                headers={"Content-Range": f"bytes */{size}"})
+        if end >= len(data):
+            data = decompress(compressed, codec).encode("utf-8")
+        return HttpResponse(data[start:end + 1], status=status.HTTP_206_PARTIAL_CONTENT,
+                            content_type="text/plain; charset=utf-8",
+                            headers={"Content-Range": f"bytes {start}-{end}/{size}", "Accept-Ranges": "bytes"})
+
+class BookSimilarView(APIView):
+    """Livres les plus proches d'un livre dans tout le corpus (MinHash + LSH, voir `book/minhash.py`)."""
+
+    def get(self, request, pk):
+        try:
+            book = Book.objects.only("id", "title", "minhash").get(pk=pk)
+        except Book.DoesNotExist:
+            return Response({"detail": "Book not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 100)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({"detail": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST)
+        results = [
+            {"id": other.id, "title": other.title, "similarity": score}
+            for other, score in similar_books(book, limit=limit)
+        ]
+        return Response({"id": book.id, "title": book.title, "results": results})
+
+def search_results(page, scores, occurrences, get_serializer):
+    """Livres d'une page de `/books/search/` avec leurs scores et leurs voisins dans le graphe."""
+    # Voisins dans le graphe de Jaccard parmi les livres de la page, calculés en lot
+    neighbours = similar_books_among(page)
+    titles = {book.id: book.title for book in page}
+    results = []
+    serialized = get_serializer(page, many=True).data
+    for book, book_data in zip(page, serialized):
+        book_data["occurrences_count"] = occurrences.get(book.id, 0)
+        book_data["bm25_score"] = scores[book.id]
+        book_data["pagerank_score"] = book.pagerank_score  # Précalculé par build_book_graph
+        book_data["similar_books"] = [
+            {"id": other_id, "title": titles[other_id], "jaccard_similarity": score}
+            for other_id, score in neighbours[book.id]
+        ]
+        results.append(book_data)
+    return results
+
+
+class BookSearchView(OptionalCursorPaginationMixin, generics.ListAPIView):
+    serializer_class = BookSummarySerializer
     pagination_class = CustomPagination  
 
-    def get_queryset(self):
-        query = self.request.query_params.get("q", "").strip().lower()
-        author = self.request.query_params.get("author", "").strip().lower()
-        
-        if not query and not author:
-            return Book.objects.none()
+    def get_scores(self, query, author):
+        """Scores BM25 des livres correspondant à la requête, restreints aux livres de l'auteur.
 
-        # Filtrer les livres par mot-clé
-        indexed_books = Index.objects.filter(word=query).select_related("book")
-        book_ids_by_keyword = indexed_books.values_list("book_id", flat=True).distinct()
+        Une requête de plusieurs mots, entre guillemets ou avec AND / OR / NOT
+        est évaluée sur les postings (voir `book/query.py`). Avec `fuzzy=1`,
+        les mots sont étendus aux termes proches (voir `book/fuzzy.py`).
+        """
+        fuzzy = self.request.query_params.get("fuzzy", "") in ("1", "true")
+        language = self.request.query_params.get("lang", "").strip().lower() or None
+        if not query:
+            scores, occurrences = {}, {}
+        elif fuzzy or is_boolean_query(query):
+            scores, occurrences = search_query(query, index=get_index(), fuzzy=fuzzy, language=language)
+        else:
+            scores, occurrences = bm25_search(query_terms(query, language), index=get_index())
 
         # Filtrer les livres par auteur
         if author:
-            books_by_author = Book.objects.filter(authors__name__icontains=author).values_list("id", flat=True).distinct()
-        else:
-            books_by_author = Book.objects.values_list("id", flat=True).distinct()
+            books_by_author = set(
+                Book.objects.filter(authors__name__icontains=author).values_list("id", flat=True)
+            )
+            if query:
+                scores = {book_id: score for book_id, score in scores.items() if book_id in books_by_author}
+            else:
+                scores = dict.fromkeys(books_by_author, 0.0)
+        return scores, occurrences
 
-        # Combiner les filtres
-        book_ids = set(book_ids_by_keyword) & set(books_by_author)
-        
-        return Book.objects.filter(id__in=book_ids).order_by("id")
-
-    def jaccard_similarity(self, set1, set2):
-        """Calcul de la similarité de Jaccard entre deux ensembles."""
-        intersection = len(set1 & set2)
-        union = len(set1 | set2)
-        return intersection / union if union != 0 else 0
-
-    def levenshtein_similarity(self, title1, title2):
-        """Calcul de la similarité Levenshtein entre deux titres."""
-        return fuzz.ratio(title1, title2) / 100  # Normalisé entre 0 et 1
-
-    def get_similar_books_from_graph(self, book, all_books):
-        """Retourne les voisins dans le graphe de Jaccard pour un livre donné."""
-        similar_books = []
-        book_keywords = set(Index.objects.filter(book_id=book.id).values_list('word', flat=True))
-        
-        for other_book in all_books:
-            if book.id == other_book.id:
-                continue
-            other_book_keywords = set(Index.objects.filter(book_id=other_book.id).values_list('word', flat=True))
-            jaccard_score = self.jaccard_similarity(book_keywords, other_book_keywords)
-            
-            # Ajouter les livres voisins dans le graphe
-            if jaccard_score > 0.1:  # Seuil à ajuster
-                similar_books.append({
-                    "book": BookSerializer(other_book).data,
-                    "jaccard_similarity": jaccard_score
-                })
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        author = self.request.query_params.get("author", "").strip().lower()
         
-        return similar_books
+        if not query and not author:
+            return Book.objects.none()
+
+        scores, _ = self.get_scores(query, author)
+        return summary_queryset(self.request).filter(id__in=scores).order_by("id")
 
+    @cached_response("search")
     def list(self, request, *args, **kwargs):
-        query = request.query_params.get("q", "").strip().lower()
+        query = request.query_params.get("q", "").strip()
         author = request.query_params.get("author", "").strip().lower()
         if not query and not author:
             return self.get_paginated_response([])
 
-        queryset = self.get_queryset()
-        page = self.paginate_queryset(queryset)
+        # Classement BM25 : seuls les livres de la page demandée sont chargés
+        try:
+            scores, occurrences = self.get_scores(query, author)
+        except QuerySyntaxError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(RankedResults(scores, summary_queryset(request)))
         if not page:
             return self.get_paginated_response([])
 
-        # Récupération des occurrences et index liés aux livres
-        index_entries = Index.objects.filter(book_id__in=[book.id for book in page])
-        occurrences_dict = {entry.book_id: entry.occurrences_count for entry in index_entries}
+        return self.get_paginated_response(search_results(page, scores, occurrences, self.get_serializer))
+
+ADVANCED_SEARCH_MAX_RESULTS = 100  # Livres trouvés par la regex plein texte
 
-        # Calcul du PageRank
-        pagerank_scores = compute_pagerank(page, index_entries) or {}
 
-        # Calcul des livres similaires via Jaccard et Levenshtein
-        similar_books = []
-        for book in page:
-            book_data = BookSerializer(book).data
-            book_data["occurrences_count"] = occurrences_dict.get(book.id, 0)
-            book_data["pagerank_score"] = pagerank_scores.get(book.id, 0)
+def full_text_matches(query, index):
+    """Livres dont le texte correspond à la regex : `(ids, partiel)`.
 
-            # Calcul des voisins dans le graphe de Jaccard
-            similar_books_for_current = self.get_similar_books_from_graph(book, page)
+    Une expression littérale est vérifiée sur les positions de l'index au lieu
+    de parcourir le texte des livres ; sinon préfiltre par trigrammes, puis
+    vérification de la regex sur les seuls candidats.
+    """
+    if LITERAL_PHRASE.fullmatch(query):
+        phrase_scores, _ = search_query(f'"{query}"', index=index)
+        return list(phrase_scores)[:ADVANCED_SEARCH_MAX_RESULTS], False
+    return regex_search_books(query, ADVANCED_SEARCH_MAX_RESULTS)
 
-            book_data["similar_books"] = similar_books_for_current
-            similar_books.append(book_data)
 
-        # Trier par occurrences et PageRank combiné
-        results = sorted(similar_books, key=lambda x: (x["occurrences_count"], x["pagerank_score"]), reverse=True)
+def index_matches(query, index):
+    """Scores BM25 des livres contenant un mot du vocabulaire correspondant à la regex : `(scores, partiel)`.
+
+    La regex est évaluée sur les mots tels qu'ils s'écrivent (préfixe
+    littéral ou trigrammes, voir `Suggester.matching`), puis les postings de
+    leurs racines indexées sont réunis.
+    """
+    max_terms = getattr(settings, "ADVANCED_SEARCH_MAX_TERMS", 1000)
+    words = [word for word, _, _ in get_suggester().matching(query, limit=max_terms + 1)]
+    partial = len(words) > max_terms
+    terms = list(dict.fromkeys(term for word in words[:max_terms] for term in query_terms(word)))
+    scores, _ = bm25_search(terms, index=index)
+    return scores, partial
 
-        return self.get_paginated_response(results)
 
 class BookAdvancedSearchView(APIView):
     pagination_class = CustomPagination
 
+    @cached_response("advanced-search")
     def get(self, request):
         query = self.request.query_params.get("q", "").strip()
         if not query:
             return Response({"detail": "No query provided."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            max_results = 100  # Limite des résultats
-
-            # Filtrage full-text AVANT d’appliquer une limite
-            books_by_full_text = Book.objects.filter(Q(text_content__icontains=query)).distinct()
-
-            # Appliquer regex directement, SANS slice avant le filter
-            books_by_regex = books_by_full_text.filter(Q(text_content__regex=query)).distinct()[:max_results]
-
-            # Recherche dans l'index
-            indexed_books = Index.objects.filter(
-                word__regex=query
-            ).values("book_id").annotate(occurrence_count=Count("id"))
-
-            book_ids = [entry["book_id"] for entry in indexed_books]
-            books_in_index = Book.objects.filter(id__in=book_ids)
-
-            # Fusionner et enlever les doublons
-            books = (books_by_regex | books_in_index).distinct()
-
-            # Étape 4 : Classement par pertinence avec PageRank et occurrences des mots-clés
-            pagerank_scores = compute_pagerank(books, Index.objects.filter(book_id__in=[b.id for b in books]))
-            book_scores = {book.id: pagerank_scores.get(book.id, 0) for book in books}
-
-            for entry in indexed_books:
-                book_id = entry["book_id"]
-                book_scores[book_id] += entry["occurrence_count"]
-
-            sorted_books = sorted(books, key=lambda book: book_scores.get(book.id, 0), reverse=True)
+            index = get_index()
+            try:
+                books_by_text, partial = full_text_matches(query, index)
+            except re.error as e:
+                return Response({"detail": f"Invalid regex: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+            scores, terms_partial = index_matches(query, index)
+            partial = partial or terms_partial
+            # Les livres trouvés uniquement par la regex plein texte gardent un score nul
+            for book_id in books_by_text:
+                scores.setdefault(book_id, 0.0)
 
             # Pagination
-            paginator = CustomPagination()
-            result_page = paginator.paginate_queryset(sorted_books, request)
+            paginator = get_paginator(request)
+            result_page = paginator.paginate_queryset(RankedResults(scores, summary_queryset(request)), request)
 
             if result_page is not None:
-                serialized_books = BookSerializer(result_page, many=True)
-                return paginator.get_paginated_response(serialized_books.data)
+                serialized_books = BookSummarySerializer(result_page, many=True, context={"request": request})
+                response = paginator.get_paginated_response(serialized_books.data)
+                response.data["partial"] = partial  # Limite de candidats ou de temps atteinte
+                return response
 
             return Response({"detail": "No results found."}, status=status.HTTP_404_NOT_FOUND)
 
+        except APIException:
+            raise  # Erreurs de l'API (curseur invalide...) : réponse 4xx de DRF
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -181,88 +321,58 @@ class BookAdvancedSearchView(APIView):
 
 
 class BookHighlightSearchView(APIView):
+    """Livres classés par BM25 avec les meilleurs extraits surlignés (voir `book/highlighting.py`).
+
+    Paramètres : `q` (un ou plusieurs mots, même syntaxe que `/books/search/`),
+    `snippets` (nombre d'extraits), `snippet_size` (en caractères), `offsets=1`
+    pour recevoir les offsets des mots au lieu de balises `<mark>`.
+    """
     pagination_class = CustomPagination
 
+    @cached_response("highlight-search")
     def get(self, request):
-        query = self.request.query_params.get("q", "").strip().lower()
+        query = self.request.query_params.get("q", "").strip()
         if not query:
             return Response({"detail": "No query provided."}, status=400)
-
-        indexed_books = Index.objects.filter(word=query).select_related("book")
-
-        # Récupérer les IDs des livres concernés
-        book_ids = indexed_books.values_list("book_id", flat=True).distinct()
-        books = Book.objects.filter(id__in=book_ids).order_by('id')  # Ajouter un ordre par défaut
-
-        # Pagination des résultats
-        paginator = CustomPagination()
-        result_page = paginator.paginate_queryset(books, request)
-        if result_page is not None:
-            serialized_books = BookSerializer(result_page, many=True).data
-            highlighted_books = self.highlight_words(serialized_books, query)
-            return paginator.get_paginated_response(highlighted_books)
-
-        # Si aucun résultat n'est trouvé
-        if books:
-            serialized_books = BookSerializer(books, many=True).data
-            highlighted_books = self.highlight_words(serialized_books, query)
-            return Response(highlighted_books)
-        else:
+        try:
+            count = int(request.query_params.get("snippets", 0)) or None
+            size = int(request.query_params.get("snippet_size", 0)) or None
+        except ValueError:
+            return Response({"detail": "Invalid snippets or snippet_size."}, status=400)
+        offsets = request.query_params.get("offsets", "") in ("1", "true")
+
+        # Livres contenant les mots, classés par BM25
+        index = get_index()
+        language = request.query_params.get("lang", "").strip().lower() or None
+        try:
+            tree = parse_query(query, language)
+            if is_boolean_query(query):
+                scores, _ = search_query(query, index=index, language=language)
+            else:
+                scores, _ = bm25_search(query_terms(query, language), index=index)
+        except QuerySyntaxError as e:
+            return Response({"detail": str(e)}, status=400)
+        if not scores:
             return Response({"detail": "No results found."}, status=404)
 
-    def highlight_words(self, books, query):
-        for book in books:
-            index_entries = Index.objects.filter(book_id=book['id'], word=query)
-            positions = []
-            for entry in index_entries:
-                positions.extend(entry.get_positions())  # Utiliser get_positions pour désérialiser
-            positions = sorted(set(positions))  # Éliminer les doublons et trier les positions
-
-            logging.debug(f"Book ID: {book['id']}, Positions: {positions}")
-
-            text_content = book['text_content']
-            highlighted_text = self.apply_highlight(text_content, positions, query)
-            book['highlighted_text'] = highlighted_text
-        return books
-
-    def apply_highlight(self, text, positions, query):
-        highlighted_text = ""
-        last_pos = 0
-        query_length = len(query)
-        for pos in positions:
-            pos = int(pos)
-            logging.debug(f"Position: {pos}, Last Position: {last_pos}")
-            highlighted_text += text[last_pos:pos] + "<mark>" + text[pos:pos+query_length] + "</mark>"
-            last_pos = pos + query_length
-        highlighted_text += text[last_pos:]
-        logging.debug(f"Highlighted Text: {highlighted_text}")
-        return highlighted_text
-    
-    
-def compute_pagerank(books, index_entries):
-    G = nx.Graph()
-
-    # Ajouter les livres comme nœuds
-    book_ids = {book.id for book in books}
-    for book_id in book_ids:
-        G.add_node(book_id)
-
-    # Ajouter des arêtes basées sur la similarité Jaccard des mots-clés
-    book_word_sets = {
-        book_id: set(entry.word for entry in index_entries if entry.book_id == book_id)
-        for book_id in book_ids
-    }
-
-    for book1 in book_ids:
-        for book2 in book_ids:
-            if book1 != book2:
-                intersection = book_word_sets[book1] & book_word_sets[book2]
-                union = book_word_sets[book1] | book_word_sets[book2]
-                if union:
-                    jaccard_similarity = len(intersection) / len(union)
-                    if jaccard_similarity > 0:  # Ajouter une arête si similarité > 0
-                        G.add_edge(book1, book2, weight=jaccard_similarity)
-
-    # Calculer le PageRank
-    pagerank_scores = nx.pagerank(G, weight='weight')
-    return pagerank_scores
+        # Les passages sont pris dans `text_content` (les mots indexés y sont tous), qui n'est pas renvoyé
+        paginator = get_paginator(request)
+        result_page = paginator.paginate_queryset(
+            RankedResults(scores, Book.objects.prefetch_related("authors").defer("minhash")), request)
+        words = positive_words(tree)
+        positions = load_positions(words, [book.id for book in result_page], index=index)
+        results = BookSummarySerializer(result_page, many=True, context={"request": request}).data
+        for book, book_data in zip(result_page, results):
+            book_data["snippets"] = build_snippets(book.text_content or "", positions.get(book.id, {}),
+                                                   count=count, size=size, offsets=offsets)
+        return paginator.get_paginated_response(results)
+
+
+class SearchCacheStatsView(APIView):
+    """Compteurs du cache des résultats de recherche du worker courant (voir `book/cache.py`)."""
+
+    def get(self, request):
+        cache = get_result_cache()
+        if cache is None:
+            return Response({"enabled": False})
+        return Response({"enabled": True, **cache.stats()})
@@ -0,0 +1,188 @@
+"""Cache des résultats de recherche (`/books/search/`, `/books/advanced-search/`,
+`/books/highlight-search/`).
+
+Deux niveaux :
+
+- un LRU en mémoire dans chaque worker (`SEARCH_CACHE_SIZE` réponses) ;
+- optionnellement, un cache Django partagé entre workers (`SEARCH_CACHE_BACKEND`,
+  alias de `CACHES`, ex. Redis), avec une durée de vie `SEARCH_CACHE_TIMEOUT`.
+
+La clé contient la génération de l'index (`SearchIndexState`), incrémentée
+par `Scripts/fetch_index.py` et `build_book_graph` : après une indexation,
+les anciennes entrées ne sont plus jamais lues et sortent du LRU. La
+génération est relue en base au plus toutes les
+`SEARCH_CACHE_GENERATION_CHECK_INTERVAL` secondes.
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from rest_framework.response import Response
+
+from .models import SearchIndexState
+
+_generation = None
+_generation_checked_at = 0.0
+
+
+def current_generation():
+    """Génération de l'index, relue en base au plus toutes les quelques secondes."""
+    global _generation, _generation_checked_at
+    now = time.monotonic()
+    if _generation is None or now - _generation_checked_at >= getattr(
+            settings, "SEARCH_CACHE_GENERATION_CHECK_INTERVAL", 2):
+        _generation = SearchIndexState.objects.filter(pk=1).values_list("generation", flat=True).first() or 0
+        _generation_checked_at = now
+    return _generation
+
+
+def bump_index_generation():
+    """Invalide les résultats en cache de tous les workers ; retourne la nouvelle génération."""
+    global _generation
+    if not SearchIndexState.objects.filter(pk=1).update(generation=F("generation") + 1):
+        SearchIndexState.objects.get_or_create(pk=1, defaults={"generation": 1})
+    _generation = None
+    return current_generation()
+
+
+class LRUCache:
+    """LRU thread-safe de taille fixe."""
+
+    def __init__(self, size):
+        self.size = size
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResultCache:
+    """Réponses de recherche par clé ; compte les succès de chaque niveau et les échecs."""
+
+    def __init__(self, size, backend=None, timeout=300):
+        self.local = LRUCache(size) if size else None
+        self.shared = caches[backend] if backend else None
+        self.timeout = timeout
+        self.hits = {"local": 0, "shared": 0}
+        self.misses = 0
+
+    @staticmethod
+    def key(endpoint, request, generation):
+        """Clé d'une requête : requête normalisée, auteur, page, taille de page et autres paramètres."""
+        params = {name: request.query_params.get(name, "") for name in sorted(request.query_params)}
+        params["q"] = " ".join(params.get("q", "").split())
+        if "author" in params:
+            params["author"] = params["author"].strip().lower()
+        digest = hashlib.sha1(repr(sorted(params.items())).encode("utf-8")).hexdigest()
+        return f"search:{generation}:{endpoint}:{digest}"
+
+    def get(self, key):
+        if self.local is not None:
+            data = self.local.get(key)
+            if data is not None:
+                self.hits["local"] += 1
+                return data
+        if self.shared is not None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.hits["shared"] += 1
+                if self.local is not None:
+                    self.local.set(key, data)
+                return data
+        self.misses += 1
+        return None
+
+    def set(self, key, data):
+        if self.local is not None:
+            self.local.set(key, data)
+        if self.shared is not None:
+            self.shared.set(key, data, self.timeout)
+
+    def stats(self):
+        lookups = sum(self.hits.values()) + self.misses
+        return {
+            "generation": current_generation(),
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": sum(self.hits.values()) / lookups if lookups else None,
+            "local_entries": len(self.local) if self.local is not None else 0,
+            "local_size": self.local.size if self.local is not None else 0,
+            "local_evictions": self.local.evictions if self.local is not None else 0,
+            "shared_backend": getattr(settings, "SEARCH_CACHE_BACKEND", None),
+        }
+
+
+_cache = None
+_cache_settings = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Cache du processus courant, ou None si désactivé (`SEARCH_CACHE_SIZE = 0` sans `SEARCH_CACHE_BACKEND`)."""
+    global _cache, _cache_settings
+    config = (getattr(settings, "SEARCH_CACHE_SIZE", 1000), getattr(settings, "SEARCH_CACHE_BACKEND", None),
+              getattr(settings, "SEARCH_CACHE_TIMEOUT", 300))
+    if not config[0] and not config[1]:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache_settings != config:
+            _cache, _cache_settings = ResultCache(*config), config
+        return _cache
+
+
+def reset_result_cache():
+    """Vide le cache du processus et oublie la génération lue."""
+    global _cache, _generation
+    with _cache_lock:
+        _cache = None
+    _generation = None
+
+
+def cached_response(endpoint):
+    """Met en cache les réponses 200 d'une vue de recherche ; en-tête `X-Cache: HIT` ou `MISS`.
+
+    Une réponse partielle (`partial: true`, limite de temps ou de candidats
+    atteinte) n'est pas gardée : la requête suivante refait la recherche.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            cache = get_result_cache()
+            if cache is None:
+                return method(view, request, *args, **kwargs)
+            key = cache.key(endpoint, request, current_generation())
+            data = cache.get(key)
+            if data is not None:
+                return Response(data, headers={"X-Cache": "HIT"})
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200 and not (isinstance(response.data, dict) and response.data.get("partial")):
+                cache.set(key, response.data)
+            response["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
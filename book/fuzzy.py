@@ -0,0 +1,120 @@
+"""Recherche tolérante aux fautes de frappe (`/books/search/?fuzzy=1`).
+
+Les termes du vocabulaire sont rangés dans un BK-tree selon la distance de
+Damerau-Levenshtein (une transposition compte pour une seule modification) :
+grâce à l'inégalité triangulaire, une recherche à distance `k` n'explore
+que les enfants situés à une distance comprise entre `d - k` et `d + k` du
+nœud courant, soit une petite fraction du vocabulaire. L'arbre est construit au premier besoin puis gardé en
+mémoire tant que la génération de l'index (voir `book/cache.py`) ne change pas.
+"""
+import logging
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from rapidfuzz.distance.DamerauLevenshtein import distance
+
+from .cache import current_generation
+from .models import Term
+
+
+class BKTree:
+    """BK-tree : chaque nœud est `[terme, {distance: enfant}]`."""
+
+    def __init__(self, terms=()):
+        self.root = None
+        self.size = 0
+        for term in terms:
+            self.add(term)
+
+    def add(self, term):
+        self.size += 1
+        if self.root is None:
+            self.root = [term, None]
+            return
+        node = self.root
+        while True:
+            d = distance(term, node[0])
+            if d == 0:
+                self.size -= 1
+                return
+            if node[1] is None:
+                node[1] = {}
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [term, None]
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """Termes à au plus `max_distance` modifications de `word` : `{terme: distance}`."""
+        matches = {}
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            term, children = stack.pop()
+            d = distance(word, term)
+            if d <= max_distance:
+                matches[term] = d
+            if children:
+                stack.extend(child for gap, child in children.items() if d - max_distance <= gap <= d + max_distance)
+        return matches
+
+
+def max_edits(word):
+    """Distance autorisée selon la longueur du mot (une seule faute sur les mots courts)."""
+    limit = getattr(settings, "SEARCH_FUZZY_MAX_DISTANCE", 2)
+    return min(limit, 0 if len(word) < 3 else 1 if len(word) < 5 else 2)
+
+
+def _vocabulary_terms(index, min_document_frequency):
+    """Termes assez fréquents du vocabulaire (les mots rares sont souvent eux-mêmes des coquilles)."""
+    if index is None:
+        return list(Term.objects.filter(document_frequency__gte=min_document_frequency)
+                    .values_list("word", flat=True))
+    if hasattr(index, "term_offsets"):
+        frequencies = np.diff(index.term_offsets)
+        return [index.vocabulary[i] for i in np.flatnonzero(frequencies >= min_document_frequency).tolist()]
+    return [term for term in index.terms() if index.document_frequency(term) >= min_document_frequency]
+
+
+_tree = None
+_tree_key = None
+_tree_lock = threading.Lock()
+
+
+def get_bk_tree(index=None):
+    """BK-tree du vocabulaire, reconstruit si l'index (ou la table `Term`) a changé.
+
+    La clé est la génération de l'index, et non l'objet index : après un
+    rechargement, un nouvel index peut réutiliser l'`id()` de l'ancien.
+    """
+    global _tree, _tree_key
+    if index is not None:
+        key = (current_generation(), "index", len(index), index.num_docs)
+    else:
+        key = (current_generation(), "db", Term.objects.count())
+    if _tree is not None and _tree_key == key:
+        return _tree
+    with _tree_lock:
+        if _tree is None or _tree_key != key:
+            start = time.perf_counter()
+            min_document_frequency = getattr(settings, "SEARCH_FUZZY_MIN_DOCUMENT_FREQUENCY", 2)
+            _tree, _tree_key = BKTree(_vocabulary_terms(index, min_document_frequency)), key
+            logging.info(f"BK-tree construit : {_tree.size} termes en {time.perf_counter() - start:.1f}s.")
+    return _tree
+
+
+def expand_word(word, index=None):
+    """Termes proches de `word` et leur poids : `{terme: poids}`.
+
+    Le mot exact garde un poids de 1 ; chaque modification multiplie le
+    poids par `SEARCH_FUZZY_PENALTY`. Seuls les `SEARCH_FUZZY_MAX_EXPANSIONS`
+    termes les plus proches sont retenus.
+    """
+    penalty = getattr(settings, "SEARCH_FUZZY_PENALTY", 0.5)
+    max_expansions = getattr(settings, "SEARCH_FUZZY_MAX_EXPANSIONS", 50)
+    edits = max_edits(word)
+    matches = get_bk_tree(index).search(word, edits) if edits else {}
+    matches[word] = 0
+    closest = sorted(matches.items(), key=lambda item: (item[1], item[0]))[:max_expansions]
+    return {term: penalty ** d for term, d in closest}
@@ -0,0 +1,271 @@
+import logging
+from array import array
+import networkx as nx
+import numpy as np
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .cache import bump_index_generation
+from .models import Book, Index, BookSimilarity
+
+# Seuil de similarité de Jaccard à partir duquel deux livres sont reliés
+DEFAULT_THRESHOLD = 0.1
+BATCH_SIZE = 5000
+
+
+def jaccard_similarity(set1, set2):
+    """Calcul de la similarité de Jaccard entre deux ensembles."""
+    intersection = len(set1 & set2)
+    union = len(set1) + len(set2) - intersection
+    return intersection / union if union != 0 else 0
+
+
+def load_word_sets(book_ids=None):
+    """Charge l'ensemble des mots indexés de chaque livre (une seule requête).
+
+    Les mots sont remplacés par des entiers pour limiter la mémoire.
+    """
+    word_ids = {}
+    word_sets = defaultdict(set)
+    entries = Index.objects.all()
+    if book_ids is not None:
+        entries = entries.filter(book_id__in=book_ids)
+    for book_id, word in entries.values_list("book_id", "word").iterator(chunk_size=BATCH_SIZE):
+        word_sets[book_id].add(word_ids.setdefault(word, len(word_ids)))
+    return {book_id: frozenset(words) for book_id, words in word_sets.items()}
+
+
+def compute_similarity_edges(word_sets, sources=None, threshold=DEFAULT_THRESHOLD):
+    """Retourne les arêtes (source, cible, jaccard) du graphe de Jaccard.
+
+    Si `sources` est fourni, seules les paires impliquant ces livres sont
+    calculées (reconstruction incrémentale).
+    """
+    book_ids = sorted(word_sets)
+    sources = book_ids if sources is None else sorted(set(sources) & set(word_sets))
+    done = set()
+    for source in sources:
+        done.add(source)
+        source_words = word_sets[source]
+        for target in book_ids:
+            if target in done:
+                continue
+            score = jaccard_similarity(source_words, word_sets[target])
+            if score > threshold:
+                yield source, target, score
+
+
+def jaccard_matrix(word_sets, book_ids, chunk_size=8192):
+    """Matrice des similarités de Jaccard entre les livres donnés (calcul vectorisé).
+
+    Les intersections sont obtenues par produit de la matrice d'incidence
+    livres x mots avec sa transposée, par blocs de mots pour borner la mémoire.
+    """
+    sets = [word_sets.get(book_id, frozenset()) for book_id in book_ids]
+    words = np.array(sorted(set().union(*sets)), dtype=np.int64)
+    intersections = np.zeros((len(sets), len(sets)), dtype=np.float64)
+    for start in range(0, len(words), chunk_size):
+        chunk = words[start:start + chunk_size]
+        incidence = np.zeros((len(sets), len(chunk)), dtype=np.float32)
+        for row, book_words in enumerate(sets):
+            members = np.fromiter(book_words, dtype=np.int64, count=len(book_words))
+            incidence[row, np.searchsorted(chunk, members[np.isin(members, chunk)])] = 1
+        intersections += incidence @ incidence.T
+    sizes = np.array([len(book_words) for book_words in sets], dtype=np.float64)
+    unions = sizes[:, None] + sizes[None, :] - intersections
+    return np.divide(intersections, unions, out=np.zeros_like(intersections), where=unions > 0)
+
+
+def similar_books_among(books, threshold=DEFAULT_THRESHOLD):
+    """Voisins de chaque livre parmi les livres donnés : `{book_id: [(voisin, jaccard), ...]}`.
+
+    Lit les arêtes précalculées par `build_book_graph` si tous les livres en
+    ont (une requête), sinon charge leurs mots en une requête et calcule la
+    matrice de Jaccard.
+    """
+    book_ids = [book.id for book in books]
+    neighbours = {book_id: [] for book_id in book_ids}
+    if all(book.graph_updated_at is not None for book in books):
+        edges = BookSimilarity.objects.filter(source_id__in=book_ids, target_id__in=book_ids).values_list(
+            "source_id", "target_id", "jaccard_similarity")
+        for source, target, score in edges:
+            neighbours[source].append((target, score))
+    elif len(book_ids) > 1:
+        scores = jaccard_matrix(load_word_sets(book_ids), book_ids)
+        for i, j in zip(*np.nonzero(scores > threshold)):
+            if i != j:
+                neighbours[book_ids[i]].append((book_ids[j], float(scores[i, j])))
+    for entries in neighbours.values():
+        entries.sort(key=lambda entry: (-entry[1], entry[0]))
+    return neighbours
+
+
+def save_similarity_edges(edges, book_ids=None):
+    """Remplace les arêtes des livres donnés (ou de tout le graphe) par `edges`.
+
+    Chaque arête est stockée dans les deux sens pour lire les voisins d'un
+    livre avec un simple filtre sur `source`.
+    """
+    with transaction.atomic():
+        existing = BookSimilarity.objects.all()
+        if book_ids is not None:
+            existing = existing.filter(Q(source_id__in=book_ids) | Q(target_id__in=book_ids))
+        existing.delete()
+
+        batch = []
+        for source, target, score in edges:
+            batch.append(BookSimilarity(source_id=source, target_id=target, jaccard_similarity=score))
+            batch.append(BookSimilarity(source_id=target, target_id=source, jaccard_similarity=score))
+            if len(batch) >= BATCH_SIZE:
+                BookSimilarity.objects.bulk_create(batch)
+                batch = []
+        BookSimilarity.objects.bulk_create(batch)
+
+
+class SimilarityGraph:
+    """Graphe de Jaccard sous forme de listes d'arêtes NumPy (chaque arête dans les deux sens).
+
+    La mémoire est proportionnelle au nombre d'arêtes : le PageRank d'un
+    corpus de 100 000 livres ne construit ni graphe networkx ni matrice n x n.
+    """
+
+    def __init__(self, nodes, sources, targets, weights):
+        self.nodes = nodes
+        # Indices des extrémités dans `nodes`
+        self.sources = sources
+        self.targets = targets
+        self.weights = weights
+
+    @classmethod
+    def from_networkx(cls, G):
+        nodes = list(G)
+        position = {node: i for i, node in enumerate(nodes)}
+        edges = [(position[u], position[v], data.get("weight", 1.0)) for u, v, data in G.edges(data=True)]
+        sources = np.array([u for u, _, _ in edges] + [v for _, v, _ in edges], dtype=np.int64)
+        targets = np.array([v for _, v, _ in edges] + [u for u, _, _ in edges], dtype=np.int64)
+        weights = np.array([w for _, _, w in edges] * 2, dtype=np.float64)
+        return cls(np.array(nodes), sources, targets, weights)
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.sources) // 2
+
+    def to_networkx(self):
+        G = nx.Graph()
+        G.add_nodes_from(self.nodes.tolist())
+        forward = self.sources < self.targets
+        G.add_weighted_edges_from(zip(self.nodes[self.sources[forward]].tolist(),
+                                      self.nodes[self.targets[forward]].tolist(),
+                                      self.weights[forward].tolist()))
+        return G
+
+
+def load_similarity_graph():
+    """Lit les livres indexés et les arêtes stockées (déjà dans les deux sens) en tableaux NumPy."""
+    nodes = np.array(sorted(Index.objects.values_list("book_id", flat=True).distinct()), dtype=np.int64)
+    sources, targets, weights = array("q"), array("q"), array("d")
+    edges = BookSimilarity.objects.values_list("source_id", "target_id", "jaccard_similarity")
+    for source, target, score in edges.iterator(chunk_size=BATCH_SIZE):
+        sources.append(source)
+        targets.append(target)
+        weights.append(score)
+    sources, targets = np.frombuffer(sources, dtype=np.int64), np.frombuffer(targets, dtype=np.int64)
+    # Arêtes vers des livres qui ne sont plus indexés : ignorées
+    i, j = np.searchsorted(nodes, sources), np.searchsorted(nodes, targets)
+    known = (i < len(nodes)) & (j < len(nodes))
+    known[known] = (nodes[i[known]] == sources[known]) & (nodes[j[known]] == targets[known])
+    return SimilarityGraph(nodes, i[known], j[known], np.frombuffer(weights, dtype=np.float64)[known])
+
+
+def load_graph():
+    """Construit le graphe networkx à partir des arêtes stockées."""
+    return load_similarity_graph().to_networkx()
+
+
+def compute_pagerank(graph, alpha=0.85, max_iter=100, tol=1.0e-6):
+    """Calcule le PageRank pondéré par la similarité de Jaccard.
+
+    Itération de la puissance sur la liste des arêtes (`np.bincount`) : ni
+    matrice dense, ni SciPy (exigé par `nx.pagerank`). `graph` est un
+    `SimilarityGraph` ou un graphe networkx.
+    """
+    if isinstance(graph, nx.Graph):
+        graph = SimilarityGraph.from_networkx(graph)
+    n = graph.number_of_nodes()
+    if not n:
+        return {}
+    out_weight = np.bincount(graph.sources, weights=graph.weights, minlength=n)
+    dangling = out_weight == 0
+    # Part du poids de chaque arête dans les arêtes sortantes de sa source
+    share = graph.weights / np.where(dangling, 1.0, out_weight)[graph.sources]
+
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        previous = x
+        spread = np.bincount(graph.targets, weights=x[graph.sources] * share, minlength=n)
+        x = alpha * (spread + x[dangling].sum() / n) + (1 - alpha) / n
+        if np.abs(x - previous).sum() < n * tol:
+            break
+    return dict(zip(graph.nodes.tolist(), x.tolist()))
+
+
+def compute_centralities(graph, closeness=False, betweenness=False, betweenness_samples=None):
+    """Calcule le PageRank et, en option, la closeness et la betweenness (sur un graphe networkx)."""
+    scores = {"pagerank_score": compute_pagerank(graph)}
+    if closeness or betweenness:
+        G = graph.to_networkx() if isinstance(graph, SimilarityGraph) else graph
+    if closeness:
+        # La distance entre deux livres est l'inverse de leur similarité
+        for _, _, data in G.edges(data=True):
+            data["distance"] = 1 / data["weight"]
+        scores["closeness_score"] = nx.closeness_centrality(G, distance="distance")
+    if betweenness:
+        k = min(betweenness_samples, len(G)) if betweenness_samples else None
+        scores["betweenness_score"] = nx.betweenness_centrality(G, k=k, weight="weight", seed=0)
+    return scores
+
+
+def save_centralities(scores):
+    """Enregistre les scores calculés dans les colonnes de `Book`."""
+    fields = list(scores)
+    books = list(Book.objects.filter(id__in=set().union(*scores.values())).only("id", *fields))
+    for book in books:
+        for field, values in scores.items():
+            setattr(book, field, values.get(book.id, 0))
+    Book.objects.bulk_update(books, fields, batch_size=BATCH_SIZE)
+
+
+def build_book_graph(incremental=False, threshold=DEFAULT_THRESHOLD,
+                     closeness=False, betweenness=False, betweenness_samples=None):
+    """Reconstruit le graphe de similarité puis les scores de centralité.
+
+    En mode incrémental, seules les paires impliquant des livres indexés
+    depuis la dernière construction sont recalculées.
+    """
+    indexed_ids = set(Index.objects.values_list("book_id", flat=True).distinct())
+    if incremental:
+        new_ids = set(
+            Book.objects.filter(id__in=indexed_ids, graph_updated_at__isnull=True).values_list("id", flat=True)
+        )
+        logging.info(f"{len(new_ids)} nouveaux livres à ajouter au graphe.")
+    else:
+        new_ids = indexed_ids
+        logging.info(f"Reconstruction complète du graphe pour {len(new_ids)} livres.")
+
+    if new_ids:
+        word_sets = load_word_sets()
+        sources = new_ids if incremental else None
+        edges = compute_similarity_edges(word_sets, sources=sources, threshold=threshold)
+        save_similarity_edges(edges, book_ids=new_ids if incremental else None)
+
+    graph = load_similarity_graph()
+    scores = compute_centralities(graph, closeness=closeness, betweenness=betweenness,
+                                  betweenness_samples=betweenness_samples)
+    save_centralities(scores)
+    Book.objects.filter(id__in=new_ids).update(graph_updated_at=timezone.now())
+    bump_index_generation()  # PageRank et voisins ont changé : résultats en cache périmés
+    logging.info(f"Graphe : {graph.number_of_nodes()} livres, {graph.number_of_edges()} arêtes.")
+    return graph
@@ -0,0 +1,310 @@
+"""Import asynchrone des livres depuis Gutendex (`Scripts/fetch_books.py`).
+
+Les pages de la liste et les textes des livres sont téléchargés en
+parallèle par une boucle asyncio : un seul pool de connexions `aiohttp`
+(`HARVEST_CONCURRENCY` connexions au plus) et un limiteur de débit par
+hôte (`HARVEST_RATE_LIMIT` requêtes par seconde) pour ne pas surcharger
+Gutendex ni gutenberg.org. Les livres retenus sont écrits par lots
+(`HARVEST_BATCH_SIZE`) dans un thread, sans bloquer les téléchargements.
+Les textes sont lus en continu et le téléchargement s'arrête dès que le
+livre est retenu et son début stocké (voir `book/text_storage.py`).
+
+Après chaque lot, les pages entièrement traitées et les livres écartés
+sont enregistrés dans un fichier de reprise JSON (`HARVEST_CHECKPOINT`) :
+un import interrompu reprend là où il s'était arrêté.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from tqdm import tqdm
+from yarl import URL
+
+from .models import Author, Book, BookText
+from .text_storage import TextReader, storage_codec
+
+GUTENDEX_URL = "https://gutendex.com/books/"
+TEXT_FORMATS = ['text/plain', 'text/plain; charset=utf-8', 'text/plain; charset=iso-8859-1',
+                'text/plain; charset=us-ascii']
+MIN_WORDS = 10000
+MAX_TEXT_LENGTH = 100000
+CHUNK_SIZE = 64 * 1024
+MAX_RETRIES = 10
+MAX_BACKOFF = 30
+TIMEOUT = 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PermanentError(Exception):
+    """Réponse HTTP définitive (404, 410...) : la ressource n'est pas retentée."""
+
+
+class RateLimiter:
+    """Espace les requêtes vers un même hôte d'au moins `1 / rate` secondes."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = {}
+
+    async def wait(self, host):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next.get(host, now))
+        self._next[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Checkpoint:
+    """Fichier de reprise : pages terminées et livres écartés."""
+
+    def __init__(self, path):
+        self.path = path
+        self.pages_done = set()
+        self.skipped = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.pages_done = set(data.get("pages_done", []))
+            self.skipped = set(data.get("skipped", []))
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"pages_done": sorted(self.pages_done), "skipped": sorted(self.skipped)}, f)
+        os.replace(tmp, self.path)  # Écriture atomique : le fichier n'est jamais à moitié écrit
+
+
+def text_url(book_data):
+    formats = book_data.get('formats', {})
+    return next((formats[fmt] for fmt in TEXT_FORMATS if fmt in formats), None)
+
+
+def book_from_data(book_data, text):
+    return Book(
+        id=book_data['id'],
+        title=book_data['title'][:Book._meta.get_field('title').max_length],
+        language=', '.join(book_data.get('languages', [])),
+        description=book_data['summaries'][0] if book_data.get('summaries') else '',
+        subjects=', '.join(book_data.get('subjects', [])),
+        bookshelves=', '.join(book_data.get('bookshelves', [])),
+        cover_image=book_data.get('formats', {}).get('image/jpeg', ''),
+        download_count=book_data.get('download_count', 0),
+        copyright=bool(book_data.get('copyright')),
+        text_content=text,
+    )
+
+
+def save_authors(author_data, author_ids):
+    """Upsert des auteurs absents du cache `author_ids` ({nom: id}) ; retourne les ids des nouveaux venus."""
+    missing = [Author(name=name, birth_year=data.get('birth_year'), death_year=data.get('death_year'))
+               for name, data in author_data.items() if name not in author_ids]
+    if missing:
+        # Une seule requête : INSERT ... ON CONFLICT (name) DO UPDATE, qui renvoie les ids
+        Author.objects.bulk_create(missing, update_conflicts=True, unique_fields=['name'],
+                                   update_fields=['birth_year', 'death_year'])
+    return {author.name: author.id for author in missing}
+
+
+def save_books(records, author_ids=None):
+    """Enregistre un lot de `(données Gutendex, TextReader)` et leurs auteurs ; retourne le nombre de livres créés.
+
+    Quelques requêtes par lot, quelle que soit sa taille : livres existants,
+    livres, textes compressés, auteurs (upsert) et liens livre-auteur.
+    """
+    author_ids = {} if author_ids is None else author_ids
+    ids = [book_data['id'] for book_data, _ in records]
+    existing = set(Book.objects.filter(id__in=ids).values_list('id', flat=True))
+    records = [(book_data, reader) for book_data, reader in records if book_data['id'] not in existing]
+    if not records:
+        return 0
+    author_data = {author['name']: author for book_data, _ in records for author in book_data.get('authors', [])}
+    with transaction.atomic():
+        Book.objects.bulk_create([book_from_data(book_data, reader.text) for book_data, reader in records])
+        BookText.objects.bulk_create([
+            BookText(book_id=book_data['id'], codec=reader.codec, data=reader.compressed(), length=reader.length)
+            for book_data, reader in records if reader.codec
+        ])
+        new_ids = save_authors(author_data, author_ids)
+        Through = Book.authors.through
+        Through.objects.bulk_create(
+            [Through(book_id=book_data['id'], author_id=author_ids.get(author['name']) or new_ids[author['name']])
+             for book_data, _ in records for author in book_data.get('authors', [])],
+            ignore_conflicts=True,
+        )
+    author_ids.update(new_ids)  # Après le commit seulement : le cache ne contient que des auteurs enregistrés
+    return len(records)
+
+
+class Harvester:
+    """Importe jusqu'à `max_books` livres de plus de `min_words` mots."""
+
+    def __init__(self, base_url=GUTENDEX_URL, max_books=1700, concurrency=None, rate_limit=None,
+                 batch_size=None, checkpoint=None, min_words=MIN_WORDS, max_retries=MAX_RETRIES,
+                 backoff=1, timeout=TIMEOUT, max_length=MAX_TEXT_LENGTH, codec=None, progress=True):
+        self.base_url = URL(base_url)
+        self.max_books = max_books
+        self.concurrency = concurrency or getattr(settings, "HARVEST_CONCURRENCY", 10)
+        self.limiter = RateLimiter(getattr(settings, "HARVEST_RATE_LIMIT", 5) if rate_limit is None else rate_limit)
+        self.batch_size = batch_size or getattr(settings, "HARVEST_BATCH_SIZE", 50)
+        self.checkpoint = Checkpoint(getattr(settings, "HARVEST_CHECKPOINT", None) if checkpoint is None else checkpoint)
+        self.min_words = min_words
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_length = max_length
+        # Stockage compressé des textes complets (BOOK_TEXT_COMPRESSION)
+        self.codec = codec or storage_codec()
+        self.progress = progress
+        self.imported = 0
+        self._accepted = 0  # Livres importés, en attente ou en cours d'écriture
+        self._known = set()
+        self._author_ids = {}  # Cache {nom: id} des auteurs déjà enregistrés
+        self._pending = []  # Livres en attente d'écriture
+        self._pending_pages = set()  # Pages dont tous les livres sont dans `_pending`
+        self._write_lock = asyncio.Lock()
+
+    async def run(self):
+        """Lance l'import ; retourne le nombre de livres créés."""
+        self._known = await sync_to_async(lambda: set(Book.objects.values_list('id', flat=True)))()
+        self._author_ids = await sync_to_async(lambda: dict(Author.objects.values_list('name', 'id')))()
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        with tqdm(total=self.max_books, desc="Importing books", disable=not self.progress) as self._bar:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as self.session:
+                first = await self.fetch_json(self.page_url(1))
+                if not first or not first.get('results'):
+                    logging.error("Impossible de lire la première page de %s.", self.base_url)
+                    return self.imported
+                page_count = math.ceil(first.get('count', 0) / len(first['results'])) or 1
+                pages = asyncio.Queue()
+                for page in range(1, page_count + 1):
+                    if page not in self.checkpoint.pages_done:
+                        pages.put_nowait(page)
+                # Quelques pages à la fois : les textes d'une page occupent déjà le pool de connexions
+                workers = [asyncio.create_task(self.page_worker(pages, first))
+                           for _ in range(max(1, self.concurrency // 4))]
+                await asyncio.gather(*workers)
+                await self.flush()
+        return self.imported
+
+    def page_url(self, page):
+        return str(self.base_url.update_query(page=page))
+
+    @property
+    def done(self):
+        return self._accepted >= self.max_books
+
+    async def page_worker(self, pages, first):
+        while not pages.empty() and not self.done:
+            page = pages.get_nowait()
+            data = first if page == 1 else await self.fetch_json(self.page_url(page))
+            if data is None:
+                logging.error("Page %s ignorée après %s tentatives.", page, self.max_retries)
+                continue
+            await self.process_page(page, data.get('results', []))
+
+    async def process_page(self, page, books_data):
+        todo = [book_data for book_data in books_data
+                if book_data['id'] not in self._known and book_data['id'] not in self.checkpoint.skipped]
+        texts = await asyncio.gather(*(self.fetch_book_text(book_data) for book_data in todo))
+        # Une page n'est terminée que si aucun téléchargement n'a échoué
+        complete = all(text is not None or book_data['id'] in self.checkpoint.skipped
+                       for book_data, text in zip(todo, texts))
+        for book_data, reader in zip(todo, texts):
+            if reader is None:
+                continue
+            if self.done:
+                return  # Page incomplète : elle sera reprise au prochain lancement
+            self._pending.append((book_data, reader))
+            self._accepted += 1
+            self._known.add(book_data['id'])
+        if complete:
+            self._pending_pages.add(page)
+        if len(self._pending) >= self.batch_size or self.done:
+            await self.flush()
+
+    async def flush(self):
+        async with self._write_lock:
+            records, self._pending = self._pending, []
+            pages, self._pending_pages = self._pending_pages, set()
+            if records:
+                created = await sync_to_async(save_books)(records, self._author_ids)
+                self.imported += created
+                self._accepted -= len(records) - created  # Livres déjà en base
+                self._bar.update(created)
+                logging.info("%s livres importés (%s au total).", created, self.imported)
+            self.checkpoint.pages_done |= pages
+            self.checkpoint.save()
+
+    async def fetch_book_text(self, book_data):
+        """`TextReader` du texte d'un livre, ou `None` s'il est absent ou trop court (le livre est alors écarté)."""
+        url = text_url(book_data)
+        try:
+            reader = await self.fetch(url, self.read_text) if url else None
+        except PermanentError as e:
+            logging.info("Livre ignoré : %s (ID: %s), texte indisponible (%s).", book_data['title'], book_data['id'], e)
+            self.checkpoint.skipped.add(book_data['id'])
+            return None
+        if reader is None and url:
+            return None  # Échec réseau : le livre sera retenté au prochain lancement
+        word_count = reader.word_count if reader else 0
+        if word_count < self.min_words:
+            logging.info("Livre ignoré : %s (ID: %s), %s mots.", book_data['title'], book_data['id'], word_count)
+            self.checkpoint.skipped.add(book_data['id'])
+            return None
+        return reader
+
+    async def read_text(self, response):
+        """Lit le texte par morceaux et coupe le téléchargement dès que le livre est décidé."""
+        reader = TextReader(response.charset, self.max_length, self.min_words, self.codec)
+        async for data in response.content.iter_chunked(CHUNK_SIZE):
+            reader.feed(data)
+            if reader.done:
+                return reader
+        reader.finish()
+        return reader
+
+    async def fetch_json(self, url):
+        try:
+            return await self.fetch(url, lambda response: response.json(content_type=None))
+        except PermanentError:
+            return None
+
+    async def fetch(self, url, read):
+        """GET avec reprises (backoff exponentiel avec gigue, `Retry-After` respecté).
+
+        Retourne `None` après `max_retries` échecs (erreur réseau, 429, 5xx ou
+        corps illisible) ; lève `PermanentError` sur les autres statuts.
+        """
+        host = URL(url).host
+        for attempt in range(1, self.max_retries + 1):
+            await self.limiter.wait(host)
+            delay = min(MAX_BACKOFF, self.backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1)
+            try:
+                async with self.session.get(url) as response:
+                    if response.status == 200:
+                        return await read(response)
+                    if response.status not in RETRY_STATUSES:
+                        logging.warning("%s : HTTP %s.", url, response.status)
+                        raise PermanentError(f"HTTP {response.status}")
+                    retry_after = response.headers.get("Retry-After", "")
+                    if retry_after.isdigit():
+                        delay = min(MAX_BACKOFF, int(retry_after))
+                    error = f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:  # ValueError : JSON invalide
+                error = e
+            logging.warning("Erreur sur %s (tentative %s/%s) : %s.", url, attempt, self.max_retries, error)
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        return None
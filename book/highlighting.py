@@ -0,0 +1,125 @@
+"""Extraits surlignés autour des mots trouvés (`/books/highlight-search/`).
+
+Les occurrences viennent des positions de l'index (rangs des mots),
+converties en offsets en caractères par la table `TokenOffsets` du livre :
+le texte n'est jamais parcouru en entier. Les extraits retenus sont les
+fenêtres de `HIGHLIGHT_SNIPPET_SIZE` caractères qui contiennent le plus de
+mots distincts de la requête, puis le plus d'occurrences.
+"""
+import html
+from collections import defaultdict
+from django.conf import settings
+
+from .analysis import WORD_PATTERN
+from .models import Index, TokenOffsets
+from .positions import decode_positions
+
+
+def load_positions(words, book_ids, index=None):
+    """Offsets en caractères de chaque mot dans chaque livre : `{book_id: {mot: [offsets]}}`.
+
+    Les positions de l'index sont des rangs de mots : elles sont lues dans
+    l'index en mémoire si possible, sinon en une seule requête pour toute la
+    page, puis converties en offsets avec les `TokenOffsets` des livres.
+    """
+    positions = defaultdict(dict)
+    if index is not None and index.has_positions:
+        for book_id in book_ids:
+            for word in words:
+                found = index.positions_for(word, book_id)
+                if found is not None and len(found):
+                    positions[book_id][word] = found.tolist()
+    else:
+        for book_id, word, found in Index.objects.filter(book_id__in=book_ids, word__in=set(words)).values_list(
+                "book_id", "word", "positions"):
+            positions[book_id][word] = decode_positions(found)
+    # Rangs -> offsets. Un livre pas encore réindexé depuis `INDEX_VERSION = 2` n'a pas de
+    # table `TokenOffsets` : ses positions sont encore des offsets en caractères, gardés tels quels
+    tables = TokenOffsets.objects.filter(book_id__in=list(positions)).values_list("book_id", "offsets")
+    for book_id, offsets in tables:
+        offsets = decode_positions(offsets)
+        positions[book_id] = {word: [offsets[rank] for rank in ranks if rank < len(offsets)]
+                              for word, ranks in positions[book_id].items()}
+    return positions
+
+
+def find_matches(text, positions):
+    """Occurrences `(début, fin, mot)` triées ; la fin est celle du mot trouvé dans le texte."""
+    matches = []
+    for word, starts in positions.items():
+        for start in starts:
+            token = WORD_PATTERN.match(text, start)
+            matches.append((start, token.end() if token else start + len(word), word))
+    matches.sort()
+    return matches
+
+
+def best_windows(matches, size, count):
+    """Fenêtres `(début, fin)` les plus denses en occurrences, sans chevauchement."""
+    candidates = []
+    end = 0
+    for i, (start, _, _) in enumerate(matches):
+        window_start = max(start - size // 4, 0)
+        # Occurrences entièrement contenues dans la fenêtre (pointeur glissant)
+        end = max(end, i)
+        while end < len(matches) and matches[end][1] <= window_start + size:
+            end += 1
+        inside = matches[i:end]
+        candidates.append(((len({word for _, _, word in inside}), len(inside), -start), window_start))
+    candidates.sort(reverse=True)
+    windows = []
+    for _, window_start in candidates:
+        if len(windows) == count:
+            break
+        if all(window_start + size <= other or window_start >= other + size for other, _ in windows):
+            windows.append((window_start, window_start + size))
+    return windows
+
+
+def _snap(text, start, end):
+    """Ajuste les bornes de l'extrait sur des espaces pour ne pas couper de mot."""
+    if start > 0:
+        space = text.find(" ", start, min(start + 20, end))
+        start = space + 1 if space != -1 else start
+    if end < len(text):
+        space = text.rfind(" ", max(end - 20, start), end)
+        end = space if space != -1 else end
+    return start, min(end, len(text))
+
+
+def build_snippets(text, positions, count=None, size=None, offsets=False):
+    """Extraits surlignés d'un texte.
+
+    Chaque extrait contient `start` / `end` (offsets dans le texte) et soit
+    `text` avec les mots entre `<mark>`, soit (`offsets=True`) le texte brut
+    et la liste `highlights` des offsets `[début, fin]` relatifs à l'extrait.
+    """
+    count = count or getattr(settings, "HIGHLIGHT_SNIPPETS", 3)
+    size = size or getattr(settings, "HIGHLIGHT_SNIPPET_SIZE", 200)
+    text = text or ""
+    matches = find_matches(text, positions)
+    snippets = []
+    for window_start, window_end in best_windows(matches, size, count):
+        start, end = _snap(text, window_start, window_end)
+        inside = [(s, e) for s, e, _ in matches if s >= start and e <= end]
+        if offsets:
+            snippets.append({"start": start, "end": end, "text": text[start:end],
+                             "highlights": [[s - start, e - start] for s, e in inside]})
+        else:
+            snippets.append({"start": start, "end": end, "text": mark(text, inside, start, end)})
+    return snippets
+
+
+def mark(text, matches, start=0, end=None):
+    """Texte entre `start` et `end` avec les occurrences entre `<mark>` (construit en une passe)."""
+    end = len(text) if end is None else end
+    parts = []
+    last = start
+    for s, e in matches:
+        if s < last:
+            continue  # Occurrences qui se chevauchent
+        parts.append(html.escape(text[last:s]))
+        parts.append(f"<mark>{html.escape(text[s:e])}</mark>")
+        last = e
+    parts.append(html.escape(text[last:end]))
+    return "".join(parts)
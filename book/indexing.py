@@ -0,0 +1,221 @@
+"""Pipeline d'indexation : tokenisation en parallèle, écriture par lots.
+
+La tokenisation (regex) est liée au CPU : elle tourne dans un pool de
+processus (`ProcessPoolExecutor`), des threads n'apportant rien à cause du
+GIL. Les processus sont lancés en mode `spawn` pour ne pas hériter de la
+connexion à la base. Les résultats reviennent au processus principal, qui
+les écrit par lots de livres : sous PostgreSQL avec `COPY` dans une table
+temporaire fusionnée ensuite dans la table de l'index
+(`INSERT ... SELECT`), sinon avec `bulk_create`.
+
+L'indexation est incrémentale : chaque livre garde l'empreinte SHA-256 de
+son texte et la version de l'analyseur (`INDEX_VERSION`) utilisées lors de
+sa dernière indexation. Seuls les livres nouveaux ou modifiés sont
+tokenisés, et leurs anciens postings sont remplacés dans la même
+transaction. Incrémenter `INDEX_VERSION` à chaque changement de l'analyse
+(tokenisation, stopwords...) force la réindexation de tout le corpus.
+"""
+import csv
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .analysis import analyze_book
+from .minhash import save_signatures
+from .models import Book, BookWordForms, Index, MinHashBand, TokenOffsets
+from .positions import encode_positions
+
+# Version de l'analyse : à incrémenter quand la tokenisation change
+INDEX_VERSION = 5
+BATCH_SIZE = 20
+MAX_WORD_LENGTH = Index._meta.get_field("word").max_length
+STAGING_TABLE = "book_index_staging"
+
+
+def _postings(results):
+    for book_id, word_positions, _, _, _, _ in results:
+        for word, positions in word_positions.items():
+            if len(word) <= MAX_WORD_LENGTH:
+                yield word, book_id, positions
+
+
+def copy_postings(results):
+    """Écrit les postings avec `COPY` (CSV) dans une table temporaire, puis les copie dans l'index."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for word, book_id, positions in _postings(results):
+        # bytea au format hexadécimal
+        writer.writerow([word, book_id, len(positions), "\\x" + encode_positions(positions).hex()])
+    buffer.seek(0)
+    table = Index._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+            "(word varchar(255), book_id bigint, occurrences_count integer, positions bytea) ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} (word, book_id, occurrences_count, positions) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+        cursor.execute(
+            f"INSERT INTO {table} (word, book_id, occurrences_count, positions) "
+            f"SELECT word, book_id, occurrences_count, positions FROM {STAGING_TABLE}"
+        )
+
+
+def bulk_create_postings(results):
+    Index.objects.bulk_create(
+        (Index(word=word, book_id=book_id, occurrences_count=len(positions),
+               positions=encode_positions(positions))
+         for word, book_id, positions in _postings(results)),
+        batch_size=5000,
+    )
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def write_batch(results, hashes):
+    """Remplace les postings d'un lot de livres et enregistre leurs longueurs (BM25),
+    empreintes, mots (formes de surface) et signatures MinHash, en une seule transaction."""
+    book_ids = [book_id for book_id, _, _, _, _, _ in results]
+    now = timezone.now()
+    with transaction.atomic():
+        Index.objects.filter(book_id__in=book_ids).delete()
+        TokenOffsets.objects.filter(book_id__in=book_ids).delete()
+        TokenOffsets.objects.bulk_create(
+            TokenOffsets(book_id=book_id, offsets=encode_positions(offsets)) for book_id, _, _, _, offsets, _ in results
+        )
+        BookWordForms.objects.filter(book_id__in=book_ids).delete()
+        BookWordForms.objects.bulk_create(
+            BookWordForms(book_id=book_id, forms={word: count for word, count in forms.items()
+                                                  if len(word) <= MAX_WORD_LENGTH})
+            for book_id, _, _, _, _, forms in results
+        )
+        if connection.vendor == "postgresql":
+            copy_postings(results)
+        else:
+            bulk_create_postings(results)
+        Book.objects.bulk_update(
+            [Book(id=book_id, token_count=token_count, content_hash=hashes[book_id], index_version=INDEX_VERSION,
+                  indexed_at=now, graph_updated_at=None)
+             for book_id, _, token_count, _, _, _ in results],
+            ["token_count", "content_hash", "index_version", "indexed_at", "graph_updated_at"],
+        )
+        save_signatures({book_id: list(word_positions) for book_id, word_positions, _, _, _, _ in results})
+
+
+def remove_stale_books():
+    """Supprime les postings des livres indexés dont le texte a été retiré."""
+    stale = Book.objects.filter(Q(text_content__isnull=True) | Q(text_content=""), index_version__gt=0)
+    stale_ids = list(stale.values_list("id", flat=True))
+    if stale_ids:
+        with transaction.atomic():
+            Index.objects.filter(book_id__in=stale_ids).delete()
+            TokenOffsets.objects.filter(book_id__in=stale_ids).delete()
+            BookWordForms.objects.filter(book_id__in=stale_ids).delete()
+            MinHashBand.objects.filter(book_id__in=stale_ids).delete()
+            stale.update(token_count=0, content_hash="", index_version=0, indexed_at=None,
+                         graph_updated_at=None, minhash=None)
+        logging.info(f"Postings supprimés pour {len(stale_ids)} livres sans texte.")
+    return stale_ids
+
+
+def books_to_index(since=None, book_ids=None):
+    """Livres candidats à l'indexation : modifiés depuis `since` et/ou parmi `book_ids`."""
+    books = Book.objects.filter(text_content__isnull=False)
+    if since is not None:
+        books = books.filter(updated_at__gte=since)
+    if book_ids:
+        books = books.filter(id__in=book_ids)
+    return books.order_by("id")
+
+
+class Throughput:
+    """Débit de l'indexation (livres/s et Mo/s), journalisé après chaque lot."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.books = 0
+        self.bytes = 0
+
+    def add(self, results):
+        self.books += len(results)
+        self.bytes += sum(size for _, _, _, size, _, _ in results)
+
+    def __str__(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (f"{self.books} livres, {self.bytes / 2 ** 20:.1f} Mo en {elapsed:.1f}s "
+                f"({self.books / elapsed:.1f} livres/s, {self.bytes / 2 ** 20 / elapsed:.2f} Mo/s)")
+
+
+def index_books(books=None, workers=None, batch_size=BATCH_SIZE, force=False):
+    """Indexe en parallèle les livres nouveaux ou modifiés (tous avec `force`).
+
+    Retourne les identifiants des livres indexés.
+    """
+    if books is None:
+        books = books_to_index()
+    workers = workers or os.cpu_count() or 1
+    throughput = Throughput()
+    indexed_ids = []
+    batch = []
+    hashes = {}
+    skipped = 0
+
+    def collect(futures):
+        nonlocal batch
+        for future in futures:
+            try:
+                batch.append(future.result())
+            except Exception as e:
+                logging.error(f"Erreur lors de l'indexation d'un livre : {e}")
+            if len(batch) >= batch_size:
+                flush()
+
+    def flush():
+        nonlocal batch
+        if not batch:
+            return
+        try:
+            write_batch(batch, hashes)
+            indexed_ids.extend(book_id for book_id, _, _, _, _, _ in batch)
+            throughput.add(batch)
+            logging.info(f"Indexation : {throughput}")
+        except Exception as e:
+            logging.error(f"Erreur lors de l'écriture des livres {[result[0] for result in batch]} : {e}")
+        for book_id, _, _, _, _, _ in batch:
+            hashes.pop(book_id, None)
+        batch = []
+
+    logging.info(f"Début de l'indexation des livres ({workers} processus)...")
+    rows = books.values_list("id", "text_content", "language", "content_hash", "index_version").iterator(
+        chunk_size=batch_size)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = set()
+        for book_id, text, language, previous_hash, version in rows:
+            if not text:
+                logging.warning(f"Aucun texte pour le livre {book_id}")
+                continue
+            digest = content_hash(text)
+            if not force and digest == previous_hash and version == INDEX_VERSION:
+                skipped += 1  # Texte et analyse inchangés : postings à jour
+                continue
+            hashes[book_id] = digest
+            pending.add(executor.submit(analyze_book, book_id, text, language))
+            # Nombre borné de livres en cours : les textes ne sont pas tous gardés en mémoire
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(pending)
+    flush()
+    logging.info(f"Indexation des livres terminée : {throughput}, {skipped} livres inchangés ignorés.")
+    return indexed_ids
@@ -0,0 +1,476 @@
+"""Index inversé compact, en lecture seule, chargé dans chaque worker Django.
+
+Structure (tous les tableaux sont des buffers NumPy contigus) :
+
+- `Vocabulary` : termes triés (ordre des octets UTF-8) concaténés dans un seul
+  buffer, avec le tableau de leurs offsets ;
+- `term_offsets[t] : term_offsets[t + 1]` délimite les postings du terme `t`
+  dans `doc_ids` (identifiants de livres triés) et `term_freqs` ;
+- `positions` (optionnel) : positions (rangs des mots dans le livre) de
+  chaque posting, encodées en delta (première position absolue, puis écarts), délimitées
+  par `position_offsets` ;
+- `doc_table` / `doc_lengths` : nombre de mots indexés de chaque livre.
+
+Mémoire par worker pour le corpus de 1700 livres importé par
+`Scripts/fetch_books.py` (textes tronqués à 100 000 caractères, soit
+~3 500 termes distincts et ~10 000 occurrences indexées par livre, ~6 M
+postings, ~17 M positions) :
+
+- sans positions : ~55 Mo (doc_ids et term_freqs en uint32, vocabulaire
+  de ~300 000 termes) ;
+- avec positions : ~145 Mo (positions en uint32 et offsets en uint32).
+
+Mesuré sur un corpus synthétique de même forme (1700 livres, vocabulaire
+de Zipf, ~1 450 termes distincts par livre, 2,5 M postings) : 23 Mo sans
+positions, 97 Mo avec. `InvertedIndex.memory_usage()` donne le chiffre
+exact, journalisé au chargement.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+
+from .analysis import extract_words_with_positions, book_languages
+from .positions import decode_deltas
+
+
+class Vocabulary:
+    """Dictionnaire de termes trié, stocké dans un seul buffer UTF-8."""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self._buffer = memoryview(data)
+        self._trigrams = None
+
+    @classmethod
+    def from_terms(cls, terms):
+        encoded = [term.encode("utf-8") for term in terms]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _term_bytes(self, i):
+        return bytes(self._buffer[self.offsets[i]:self.offsets[i + 1]])
+
+    def __getitem__(self, i):
+        return self._term_bytes(i).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _bisect_left(self, key, lo=0, hi=None):
+        hi = len(self) if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, term):
+        """Identifiant du terme, ou -1 s'il est absent (recherche dichotomique)."""
+        key = term.encode("utf-8")
+        i = self._bisect_left(key)
+        if i < len(self) and self._term_bytes(i) == key:
+            return i
+        return -1
+
+    def prefix_range(self, prefix):
+        """Intervalle `[lo, hi)` des identifiants des termes commençant par `prefix`."""
+        key = prefix.encode("utf-8")
+        lo = self._bisect_left(key)
+        # 0xFF n'apparaît jamais en UTF-8 : borne supérieure de tous les termes préfixés
+        return lo, self._bisect_left(key + b"\xff", lo)
+
+    def _trigram_postings(self):
+        """Trigramme -> identifiants des termes qui le contiennent (construit au premier besoin)."""
+        if self._trigrams is None:
+            postings = defaultdict(lambda: array("I"))
+            for i, term in enumerate(self):
+                for trigram in {term[j:j + 3] for j in range(len(term) - 2)}:
+                    postings[trigram].append(i)
+            self._trigrams = {trigram: np.frombuffer(ids, dtype=np.uint32) for trigram, ids in postings.items()}
+        return self._trigrams
+
+    def match(self, pattern, limit=None):
+        """Identifiants des termes correspondant à la regex (`re.search`).
+
+        Seuls les termes candidats sont testés : l'intervalle du préfixe
+        littéral pour une regex ancrée (`^bal...`), sinon les termes
+        contenant tous les trigrammes imposés par la regex.
+        """
+        from .trigram import literal_prefix, required_trigrams
+
+        regex = re.compile(pattern)
+        prefix = "" if regex.flags & re.IGNORECASE else literal_prefix(pattern)
+        trigrams = required_trigrams(pattern)
+        if prefix:
+            candidates = range(*self.prefix_range(prefix))
+        elif trigrams:
+            postings = self._trigram_postings()
+            lists = sorted((postings.get(trigram, np.zeros(0, dtype=np.uint32)) for trigram in trigrams), key=len)
+            candidates = lists[0]
+            for other in lists[1:]:
+                candidates = np.intersect1d(candidates, other, assume_unique=True)
+            candidates = candidates.tolist()
+        else:
+            candidates = range(len(self))
+        matches = []
+        for i in candidates:
+            if regex.search(self[i]):
+                matches.append(i)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes
+
+
+class InvertedIndex:
+    """Index inversé compact : vocabulaire trié et postings en tableaux NumPy."""
+
+    def __init__(self, vocabulary, term_offsets, doc_ids, term_freqs, doc_table, doc_lengths,
+                 position_offsets=None, positions=None):
+        self.vocabulary = vocabulary
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_table = doc_table
+        self.doc_lengths = doc_lengths
+        self.position_offsets = position_offsets
+        self.positions = positions
+
+    # Construction
+
+    @classmethod
+    def from_postings(cls, postings, with_positions=True):
+        """Construit l'index depuis `{mot: {book_id: positions}}`."""
+        builder = IndexBuilder(with_positions=with_positions)
+        for word, books in postings.items():
+            for book_id in sorted(books):
+                builder.add(word, book_id, positions=books[book_id])
+        return builder.build()
+
+    @classmethod
+    def from_index_table(cls, book_ids=None, with_positions=True):
+        """Construit l'index depuis la table `Index`, en une seule requête lue en streaming."""
+        from .models import Index
+
+        builder = IndexBuilder(with_positions=with_positions)
+        fields = ["word", "book_id", "occurrences_count"] + (["positions"] if with_positions else [])
+        entries = Index.objects.order_by("word", "book_id")
+        if book_ids is not None:
+            entries = entries.filter(book_id__in=book_ids)
+        for row in entries.values_list(*fields).iterator(chunk_size=10000):
+            builder.add_packed(row[0], row[1], row[2], row[3] if with_positions else None)
+        return builder.build()
+
+    @classmethod
+    def from_books(cls, books=None, with_positions=True):
+        """Construit l'index en tokenisant directement `Book.text_content`."""
+        from .models import Book
+
+        if books is None:
+            books = Book.objects.filter(text_content__isnull=False).only("id", "language", "text_content")
+        postings = defaultdict(dict)
+        for book in books.iterator(chunk_size=100) if hasattr(books, "iterator") else books:
+            word_positions, _ = extract_words_with_positions(book.text_content, book_languages(book))
+            for word, positions in word_positions.items():
+                postings[word][book.id] = positions
+        return cls.from_postings(postings, with_positions=with_positions)
+
+    # Lecture
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    @property
+    def num_docs(self):
+        return len(self.doc_table)
+
+    def term_id(self, word):
+        return self.vocabulary.find(word)
+
+    def postings(self, word):
+        """Retourne `(doc_ids, term_freqs)` du mot, sous forme de vues (sans copie)."""
+        t = self.term_id(word)
+        if t < 0:
+            return self.doc_ids[:0], self.term_freqs[:0]
+        start, end = self.term_offsets[t], self.term_offsets[t + 1]
+        return self.doc_ids[start:end], self.term_freqs[start:end]
+
+    def book_ids(self, word):
+        return self.postings(word)[0]
+
+    def occurrences(self, word):
+        """Nombre d'occurrences du mot dans chaque livre : `{book_id: count}`."""
+        doc_ids, term_freqs = self.postings(word)
+        return dict(zip(doc_ids.tolist(), term_freqs.tolist()))
+
+    def document_frequency(self, word):
+        return len(self.book_ids(word))
+
+    def doc_length(self, book_id):
+        i = np.searchsorted(self.doc_table, book_id)
+        if i < len(self.doc_table) and self.doc_table[i] == book_id:
+            return int(self.doc_lengths[i])
+        return 0
+
+    def all_doc_ids(self):
+        return self.doc_table
+
+    def doc_lengths_for(self, doc_ids):
+        """Longueurs (en mots indexés) d'un tableau de livres présents dans l'index."""
+        return self.doc_lengths[np.searchsorted(self.doc_table, doc_ids)]
+
+    def average_doc_length(self):
+        return float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    @property
+    def has_positions(self):
+        return self.positions is not None
+
+    def positions_for(self, word, book_id):
+        """Rangs (triés) du mot dans un livre, ou None si l'index n'a pas de positions."""
+        if self.positions is None:
+            return None
+        t = self.term_id(word)
+        if t < 0:
+            return np.zeros(0, dtype=np.int64)
+        start, end = self.term_offsets[t], self.term_offsets[t + 1]
+        i = start + np.searchsorted(self.doc_ids[start:end], book_id)
+        if i >= end or self.doc_ids[i] != book_id:
+            return np.zeros(0, dtype=np.int64)
+        deltas = self.positions[self.position_offsets[i]:self.position_offsets[i + 1]]
+        return np.cumsum(deltas, dtype=np.int64)
+
+    def terms_matching(self, pattern, limit=None):
+        """Termes du vocabulaire correspondant à l'expression régulière (`re.search`)."""
+        return [self.vocabulary[i] for i in self.vocabulary.match(pattern, limit=limit)]
+
+    def terms_with_prefix(self, prefix, limit=None):
+        """Termes commençant par `prefix`, par ordre alphabétique."""
+        lo, hi = self.vocabulary.prefix_range(prefix)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self.vocabulary[i] for i in range(lo, hi)]
+
+    def union_occurrences(self, words):
+        """Somme des occurrences de plusieurs mots par livre : `{book_id: count}`."""
+        counts = defaultdict(int)
+        for word in words:
+            doc_ids, term_freqs = self.postings(word)
+            for book_id, tf in zip(doc_ids.tolist(), term_freqs.tolist()):
+                counts[book_id] += tf
+        return dict(counts)
+
+    def memory_usage(self):
+        """Taille en octets des buffers de l'index."""
+        arrays = [self.term_offsets, self.doc_ids, self.term_freqs, self.doc_table, self.doc_lengths,
+                  self.position_offsets, self.positions]
+        return self.vocabulary.nbytes() + sum(a.nbytes for a in arrays if a is not None)
+
+
+class IndexBuilder:
+    """Accumule des postings groupés par terme puis produit un `InvertedIndex`.
+
+    Les lignes d'un même terme doivent arriver à la suite, par `book_id`
+    croissant ; l'ordre des termes entre eux est quelconque (l'ordre de tri
+    de PostgreSQL dépend de la collation) et est corrigé dans `build`.
+    """
+
+    def __init__(self, with_positions=True):
+        self.with_positions = with_positions
+        self.terms = []
+        self.term_starts = array("q")
+        self.doc_ids = array("I")
+        self.term_freqs = array("I")
+        self.position_ends = array("Q")
+        self.positions = array("I")
+        self.doc_lengths = defaultdict(int)
+
+    def add(self, term, book_id, positions=None, occurrences=None):
+        if not self.terms or self.terms[-1] != term:
+            self.terms.append(term)
+            self.term_starts.append(len(self.doc_ids))
+        if positions:
+            positions = sorted(set(positions))
+            occurrences = len(positions)
+        self.doc_ids.append(book_id)
+        self.term_freqs.append(occurrences or 0)
+        self.doc_lengths[book_id] += occurrences or 0
+        if self.with_positions:
+            if positions:
+                # Encodage delta : première position absolue, puis les écarts
+                self.positions.append(positions[0])
+                self.positions.extend(b - a for a, b in zip(positions, positions[1:]))
+            self.position_ends.append(len(self.positions))
+
+    def add_packed(self, term, book_id, occurrences, packed):
+        """Comme `add`, avec les positions encodées de la table `Index`, déjà triées et en delta."""
+        if not self.with_positions or not packed:
+            self.add(term, book_id, occurrences=occurrences)
+            return
+        deltas = decode_deltas(packed)
+        self.add(term, book_id, occurrences=len(deltas))
+        self.positions.extend(deltas)
+        self.position_ends[-1] = len(self.positions)
+
+    def build(self):
+        n_postings = len(self.doc_ids)
+        starts = np.append(np.frombuffer(self.term_starts, dtype=np.int64), n_postings)
+        doc_ids = np.frombuffer(self.doc_ids, dtype=np.uint32)
+        term_freqs = np.frombuffer(self.term_freqs, dtype=np.uint32)
+        position_offsets = positions = None
+        if self.with_positions:
+            position_offsets = np.zeros(n_postings + 1, dtype=np.uint64)
+            position_offsets[1:] = np.frombuffer(self.position_ends, dtype=np.uint64)
+            positions = np.frombuffer(self.positions, dtype=np.uint32)
+
+        # Réordonner les termes selon l'ordre des octets UTF-8 (recherche dichotomique)
+        order = sorted(range(len(self.terms)), key=lambda t: self.terms[t].encode("utf-8"))
+        terms = [self.terms[t] for t in order]
+        counts = np.diff(starts)[order]
+        if order != list(range(len(order))):
+            permutation = np.concatenate(
+                [np.arange(starts[t], starts[t + 1]) for t in order] or [np.zeros(0, dtype=np.int64)]
+            )
+            doc_ids = doc_ids[permutation]
+            term_freqs = term_freqs[permutation]
+            if positions is not None:
+                position_counts = np.diff(position_offsets)[permutation]
+                positions = np.concatenate(
+                    [positions[position_offsets[starts[t]]:position_offsets[starts[t + 1]]] for t in order]
+                    or [positions[:0]]
+                )
+                position_offsets = np.zeros(n_postings + 1, dtype=np.uint64)
+                np.cumsum(position_counts, out=position_offsets[1:])
+        if position_offsets is not None and len(positions) < 2 ** 32:
+            position_offsets = position_offsets.astype(np.uint32)
+
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=term_offsets[1:])
+        doc_table = np.array(sorted(self.doc_lengths), dtype=np.uint32)
+        doc_lengths = np.array([self.doc_lengths[book_id] for book_id in doc_table.tolist()], dtype=np.uint32)
+        return InvertedIndex(Vocabulary.from_terms(terms), term_offsets, doc_ids, term_freqs,
+                             doc_table, doc_lengths, position_offsets, positions)
+
+
+# Index du processus courant (un par worker WSGI/ASGI)
+_index = None
+_index_lock = threading.Lock()
+_index_failed_at = None
+_index_generation = None
+_segments_mtime = None
+_segments_checked_at = 0.0
+
+
+def _segments_manifest():
+    directory = getattr(settings, "SEARCH_SEGMENTS_DIR", None)
+    if not directory:
+        return None
+    from .segments import MANIFEST
+    path = os.path.join(directory, MANIFEST)
+    return path if os.path.exists(path) else None
+
+
+def load_index():
+    """Charge l'index ; appelé au démarrage du worker (wsgi.py / asgi.py).
+
+    Si des segments existent dans `SEARCH_SEGMENTS_DIR`, ils sont ouverts en
+    mémoire mappée ; sinon l'index est construit depuis la table `Index`. En
+    cas d'échec (base pas encore prête...), un nouvel essai a lieu après
+    `SEARCH_INDEX_RETRY_INTERVAL` secondes.
+    """
+    from .cache import current_generation
+
+    global _index, _index_failed_at, _index_generation, _segments_mtime
+    if not getattr(settings, "SEARCH_INMEMORY_INDEX", False):
+        return None
+    with _index_lock:
+        if _index is not None:
+            return _index
+        if _index_failed_at is not None and (
+                time.monotonic() - _index_failed_at < getattr(settings, "SEARCH_INDEX_RETRY_INTERVAL", 30)):
+            return None
+        start = time.perf_counter()
+        try:
+            generation = current_generation()
+            manifest = _segments_manifest()
+            if manifest is not None:
+                from .segments import SegmentedIndex
+                _segments_mtime = os.path.getmtime(manifest)
+                _index = SegmentedIndex.open(os.path.dirname(manifest))
+            else:
+                with_positions = getattr(settings, "SEARCH_INDEX_POSITIONS", True)
+                _segments_mtime = None
+                _index = InvertedIndex.from_index_table(with_positions=with_positions)
+            _index_generation = generation
+        except Exception as e:
+            # La base n'est pas prête (migrations, etc.) : les vues retombent sur l'ORM en attendant
+            logging.error(f"Impossible de charger l'index inversé : {e}")
+            _index_failed_at = time.monotonic()
+            return None
+        _index_failed_at = None
+        logging.info(
+            f"Index inversé chargé : {len(_index)} termes, {_index.num_docs} livres, "
+            f"{_index.memory_usage() / 2 ** 20:.1f} Mo en {time.perf_counter() - start:.1f}s."
+        )
+        return _index
+
+
+def _segments_changed():
+    """Vérifie (au plus toutes les quelques secondes) si le manifeste des segments a changé."""
+    global _segments_checked_at
+    now = time.monotonic()
+    if now - _segments_checked_at < getattr(settings, "SEARCH_SEGMENTS_CHECK_INTERVAL", 10):
+        return False
+    _segments_checked_at = now
+    manifest = _segments_manifest()
+    return manifest is not None and os.path.getmtime(manifest) != _segments_mtime
+
+
+def _index_changed():
+    """Vrai si les segments ont changé ou, pour un index construit depuis la table `Index`,
+    si la génération a été incrémentée (`Scripts/fetch_index.py`)."""
+    from django.db import DatabaseError
+    from .cache import current_generation
+
+    if _segments_changed():
+        return True
+    if _segments_mtime is not None:
+        return False
+    try:
+        return current_generation() != _index_generation
+    except DatabaseError:
+        return False
+
+
+def get_index():
+    """Index du processus courant, ou None si désactivé ou indisponible (repli sur l'ORM)."""
+    if _index is not None and not _index_changed():
+        return _index
+    if _index is not None:
+        reset_index()
+    return load_index()
+
+
+def reset_index():
+    """Oublie l'index chargé ; le prochain appel à `get_index` le reconstruit."""
+    global _index, _index_failed_at
+    with _index_lock:
+        _index = None
+        _index_failed_at = None
@@ -0,0 +1,89 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from book.benchmark import DEFAULT_MIX, ENDPOINTS, compare_results, generate_query_mix, load_query_mix, run_benchmark
+
+
+def parse_mix(value):
+    """`search=60,suggest=10` -> {"search": 60, "suggest": 10}"""
+    mix = {}
+    for part in value.split(","):
+        endpoint, _, share = part.partition("=")
+        if endpoint.strip() not in ENDPOINTS:
+            raise CommandError(f"Endpoint inconnu : {endpoint!r} ({', '.join(ENDPOINTS)}).")
+        mix[endpoint.strip()] = float(share or 1)
+    return mix
+
+
+class Command(BaseCommand):
+    help = ("Rejoue un mélange de requêtes sur les endpoints de recherche et mesure latence (p50/p95/p99), "
+            "requêtes SQL et mémoire par endpoint.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", help="Fichier JSONL des requêtes (sinon tirées du vocabulaire indexé).")
+        parser.add_argument("--count", type=int, default=200, help="Nombre de requêtes générées.")
+        parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                            help="Part de chaque endpoint des requêtes générées (ex. search=60,suggest=10).")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=1, help="Nombre de passes sur les requêtes.")
+        parser.add_argument("--warmup", type=int, default=10, help="Requêtes jouées avant les mesures.")
+        parser.add_argument("--memory-sample", type=int, default=20,
+                            help="Requêtes par endpoint mesurées avec tracemalloc.")
+        parser.add_argument("--with-cache", action="store_true", help="Garde le cache des résultats activé.")
+        parser.add_argument("--pagerank", action="store_true", help="Mesure aussi load_similarity_graph et compute_pagerank.")
+        parser.add_argument("--host", default="testserver",
+                            help="En-tête Host des requêtes (ajouté à ALLOWED_HOSTS le temps du benchmark).")
+        parser.add_argument("--output", help="Fichier JSON des résultats.")
+        parser.add_argument("--compare", help="Résultats JSON de référence (ex. commit précédent).")
+        parser.add_argument("--tolerance", type=float, default=0.1,
+                            help="Hausse de latence au-delà de laquelle une régression est signalée (0.1 = 10 %%).")
+
+    def handle(self, *args, **options):
+        try:
+            if options["queries"]:
+                queries = load_query_mix(options["queries"])
+            else:
+                queries = generate_query_mix(options["count"], options["mix"], seed=options["seed"])
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Requêtes invalides : {e}")
+
+        report = run_benchmark(queries, repeat=options["repeat"], warmup=options["warmup"],
+                               memory_sample=options["memory_sample"], with_cache=options["with_cache"],
+                               pagerank=options["pagerank"], host=options["host"])
+
+        self.stdout.write(f"{report['meta']['books']} livres, {report['meta']['terms']} termes, "
+                          f"index chargé en {report['index']['load_seconds']}s ({report['index']['memory_mb']} Mo)")
+        self.stdout.write(f"{'endpoint':<18}{'requêtes':>9}{'erreurs':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'SQL p50':>9}{'SQL max':>9}{'alloc Ko':>10}")
+        nan = float("nan")
+        for endpoint, stats in report["endpoints"].items():
+            latency, queries_count = stats["latency_ms"], stats["db_queries"]
+            line = (
+                f"{endpoint:<18}{stats['requests']:>9}{stats['errors']:>9}{latency.get('p50', nan):>9.1f}"
+                f"{latency.get('p95', nan):>9.1f}{latency.get('p99', nan):>9.1f}{queries_count.get('p50', nan):>9.0f}"
+                f"{queries_count.get('max', nan):>9.0f}{stats['peak_alloc_kb'].get('p50', 0):>10.0f}"
+            )
+            self.stdout.write(self.style.WARNING(line) if stats["errors"] else line)
+        errors = sum(stats["errors"] for stats in report["endpoints"].values())
+        if errors:
+            self.stdout.write(self.style.WARNING(f"{errors} réponses en erreur (hors 2xx), exclues des percentiles."))
+        if "pagerank" in report:
+            self.stdout.write(f"PageRank : {report['pagerank']}")
+        self.stdout.write(f"Mémoire résidente maximale : {report['meta']['peak_rss_mb']} Mo")
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}."))
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = 0
+            for endpoint, name, old, new, change, regression in compare_results(baseline, report, options["tolerance"]):
+                regressions += regression
+                line = f"{endpoint:<18}{name:>4} {old:>9.1f} -> {new:>9.1f} ms ({change:+.0%})"
+                self.stdout.write(self.style.ERROR(line) if regression else line)
+            if regressions:
+                self.stdout.write(self.style.WARNING(
+                    f"{regressions} percentiles plus lents de plus de {options['tolerance']:.0%} "
+                    f"que {baseline['meta'].get('commit') or options['compare']}."))
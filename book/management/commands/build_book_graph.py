@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from book.graph import DEFAULT_THRESHOLD, build_book_graph
+
+
+class Command(BaseCommand):
+    help = "Construit le graphe de similarité de Jaccard et stocke le PageRank de chaque livre."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--incremental", action="store_true",
+                            help="Ne calcule que les arêtes des livres indexés depuis la dernière exécution.")
+        parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                            help="Similarité de Jaccard minimale pour relier deux livres.")
+        parser.add_argument("--closeness", action="store_true", help="Calcule aussi la closeness centrality.")
+        parser.add_argument("--betweenness", action="store_true", help="Calcule aussi la betweenness centrality.")
+        parser.add_argument("--betweenness-samples", type=int, default=None,
+                            help="Nombre de livres échantillonnés pour approximer la betweenness.")
+
+    def handle(self, *args, **options):
+        G = build_book_graph(
+            incremental=options["incremental"],
+            threshold=options["threshold"],
+            closeness=options["closeness"],
+            betweenness=options["betweenness"],
+            betweenness_samples=options["betweenness_samples"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Graphe construit : {G.number_of_nodes()} livres, {G.number_of_edges()} arêtes."
+        ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from book.benchmark import generate_corpus
+from book.cache import bump_index_generation
+from book.indexing import BATCH_SIZE, books_to_index, index_books
+from book.models import Author, Book
+from book.statistics import update_term_statistics
+
+
+class Command(BaseCommand):
+    help = ("Génère un corpus synthétique (vocabulaire de Zipf) pour les benchmarks, puis l'indexe. "
+            "À utiliser sur une base dédiée, par exemple MYGUTENBERG_SQLITE=bench.sqlite3.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1000, help="Nombre de livres (ex. 1000, 10000, 100000).")
+        parser.add_argument("--vocabulary", type=int, default=50000, help="Nombre de mots distincts.")
+        parser.add_argument("--words-per-book", type=int, default=2000, help="Nombre moyen de mots par livre.")
+        parser.add_argument("--zipf-exponent", type=float, default=1.1, help="Exposant de la loi de Zipf.")
+        parser.add_argument("--languages", default="en", help="Langues des livres, tirées au hasard (ex. en,fr).")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--workers", type=int, default=None, help="Processus de tokenisation.")
+        parser.add_argument("--skip-index", action="store_true", help="Crée les livres sans les indexer.")
+        parser.add_argument("--clear", action="store_true", help="Supprime d'abord tous les livres et auteurs.")
+        parser.add_argument("--append", action="store_true", help="Ajoute les livres à une base non vide.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            Book.objects.all().delete()
+            Author.objects.all().delete()
+        elif Book.objects.exists() and not options["append"]:
+            raise CommandError("La base contient déjà des livres : utilisez --clear ou --append.")
+
+        total = options["books"]
+        book_ids = generate_corpus(
+            total,
+            vocabulary=options["vocabulary"],
+            words_per_book=options["words_per_book"],
+            zipf_exponent=options["zipf_exponent"],
+            languages=[language.strip() for language in options["languages"].split(",") if language.strip()],
+            seed=options["seed"],
+            progress=lambda created: self.stdout.write(f"{created}/{total} livres créés."),
+        )
+        if not options["skip_index"]:
+            # Les livres déjà indexés et inchangés sont ignorés (empreinte du texte)
+            index_books(books_to_index(), workers=options["workers"], batch_size=BATCH_SIZE)
+            update_term_statistics()
+            bump_index_generation()
+        self.stdout.write(self.style.SUCCESS(f"Corpus généré : {len(book_ids)} livres."))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from book.segments import merge_segments
+
+
+class Command(BaseCommand):
+    help = "Fusionne les segments d'index de SEARCH_SEGMENTS_DIR en un seul segment."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--segments-dir", default=settings.SEARCH_SEGMENTS_DIR)
+
+    def handle(self, *args, **options):
+        name = merge_segments(options["segments_dir"])
+        if name is None:
+            self.stdout.write("Rien à fusionner.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Segments fusionnés dans {name}."))
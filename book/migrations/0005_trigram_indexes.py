@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Index GIN pg_trgm : PostgreSQL s'en sert pour les filtres ~ (regex) et ILIKE
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS book_book_text_content_trgm "
+        "ON book_book USING gin (text_content gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS book_index_word_trgm ON book_index USING gin (word gin_trgm_ops)"
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS book_book_text_content_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS book_index_word_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0004_term_statistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0007_incremental_indexing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookText',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='full_text', serialize=False, to='book.book')),
+                ('codec', models.CharField(max_length=10)),
+                ('data', models.BinaryField()),
+                ('length', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+def merge_duplicate_authors(apps, schema_editor):
+    # Les anciens imports créaient parfois plusieurs auteurs de même nom :
+    # leurs livres sont rattachés au plus ancien avant d'ajouter la contrainte d'unicité
+    Author = apps.get_model("book", "Author")
+    Through = apps.get_model("book", "Book").authors.through
+    kept, duplicates = {}, {}
+    for author in Author.objects.order_by("id"):
+        if author.name not in kept:
+            kept[author.name] = author
+            continue
+        keeper = kept[author.name]
+        duplicates[author.id] = keeper.id
+        if keeper.birth_year is None and keeper.death_year is None:
+            keeper.birth_year, keeper.death_year = author.birth_year, author.death_year
+            keeper.save(update_fields=["birth_year", "death_year"])
+    if not duplicates:
+        return
+    rows = Through.objects.filter(author_id__in=duplicates).values_list("book_id", "author_id")
+    Through.objects.bulk_create(
+        [Through(book_id=book_id, author_id=duplicates[author_id]) for book_id, author_id in rows],
+        ignore_conflicts=True,
+    )
+    Through.objects.filter(author_id__in=duplicates).delete()
+    Author.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+    # La fusion est validée dans sa propre transaction avant l'ALTER TABLE : sous PostgreSQL,
+    # les contrôles de clés étrangères différés en attente empêcheraient de modifier `book_author`
+    atomic = False
+
+    dependencies = [
+        ('book', '0008_book_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_authors, migrations.RunPython.noop, atomic=True),
+        migrations.AlterField(
+            model_name='author',
+            name='name',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:38
+
+import book.positions
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def _convert(apps, source, target, convert):
+    # Par lots d'identifiants croissants, pour ne pas charger toute la table
+    Index = apps.get_model("book", "Index")
+    last = 0
+    while True:
+        rows = list(Index.objects.filter(pk__gt=last).order_by("pk").only("pk", source)[:BATCH_SIZE])
+        if not rows:
+            break
+        for row in rows:
+            setattr(row, target, convert(getattr(row, source)))
+        Index.objects.bulk_update(rows, [target])
+        last = rows[-1].pk
+
+
+def pack_positions(apps, schema_editor):
+    _convert(apps, "positions", "positions_packed", lambda positions: book.positions.encode_positions(positions or []))
+
+
+def unpack_positions(apps, schema_editor):
+    _convert(apps, "positions_packed", "positions", book.positions.decode_positions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0010_search_index_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='index',
+            name='positions_packed',
+            field=book.positions.PackedPositionsField(blank=True, default=bytes),
+        ),
+        migrations.RunPython(pack_positions, unpack_positions),
+        migrations.RemoveField(
+            model_name='index',
+            name='positions',
+        ),
+        migrations.RenameField(
+            model_name='index',
+            old_name='positions_packed',
+            new_name='positions',
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:41
+
+import book.positions
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0011_packed_positions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenOffsets',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='token_offsets', serialize=False, to='book.book')),
+                ('offsets', book.positions.PackedPositionsField(blank=True, default=bytes)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0012_token_offsets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LanguageTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=255)),
+                ('language', models.CharField(max_length=10)),
+                ('document_frequency', models.IntegerField(default=0)),
+                ('total_occurrences', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('language', 'word')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0013_language_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookWordForms',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='word_forms', serialize=False, to='book.book')),
+                ('forms', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WordForm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=255)),
+                ('language', models.CharField(blank=True, max_length=10)),
+                ('document_frequency', models.IntegerField(default=0)),
+                ('total_occurrences', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('language', 'word')},
+            },
+        ),
+    ]
@@ -0,0 +1,134 @@
+"""Signatures MinHash et recherche de livres similaires par LSH.
+
+La signature d'un livre est le minimum, sur ses mots indexés, de
+`MINHASH_NUM_PERM` fonctions de hachage : la proportion de composantes
+égales entre deux signatures estime la similarité de Jaccard de leurs
+vocabulaires. La signature est découpée en `MINHASH_BANDS` bandes ; deux
+livres sont candidats s'ils partagent au moins une bande (table
+`MinHashBand`, indexée sur `(band, hash)`). Deux livres de similarité `s`
+partagent une bande avec une probabilité `1 - (1 - s^r)^b` (`r` lignes par
+bande) : avec 64 bandes de 2 lignes, le seuil se situe vers 0,12.
+"""
+import hashlib
+import zlib
+from functools import lru_cache
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Book, Index, MinHashBand
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+BATCH_SIZE = 5000
+
+
+def minhash_parameters():
+    num_perm = getattr(settings, "MINHASH_NUM_PERM", 128)
+    bands = getattr(settings, "MINHASH_BANDS", 64)
+    if num_perm % bands:
+        raise ValueError("MINHASH_NUM_PERM doit être un multiple de MINHASH_BANDS.")
+    return num_perm, bands
+
+
+@lru_cache(maxsize=None)
+def _permutations(num_perm):
+    """Coefficients `(a, b)` des fonctions `(a * x + b) mod p`, identiques d'un processus à l'autre."""
+    generator = np.random.RandomState(1)
+    a = generator.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+    b = generator.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signature(words, num_perm=None):
+    """Signature MinHash (uint32) d'un ensemble de mots."""
+    num_perm = num_perm or minhash_parameters()[0]
+    signature = np.full(num_perm, MAX_HASH, dtype=np.uint32)
+    if not words:
+        return signature
+    hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    a, b = _permutations(num_perm)
+    # a et les hachés tiennent sur 32 bits : le produit ne déborde pas de 64 bits
+    values = ((hashes[:, None] * a[None, :] + b[None, :]) % np.uint64(MERSENNE_PRIME)) & np.uint64(MAX_HASH)
+    return values.min(axis=0).astype(np.uint32)
+
+
+def band_hashes(signature, bands=None):
+    """Hachage (entier signé 64 bits) de chaque bande de la signature."""
+    bands = bands or minhash_parameters()[1]
+    return [
+        int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), "little", signed=True)
+        for row in np.split(np.asarray(signature, dtype=np.uint32), bands)
+    ]
+
+
+def estimated_similarity(signature, others):
+    """Similarité de Jaccard estimée entre une signature et chaque ligne de `others`."""
+    return (np.asarray(others) == np.asarray(signature)[None, :]).mean(axis=1)
+
+
+def save_signature(book_id, words):
+    """Calcule et enregistre la signature d'un livre et ses bandes LSH."""
+    return save_signatures({book_id: words})[book_id]
+
+
+def save_signatures(words_by_book):
+    """Calcule et enregistre en lot les signatures et bandes LSH de plusieurs livres."""
+    signatures = {book_id: minhash_signature(words) for book_id, words in words_by_book.items()}
+    books = [Book(id=book_id, minhash=signature.tobytes()) for book_id, signature in signatures.items()]
+    with transaction.atomic():
+        Book.objects.bulk_update(books, ["minhash"], batch_size=BATCH_SIZE)
+        MinHashBand.objects.filter(book_id__in=signatures).delete()
+        MinHashBand.objects.bulk_create(
+            (MinHashBand(book_id=book_id, band=band, hash=value)
+             for book_id, signature in signatures.items()
+             for band, value in enumerate(band_hashes(signature))),
+            batch_size=BATCH_SIZE,
+        )
+    return signatures
+
+
+def similar_books(book, limit=10):
+    """Livres les plus similaires à `book` dans tout le corpus : `[(livre, similarité), ...]`.
+
+    Seuls les livres partageant une bande LSH sont lus : le coût dépend du
+    nombre de candidats, pas de la taille du corpus.
+    """
+    if not book.minhash:
+        return []
+    num_perm, bands = minhash_parameters()
+    signature = np.frombuffer(bytes(book.minhash), dtype=np.uint32)
+    if len(signature) != num_perm:
+        return []  # Signature calculée avec d'autres paramètres : relancer fetch_index.py --minhash
+    buckets = Q()
+    for band, value in enumerate(band_hashes(signature, bands)):
+        buckets |= Q(band=band, hash=value)
+    candidate_ids = MinHashBand.objects.filter(buckets).exclude(book_id=book.id).values("book_id").distinct()
+    candidates = [
+        candidate for candidate in Book.objects.filter(id__in=candidate_ids).only("id", "title", "minhash")
+        if candidate.minhash and len(candidate.minhash) == len(book.minhash)
+    ]
+    if not candidates:
+        return []
+    others = np.stack([np.frombuffer(bytes(candidate.minhash), dtype=np.uint32) for candidate in candidates])
+    scores = estimated_similarity(signature, others)
+    order = sorted(range(len(candidates)), key=lambda i: (-scores[i], candidates[i].id))[:limit]
+    return [(candidates[i], float(scores[i])) for i in order]
+
+
+def update_signatures(book_ids=None):
+    """Recalcule les signatures à partir de la table `Index` (sans réindexer les textes)."""
+    entries = Index.objects.order_by("book_id")
+    if book_ids is not None:
+        entries = entries.filter(book_id__in=book_ids)
+    words_by_book, count = {}, 0
+    for book_id, word in entries.values_list("book_id", "word").iterator(chunk_size=BATCH_SIZE):
+        if book_id not in words_by_book and len(words_by_book) >= 100:
+            # Les lignes sont triées par livre : les livres du lot sont complets
+            count += len(save_signatures(words_by_book))
+            words_by_book = {}
+        words_by_book.setdefault(book_id, []).append(word)
+    if words_by_book:
+        count += len(save_signatures(words_by_book))
+    return count
@@ -1,8 +1,11 @@
 import json
 from django.db import models
 
+from .positions import PackedPositionsField, decode_positions
+
 class Author(models.Model):
-    name = models.CharField(max_length=200)
+    # Unique : les imports font un upsert des auteurs par nom
+    name = models.CharField(max_length=200, unique=True)
     birth_year = models.IntegerField(null=True, blank=True)
     death_year = models.IntegerField(null=True, blank=True)
 
@@ -24,10 +27,35 @@ class Book(models.Model):
     download_count = models.IntegerField(default=0)
     copyright = models.BooleanField(default=False)
     text_content = models.TextField(null=True, blank=True)
+    # Scores de centralité précalculés par la commande `build_book_graph`
+    pagerank_score = models.FloatField(default=0)
+    closeness_score = models.FloatField(null=True, blank=True)
+    betweenness_score = models.FloatField(null=True, blank=True)
+    graph_updated_at = models.DateTimeField(null=True, blank=True)
+    # Nombre de mots indexés (hors stopwords), calculé par `index_book`
+    token_count = models.IntegerField(default=0)
+    # Empreinte SHA-256 du texte et version de l'analyseur lors de la dernière indexation :
+    # un livre inchangé n'est pas réindexé (voir `book/indexing.py`)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    index_version = models.IntegerField(default=0)
+    indexed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+    # Signature MinHash du vocabulaire (uint32 * MINHASH_NUM_PERM), voir `book/minhash.py`
+    minhash = models.BinaryField(null=True, blank=True)
 
     def __str__(self):
         return self.title
 
+    def get_text(self):
+        """Texte complet du livre : décompressé depuis `BookText` s'il y est stocké, sinon `text_content`
+        (limité aux `MAX_TEXT_LENGTH` premiers caractères à l'import)."""
+        from .text_storage import decompress
+        try:
+            stored = self.full_text
+        except BookText.DoesNotExist:
+            return self.text_content or ""
+        return decompress(stored.data, stored.codec)
+
     def get_languages(self):
         """Retourne les langues sous forme de liste."""
         return [lang.strip() for lang in self.language.split(",")]
@@ -44,7 +72,8 @@ class Index(models.Model):
     word = models.CharField(max_length=255, db_index=True)
     book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=True)
     occurrences_count = models.IntegerField()
-    positions = models.JSONField(default=list, blank=True)
+    # Rangs du mot dans le livre, encodés en binaire (voir `book/positions.py`)
+    positions = PackedPositionsField(default=bytes, blank=True)
     class Meta:
         unique_together = ('word', 'book')
 
@@ -52,6 +81,147 @@ class Index(models.Model):
         return f"{self.word} in {self.book.title}"
 
     def get_positions(self):
-        if self.positions:
-            return self.positions
-        return []
\ No newline at end of file
+        return decode_positions(self.positions)
+
+
+class TokenOffsets(models.Model):
+    """Offset en caractères (dans `Book.text_content`) de chaque mot d'un livre, par rang.
+
+    Les positions de l'index sont des rangs de mots : cette table les convertit
+    en offsets pour le surlignage.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name="token_offsets")
+    offsets = PackedPositionsField(default=bytes, blank=True)
+
+    class Meta:
+        app_label = 'book'
+
+    def __str__(self):
+        return f"{self.book_id} ({len(self.offsets)} octets)"
+
+    def get_offsets(self):
+        return decode_positions(self.offsets)
+
+
+class Term(models.Model):
+    """Statistiques d'un mot sur tout le corpus, recalculées après chaque indexation."""
+    word = models.CharField(max_length=255, unique=True)
+    document_frequency = models.IntegerField(default=0)
+    total_occurrences = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'book'
+
+    def __str__(self):
+        return f"{self.word} ({self.document_frequency} livres)"
+
+
+class LanguageTerm(models.Model):
+    """Statistiques d'un mot parmi les livres d'une langue (suggestions filtrées par langue)."""
+    word = models.CharField(max_length=255)
+    language = models.CharField(max_length=10)
+    document_frequency = models.IntegerField(default=0)
+    total_occurrences = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'book'
+        unique_together = ('language', 'word')
+
+    def __str__(self):
+        return f"{self.word} [{self.language}] ({self.document_frequency} livres)"
+
+
+class WordForm(models.Model):
+    """Statistiques d'un mot tel qu'il s'écrit (forme de surface, en minuscules), pour une langue.
+
+    `Term` et l'index contiennent des racines ("happi") : les suggestions et
+    l'expansion des termes portent sur ces mots ("happiness"). `language` vide :
+    tout le corpus.
+    """
+    word = models.CharField(max_length=255)
+    language = models.CharField(max_length=10, blank=True)
+    document_frequency = models.IntegerField(default=0)
+    total_occurrences = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'book'
+        unique_together = ('language', 'word')
+
+    def __str__(self):
+        return f"{self.word} [{self.language or '*'}] ({self.document_frequency} livres)"
+
+
+class BookWordForms(models.Model):
+    """Mots indexés d'un livre tels qu'ils s'écrivent, avec leur nombre d'occurrences : `{mot: n}`.
+
+    Écrit à l'indexation avec les postings ; sert à recalculer `WordForm`.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name="word_forms")
+    forms = models.JSONField(default=dict)
+
+    class Meta:
+        app_label = 'book'
+
+    def __str__(self):
+        return f"{self.book_id} ({len(self.forms)} mots)"
+
+
+class BookSimilarity(models.Model):
+    """Arête du graphe de Jaccard entre deux livres (stockée dans les deux sens)."""
+    source = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="similarities")
+    target = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    jaccard_similarity = models.FloatField()
+
+    class Meta:
+        app_label = 'book'
+        unique_together = ('source', 'target')
+
+    def __str__(self):
+        return f"{self.source_id} -> {self.target_id} ({self.jaccard_similarity:.3f})"
+
+
+class MinHashBand(models.Model):
+    """Bande LSH d'une signature MinHash : les livres partageant une bande sont candidats."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="minhash_bands")
+    band = models.SmallIntegerField()
+    hash = models.BigIntegerField()
+
+    class Meta:
+        app_label = 'book'
+        indexes = [models.Index(fields=["band", "hash"])]
+
+    def __str__(self):
+        return f"{self.book_id} bande {self.band}"
+
+
+class BookText(models.Model):
+    """Texte complet d'un livre, compressé (`BOOK_TEXT_COMPRESSION`), hors de la ligne `Book`.
+
+    `Book.text_content` en est le début (les caractères indexés).
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name="full_text")
+    codec = models.CharField(max_length=10)
+    data = models.BinaryField()
+    # Longueur du texte décompressé (en caractères)
+    length = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'book'
+
+    def __str__(self):
+        return f"{self.book_id} ({self.codec}, {len(self.data)} octets)"
+
+
+class SearchIndexState(models.Model):
+    """Ligne unique : génération de l'index, incrémentée par l'indexation et `build_book_graph`.
+
+    Les résultats de recherche mis en cache sont indexés par cette génération (voir `book/cache.py`).
+    """
+    generation = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'book'
+
+    def __str__(self):
+        return f"Génération {self.generation}"
@@ -0,0 +1,125 @@
+"""Pagination par curseur (keyset), sur demande : `?pagination=cursor`, puis les liens `next` / `previous`.
+
+Au lieu d'un numéro de page (`COUNT(*)` puis `OFFSET`, de plus en plus lent
+en profondeur), chaque page part de la clé du dernier élément de la
+précédente : l'id pour la liste des livres, `(score, id)` pour les
+résultats classés. Le curseur est opaque (JSON encodé en base64).
+
+Le total est optionnel : `count=none` (par défaut), `exact` (`COUNT(*)`)
+ou `estimate` (estimation du planificateur PostgreSQL, exacte ailleurs).
+Pour les résultats classés, le total est connu sans requête.
+"""
+import base64
+import binascii
+import json
+from django.db import connection
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .scoring import RankedResults
+
+COUNT_MODES = ("none", "exact", "estimate")
+
+
+def estimated_count(queryset):
+    """Nombre de lignes estimé par PostgreSQL (`EXPLAIN`), sans parcourir la table ; exact ailleurs."""
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPagination:
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    @classmethod
+    def requested(cls, request):
+        return cls.cursor_query_param in request.query_params or request.query_params.get("pagination") == "cursor"
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+            key = tuple(data["k"]) if isinstance(data["k"], list) else data["k"]
+            values = key if isinstance(key, tuple) else (key,)
+            if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                raise ValueError(key)
+            return key, bool(data.get("p"))
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise NotFound("Invalid cursor.")
+
+    @staticmethod
+    def encode_cursor(key, before=False):
+        data = {"k": list(key) if isinstance(key, tuple) else key}
+        if before:
+            data["p"] = 1
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode("ascii")).decode("ascii")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Page d'un queryset (ordonné par id) ou d'un `RankedResults` (ordonné par score puis id)."""
+        self.request = request
+        count_mode = request.query_params.get("count", "none")
+        if count_mode not in COUNT_MODES:
+            raise ValidationError({"count": f"Valeurs possibles : {', '.join(COUNT_MODES)}."})
+        size = self.get_page_size(request)
+        key, before = self.decode_cursor(request)
+        if isinstance(queryset, RankedResults):
+            if key is not None and not (isinstance(key, tuple) and len(key) == 2):
+                raise NotFound("Invalid cursor.")
+            page, has_more = queryset.keyset(key, size, before=before)
+            self.count = len(queryset) if count_mode != "none" else None
+            key_of = lambda book: (float(queryset.scores[book.pk]), book.pk)
+        else:
+            if key is not None and not isinstance(key, int):
+                raise NotFound("Invalid cursor.")
+            if count_mode == "exact":
+                self.count = queryset.count()
+            elif count_mode == "estimate":
+                self.count = estimated_count(queryset)
+            else:
+                self.count = None
+            rows = queryset.order_by("-pk" if before else "pk")
+            if key is not None:
+                rows = rows.filter(pk__lt=key) if before else rows.filter(pk__gt=key)
+            page = list(rows[:size + 1])
+            has_more, page = len(page) > size, page[:size]
+            if before:
+                page.reverse()
+            key_of = lambda book: book.pk
+        # Page précédente : elle existe si l'on est venu d'une page suivante ; et inversement
+        has_next, has_previous = (True, has_more) if before else (has_more, key is not None)
+        self.next_key = key_of(page[-1]) if page and has_next else None
+        self.previous_key = key_of(page[0]) if page and has_previous else None
+        return page
+
+    def get_link(self, key, before):
+        if key is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(key, before))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.count,
+            "next": self.get_link(self.next_key, False),
+            "previous": self.get_link(self.previous_key, True),
+            "results": data,
+        })
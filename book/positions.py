@@ -0,0 +1,70 @@
+"""Encodage binaire des positions d'un mot dans un livre (`Index.positions`).
+
+Les positions (rangs des mots dans le livre, stopwords compris, triés, sans
+doublon) sont stockées en delta : première position absolue, puis les
+écarts. Un octet d'en-tête donne la largeur commune des valeurs (1, 2 ou 4
+octets), suivies des valeurs en petit-boutiste. Les écarts entre deux
+occurrences d'un mot tiennent le plus souvent sur 1 ou 2 octets, contre 3 à
+6 caractères par position en JSON. Le même encodage sert aux offsets en
+caractères de chaque rang (`TokenOffsets.offsets`).
+
+`decode_deltas` renvoie une vue (`memoryview`) sur le buffer, sans copie ;
+`decode_positions` calcule les positions absolues (somme cumulée en Python
+pour les mots rares, avec NumPy au-delà de `NUMPY_THRESHOLD` positions).
+"""
+import sys
+from array import array
+from itertools import accumulate
+from operator import sub
+import numpy as np
+from django.db import models
+
+WIDTHS = {1: np.dtype("<u1"), 2: np.dtype("<u2"), 4: np.dtype("<u4")}
+FORMATS = {1: "B", 2: "H", 4: "I"}
+# En dessous, le coût fixe d'un appel NumPy dépasse celui d'une boucle Python
+NUMPY_THRESHOLD = 64
+
+
+def encode_positions(positions):
+    """Encode des positions (liste, tableau NumPy) ; elles sont triées et dédoublonnées."""
+    positions = sorted(set(map(int, positions)))
+    if not positions:
+        return b""
+    deltas = [positions[0], *map(sub, positions[1:], positions)]
+    largest = max(deltas)
+    width = 1 if largest < 1 << 8 else 2 if largest < 1 << 16 else 4
+    packed = array(FORMATS[width], deltas)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return bytes((width,)) + packed.tobytes()
+
+
+def decode_deltas(data):
+    """Écarts successifs (la première valeur est absolue) : vue sur `data`, sans copie."""
+    if not data:
+        return memoryview(b"").cast("I")
+    buffer = memoryview(data)
+    if sys.byteorder != "little":
+        return np.frombuffer(buffer, dtype=WIDTHS[buffer[0]], offset=1)
+    return buffer[1:].cast(FORMATS[buffer[0]])
+
+
+def decode_positions(data):
+    """Positions absolues triées (liste d'entiers)."""
+    deltas = decode_deltas(data)
+    if len(deltas) < NUMPY_THRESHOLD:
+        return list(accumulate(deltas))
+    return np.cumsum(np.asarray(deltas), dtype=np.int64).tolist()
+
+
+class PackedPositionsField(models.BinaryField):
+    """`BinaryField` des positions encodées ; accepte aussi une liste de positions à l'écriture."""
+
+    def get_prep_value(self, value):
+        if isinstance(value, (list, tuple, np.ndarray)):
+            value = encode_positions(value)
+        return super().get_prep_value(value)
+
+    def from_db_value(self, value, expression, connection):
+        # PostgreSQL renvoie un memoryview : décodable tel quel par `decode_deltas`
+        return value
@@ -0,0 +1,435 @@
+"""Requêtes booléennes (AND / OR / NOT) et expressions entre guillemets.
+
+Syntaxe acceptée par `/books/search/?q=` :
+
+    baleine capitaine          -> les deux mots (AND implicite)
+    baleine OR requin          -> l'un ou l'autre
+    baleine NOT requin         -> (ou `-requin`) exclusion
+    baleine -(requin OR orque) -> exclusion d'un groupe (ou `-"..."`)
+    "moby dick" AND (mer OR océan)
+
+Les opérateurs s'écrivent en majuscules. Les requêtes sont évaluées en
+intersectant les listes de postings triées (recherche dichotomique du
+plus petit tableau dans le plus grand, `np.searchsorted`), et l'adjacence
+des expressions est vérifiée à partir des rangs des mots stockés dans
+l'index. Le score BM25 des meilleurs livres est augmenté quand les mots de
+la requête y sont proches (plus petite fenêtre les contenant tous).
+"""
+import re
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+
+from .analysis import WORD_PATTERN, get_analyzer, language_codes
+from .cache import current_generation
+from .models import Book, Index
+from .positions import decode_positions
+from .scoring import bm25_search
+
+TOKEN_PATTERN = re.compile(r'"([^"]*)"|(\()|(\))|(-)(?=[("])|([^\s()"]+)')
+OPERATORS = {"AND", "OR", "NOT"}
+EMPTY = np.zeros(0, dtype=np.int64)
+
+
+class Term:
+    def __init__(self, word):
+        self.word = word
+
+
+class Phrase:
+    def __init__(self, words, distances):
+        self.words = words
+        # Écart de rang entre deux mots consécutifs de l'expression (stopwords retirés compris)
+        self.distances = distances
+
+
+class And:
+    def __init__(self, children):
+        self.children = children
+
+
+class Or:
+    def __init__(self, children):
+        self.children = children
+
+
+class Not:
+    def __init__(self, child):
+        self.child = child
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+def is_boolean_query(query):
+    """Vrai si la requête contient plus d'un mot, des guillemets, des parenthèses ou des opérateurs."""
+    return (len(WORD_PATTERN.findall(query)) > 1 or any(char in query for char in '"()')
+            or query.lstrip().startswith("-"))
+
+
+_languages = None
+_languages_generation = None
+
+
+def indexed_languages():
+    """Langues des livres de la base, relues quand la génération de l'index change."""
+    global _languages, _languages_generation
+    generation = current_generation()
+    if _languages is None or generation != _languages_generation:
+        values = Book.objects.values_list("language", flat=True).distinct()
+        _languages = sorted({code for value in values for code in language_codes(value)})
+        _languages_generation = generation
+    return _languages
+
+
+def reset_indexed_languages():
+    global _languages
+    _languages = None
+
+
+def query_analyzers(language=None):
+    """Analyseurs des requêtes : la langue demandée, sinon toutes les langues des livres.
+
+    Chaque livre étant racinisé dans sa langue, une requête sans `lang` est
+    analysée dans chacune et ses variantes sont combinées par OR. Sans livre,
+    `SEARCH_DEFAULT_LANGUAGE`.
+    """
+    if language:
+        return [get_analyzer(language)]
+    languages = indexed_languages() or [getattr(settings, "SEARCH_DEFAULT_LANGUAGE", "en")]
+    return [get_analyzer(code) for code in languages]
+
+
+def _analyzed_words(text, analyzers):
+    """Rangs et mots de `text` à indexer ; un stopword de l'une des langues est ignoré dans toutes."""
+    words = (match.group().lower() for match in WORD_PATTERN.finditer(text))
+    return [(rank, word) for rank, word in enumerate(words) if all(analyzer.term(word) for analyzer in analyzers)]
+
+
+def query_terms(query, language=None):
+    """Termes indexés d'une requête simple, analysés comme les livres (stopwords retirés, racines)."""
+    analyzers = query_analyzers(language)
+    terms = []
+    for _, word in _analyzed_words(query, analyzers):
+        terms.extend(dict.fromkeys(analyzer.term(word) for analyzer in analyzers))
+    return terms
+
+
+def _leaf(text, analyzers):
+    """Mot simple ou expression (OR de ses variantes par langue) ; None si le texte ne contient que des stopwords."""
+    words = _analyzed_words(text, analyzers)
+    if not words:
+        return None
+    distances = [b[0] - a[0] for a, b in zip(words, words[1:])]
+    variants = dict.fromkeys(tuple(analyzer.term(word) for _, word in words) for analyzer in analyzers)
+    nodes = [Term(terms[0]) if len(terms) == 1 else Phrase(list(terms), distances) for terms in variants]
+    return nodes[0] if len(nodes) == 1 else Or(nodes)
+
+
+def parse_query(query, language=None):
+    """Analyse la requête et retourne son arbre (Term, Phrase, And, Or, Not)."""
+    analyzers = query_analyzers(language)
+    tokens = []
+    for phrase, open_paren, close_paren, minus, word in TOKEN_PATTERN.findall(query):
+        if open_paren or close_paren:
+            tokens.append(open_paren or close_paren)
+        elif minus:  # `-` collé à une parenthèse ou à une expression : exclusion
+            tokens.append("NOT")
+        elif word in OPERATORS:
+            tokens.append(word)
+        elif word.startswith("-") and len(word) > 1:
+            tokens.extend(["NOT", ("leaf", word[1:])])
+        else:
+            tokens.append(("leaf", phrase if phrase else word))
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def parse_or():
+        nonlocal position
+        children = [parse_and()]
+        while peek() == "OR":
+            position += 1
+            children.append(parse_and())
+        children = [child for child in children if child is not None]
+        return children[0] if len(children) == 1 else (Or(children) if children else None)
+
+    def parse_and():
+        nonlocal position
+        children = [parse_unary()]
+        while peek() not in (None, "OR", ")"):
+            if peek() == "AND":
+                position += 1
+            children.append(parse_unary())
+        children = [child for child in children if child is not None]
+        return children[0] if len(children) == 1 else (And(children) if children else None)
+
+    def parse_unary():
+        nonlocal position
+        token = peek()
+        if token is None:
+            raise QuerySyntaxError("Requête incomplète.")
+        position += 1
+        if token == "NOT":
+            child = parse_unary()
+            return Not(child) if child is not None else None
+        if token == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise QuerySyntaxError("Parenthèse fermante manquante.")
+            position += 1
+            return node
+        if token in (")", "AND", "OR"):
+            raise QuerySyntaxError(f"Opérateur inattendu : {token}")
+        return _leaf(token[1], analyzers)
+
+    tree = parse_or()
+    if peek() is not None:
+        raise QuerySyntaxError(f"Élément inattendu : {peek()}")
+    return tree
+
+
+def all_words(node):
+    """Tous les mots de la requête, y compris ceux exclus par NOT."""
+    if isinstance(node, Not):
+        return all_words(node.child)
+    if isinstance(node, (And, Or)):
+        return [word for child in node.children for word in all_words(child)]
+    return positive_words(node)
+
+
+def positive_words(node):
+    """Mots de la requête qui ne sont pas sous un NOT (utilisés pour le score)."""
+    if isinstance(node, Term):
+        return [node.word]
+    if isinstance(node, Phrase):
+        return list(node.words)
+    if isinstance(node, (And, Or)):
+        return [word for child in node.children for word in positive_words(child)]
+    return []
+
+
+# Opérations sur les listes de postings (identifiants de livres triés)
+
+def intersect(a, b):
+    """Intersection de deux listes triées : chaque élément de la plus courte est
+    cherché par dichotomie dans la plus longue (O(m log n) au lieu de O(m + n))."""
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return EMPTY
+    i = np.searchsorted(b, a)
+    found = i < len(b)
+    found[found] = b[i[found]] == a[found]
+    return a[found]
+
+
+def union(a, b):
+    return np.union1d(a, b)
+
+
+def difference(a, b):
+    if not len(a) or not len(b):
+        return a
+    i = np.searchsorted(b, a)
+    found = i < len(b)
+    found[found] = b[i[found]] == a[found]
+    return a[~found]
+
+
+def phrase_matches(positions, phrase):
+    """Nombre d'occurrences de l'expression, d'après les rangs de chaque mot.
+
+    Chaque mot doit se trouver exactement au rang attendu après le précédent
+    (stopwords compris) : simple recherche dichotomique, sans relire le texte.
+    """
+    current = np.asarray(positions[0], dtype=np.int64)
+    for i, distance in enumerate(phrase.distances):
+        following = np.asarray(positions[i + 1], dtype=np.int64)
+        if not len(current) or not len(following):
+            return 0
+        expected = current + distance
+        j = np.minimum(np.searchsorted(following, expected), len(following) - 1)
+        current = expected[following[j] == expected]
+    return len(current)
+
+
+def min_span(positions):
+    """Plus petite fenêtre (en nombre de mots) contenant un rang de chaque liste, ou None.
+
+    Chaque occurrence du mot le plus rare sert d'ancre : pour les autres mots,
+    seules les occurrences les plus proches à gauche et à droite comptent, et
+    la meilleure répartition gauche / droite se calcule sur les écarts triés.
+    """
+    lists = sorted((np.asarray(p, dtype=np.int64) for p in positions), key=len)
+    if not lists or not all(len(p) for p in lists):
+        return None
+    anchors, others = lists[0], lists[1:]
+    if not others:
+        return 1
+    far = np.iinfo(np.int64).max // 4
+    left = np.empty((len(others), len(anchors)), dtype=np.int64)
+    right = np.empty_like(left)
+    for k, other in enumerate(others):
+        j = np.searchsorted(other, anchors)
+        left[k] = np.where(j > 0, anchors - other[np.maximum(j - 1, 0)], far)
+        right[k] = np.where(j < len(other), other[np.minimum(j, len(other) - 1)] - anchors, far)
+    # Les i mots les plus éloignés à gauche sont pris à droite, les autres à gauche
+    order = np.argsort(-left, axis=0)
+    left = np.take_along_axis(left, order, axis=0)
+    right = np.maximum.accumulate(np.take_along_axis(right, order, axis=0), axis=0)
+    zeros = np.zeros((1, len(anchors)), dtype=np.int64)
+    spans = np.vstack([left, zeros]) + np.vstack([zeros, right])
+    return int(spans.min()) + 1
+
+
+def proximity_boost(scores, words, source):
+    """Multiplie le score des meilleurs livres par `1 + SEARCH_PROXIMITY_WEIGHT * n / fenêtre`.
+
+    `n` est le nombre de mots distincts de la requête et `fenêtre` la plus
+    petite fenêtre de mots qui les contient tous (`n` si adjacents). Seuls
+    les `SEARCH_PROXIMITY_CANDIDATES` meilleurs livres sont recalculés.
+    """
+    weight = getattr(settings, "SEARCH_PROXIMITY_WEIGHT", 0.5)
+    words = list(dict.fromkeys(words))
+    if len(words) < 2 or not weight or not scores:
+        return scores
+    source = position_source(source)
+    limit = getattr(settings, "SEARCH_PROXIMITY_CANDIDATES", 100)
+    candidates = sorted(scores, key=lambda book_id: (-scores[book_id], book_id))[:limit]
+    if hasattr(source, "prefetch_positions"):
+        source.prefetch_positions(words, candidates)
+    boosted = dict(scores)
+    for book_id in candidates:
+        span = min_span([source.positions_for(word, book_id) for word in words])
+        if span is not None:
+            boosted[book_id] = scores[book_id] * (1 + weight * len(words) / span)
+    return boosted
+
+
+class DatabasePostings:
+    """Postings lus dans la table `Index` (repli quand l'index en mémoire est absent)."""
+
+    def __init__(self, words):
+        self.postings_by_word = defaultdict(lambda: (EMPTY, EMPTY))
+        rows = defaultdict(list)
+        for word, book_id, count in Index.objects.filter(word__in=set(words)).values_list(
+                "word", "book_id", "occurrences_count"):
+            rows[word].append((book_id, count))
+        for word, entries in rows.items():
+            entries.sort()
+            self.postings_by_word[word] = (
+                np.array([book_id for book_id, _ in entries], dtype=np.int64),
+                np.array([count for _, count in entries], dtype=np.int64),
+            )
+        self._positions = {}
+
+    def postings(self, word):
+        return self.postings_by_word[word]
+
+    def prefetch_positions(self, words, book_ids):
+        """Charge en une requête les positions des mots pour les livres candidats."""
+        for word, book_id, positions in Index.objects.filter(
+                word__in=set(words), book_id__in=[int(b) for b in book_ids]).values_list(
+                "word", "book_id", "positions"):
+            self._positions[(word, book_id)] = decode_positions(positions)
+
+    def positions_for(self, word, book_id):
+        return self._positions.get((word, int(book_id)), [])
+
+    def all_doc_ids(self):
+        return np.array(sorted(Book.objects.filter(text_content__isnull=False).values_list("id", flat=True)),
+                        dtype=np.int64)
+
+
+def position_source(source):
+    """Source des positions : l'index s'il les contient, sinon la table `Index`
+    (`SEARCH_INDEX_POSITIONS = False`, segments sans positions)."""
+    if getattr(source, "has_positions", True):
+        return source
+    return DatabasePostings(())
+
+
+def evaluate(node, source):
+    """Identifiants triés des livres satisfaisant la requête."""
+    if node is None:
+        return EMPTY
+    if isinstance(node, Term):
+        return np.asarray(source.postings(node.word)[0], dtype=np.int64)
+    if isinstance(node, Phrase):
+        candidates = evaluate(And([Term(word) for word in node.words]), source)
+        positions = position_source(source)
+        if hasattr(positions, "prefetch_positions"):
+            positions.prefetch_positions(node.words, candidates)
+        matches = [
+            book_id for book_id in candidates.tolist()
+            if phrase_matches([positions.positions_for(word, book_id) for word in node.words], node)
+        ]
+        return np.array(matches, dtype=np.int64)
+    if isinstance(node, Not):
+        return difference(np.asarray(source.all_doc_ids(), dtype=np.int64), evaluate(node.child, source))
+    if isinstance(node, Or):
+        result = EMPTY
+        for child in node.children:
+            result = union(result, evaluate(child, source))
+        return result
+    # And : les NOT sont appliqués comme des exclusions, les listes les plus courtes d'abord
+    positives = [child for child in node.children if not isinstance(child, Not)]
+    negatives = [child.child for child in node.children if isinstance(child, Not)]
+    if not positives:
+        result = np.asarray(source.all_doc_ids(), dtype=np.int64)
+    else:
+        lists = sorted((evaluate(child, source) for child in positives), key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            if not len(result):
+                break
+            result = intersect(result, other)
+    for child in negatives:
+        result = difference(result, evaluate(child, source))
+    return result
+
+
+def expand_terms(node, expand, weights):
+    """Remplace chaque mot simple par l'union des termes proches (`expand(mot) -> {terme: poids}`).
+
+    Les expressions entre guillemets restent exactes. Les poids des termes
+    ajoutés sont accumulés dans `weights`.
+    """
+    if isinstance(node, Term):
+        expansions = expand(node.word)
+        for term, weight in expansions.items():
+            weights[term] = max(weights.get(term, 0), weight)
+        return Or([Term(term) for term in expansions]) if len(expansions) > 1 else node
+    if isinstance(node, Not):
+        return Not(expand_terms(node.child, expand, weights))
+    if isinstance(node, (And, Or)):
+        return type(node)([expand_terms(child, expand, weights) for child in node.children])
+    return node
+
+
+def search_query(query, index=None, fuzzy=False, language=None):
+    """Évalue une requête booléenne et classe les livres trouvés par BM25,
+    augmenté pour les livres où les mots de la requête sont proches (`proximity_boost`).
+
+    Avec `fuzzy`, chaque mot est étendu aux termes du vocabulaire proches au
+    sens de Levenshtein, avec un score pénalisé et sans bonus de proximité. Retourne
+    `(scores, occurrences)` comme `bm25_search`. Les mots sont analysés
+    dans la langue `language` (voir `query_analyzers`).
+    """
+    tree = parse_query(query, language)
+    weights = {}
+    if fuzzy and tree is not None:
+        from .fuzzy import expand_word
+        tree = expand_terms(tree, lambda word: expand_word(word, index=index), weights)
+    source = index if index is not None else DatabasePostings(all_words(tree))
+    book_ids = evaluate(tree, source).tolist()
+    if not book_ids:
+        return {}, {}
+    scores, occurrences = bm25_search(positive_words(tree), index=index, weights=weights)
+    scores = {book_id: scores.get(book_id, 0.0) for book_id in book_ids}
+    if not fuzzy:  # Les variantes d'un même mot ne sont pas toutes présentes dans chaque livre
+        scores = proximity_boost(scores, positive_words(tree), source)
+    return scores, occurrences
@@ -0,0 +1,123 @@
+import heapq
+import math
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, Count
+from .models import Book, Index, Term
+
+
+def bm25_parameters():
+    return getattr(settings, "SEARCH_BM25_K1", 1.2), getattr(settings, "SEARCH_BM25_B", 0.75)
+
+
+def bm25_idf(document_frequency, num_docs):
+    """IDF de BM25 (variante toujours positive, comme Lucene)."""
+    return math.log(1 + (num_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def bm25_term_scores(term_freqs, doc_lengths, document_frequency, num_docs, average_doc_length):
+    """Score BM25 d'un terme pour chaque livre (calcul vectorisé)."""
+    k1, b = bm25_parameters()
+    term_freqs = np.asarray(term_freqs, dtype=np.float64)
+    doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+    norm = k1 * (1 - b + b * doc_lengths / (average_doc_length or 1))
+    return bm25_idf(document_frequency, num_docs) * term_freqs * (k1 + 1) / (term_freqs + norm)
+
+
+def bm25_search(terms, index=None, weights=None):
+    """Scores BM25 des livres contenant au moins un des termes.
+
+    Retourne `(scores, occurrences)` : `{book_id: score}` et
+    `{book_id: nombre d'occurrences des termes}`. Utilise l'index en mémoire
+    s'il est fourni, sinon les statistiques stockées en base. `weights`
+    permet de pondérer certains termes (ex. termes approchés).
+    """
+    weights = weights or {}
+    scores = defaultdict(float)
+    occurrences = defaultdict(int)
+    if index is not None:
+        num_docs, average_doc_length = index.num_docs, index.average_doc_length()
+        for term in terms:
+            doc_ids, term_freqs = index.postings(term)
+            if not len(doc_ids):
+                continue
+            term_scores = bm25_term_scores(term_freqs, index.doc_lengths_for(doc_ids), len(doc_ids),
+                                           num_docs, average_doc_length) * weights.get(term, 1)
+            for book_id, score, tf in zip(doc_ids.tolist(), term_scores.tolist(), term_freqs.tolist()):
+                scores[book_id] += score
+                occurrences[book_id] += tf
+        return dict(scores), dict(occurrences)
+
+    rows = list(Index.objects.filter(word__in=terms).values_list("book_id", "word", "occurrences_count"))
+    if not rows:
+        return {}, {}
+    stats = Book.objects.filter(token_count__gt=0).aggregate(num_docs=Count("id"), average=Avg("token_count"))
+    book_ids = {book_id for book_id, _, _ in rows}
+    doc_lengths = dict(Book.objects.filter(id__in=book_ids).values_list("id", "token_count"))
+    document_frequencies = dict(Term.objects.filter(word__in=terms).values_list("word", "document_frequency"))
+
+    postings = defaultdict(list)
+    for book_id, word, count in rows:
+        postings[word].append((book_id, count))
+    for word, entries in postings.items():
+        ids = [book_id for book_id, _ in entries]
+        term_freqs = [count for _, count in entries]
+        term_scores = bm25_term_scores(term_freqs, [doc_lengths.get(book_id, 0) for book_id in ids],
+                                       document_frequencies.get(word, len(entries)),
+                                       max(stats["num_docs"], len(book_ids)), stats["average"] or 0)
+        for book_id, score, tf in zip(ids, (term_scores * weights.get(word, 1)).tolist(), term_freqs):
+            scores[book_id] += score
+            occurrences[book_id] += tf
+    return dict(scores), dict(occurrences)
+
+
+class RankedResults:
+    """Résultats classés par score, matérialisés page par page.
+
+    Se comporte comme une séquence pour le `Paginator` de Django : seul le
+    haut du classement nécessaire à la page demandée est sélectionné (tas
+    de taille `stop`), puis seuls ces livres sont chargés depuis la base.
+    """
+
+    def __init__(self, scores, queryset=None):
+        self.scores = scores
+        self.queryset = queryset if queryset is not None else Book.objects.prefetch_related("authors")
+
+    def __len__(self):
+        return len(self.scores)
+
+    def top(self, k):
+        """Les `k` meilleurs identifiants (score décroissant, puis id croissant)."""
+        return [book_id for book_id, _ in heapq.nlargest(k, self.scores.items(), key=lambda item: (item[1], -item[0]))]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, _ = item.indices(len(self))
+            book_ids = self.top(stop)[start:stop]
+            books = self.queryset.in_bulk(book_ids)
+            return [books[book_id] for book_id in book_ids if book_id in books]
+        return self[item:item + 1][0]
+
+    def keyset(self, key=None, size=10, before=False):
+        """Livres qui suivent (ou précèdent, `before=True`) la clé `(score, id)` dans le classement.
+
+        Un seul parcours des scores, quelle que soit la profondeur de la page.
+        Retourne `(livres, il en reste d'autres)`.
+        """
+        items = self.scores.items()
+        if key is not None:
+            position = (-key[0], key[1])  # Ordre du classement : score décroissant, puis id croissant
+            if before:
+                items = [(book_id, score) for book_id, score in items if (-score, book_id) < position]
+            else:
+                items = [(book_id, score) for book_id, score in items if (-score, book_id) > position]
+        if before:
+            selected = heapq.nlargest(size + 1, items, key=lambda item: (-item[1], item[0]))[::-1]
+            has_more, selected = len(selected) > size, selected[-size:]
+        else:
+            selected = heapq.nsmallest(size + 1, items, key=lambda item: (-item[1], item[0]))
+            has_more, selected = len(selected) > size, selected[:size]
+        book_ids = [book_id for book_id, _ in selected]
+        books = self.queryset.in_bulk(book_ids)
+        return [books[book_id] for book_id in book_ids if book_id in books], has_more
@@ -0,0 +1,310 @@
+"""Segments d'index immuables sur disque, partagés entre workers par `mmap`.
+
+Un segment est un répertoire de fichiers `.npy` (un par tableau de
+`InvertedIndex` : vocabulaire, postings, positions, longueurs des livres)
+ouverts avec `np.load(mmap_mode="r")` : tous les workers Gunicorn
+partagent ainsi la même copie dans le cache de pages du système, et
+l'ouverture ne lit presque rien.
+
+Le manifeste `segments.json` liste les segments actifs, du plus ancien au
+plus récent. Un livre présent dans plusieurs segments (réindexation) n'est
+lu que dans le plus récent. Les livres supprimés de la base sont
+enregistrés dans le manifeste avec le segment écrit à ce moment
+(`deleted`) et masqués dans les segments plus anciens. `merge_segments`
+fusionne les segments en un seul et remplace le manifeste de façon
+atomique. Les mises à jour du manifeste (lecture puis écriture) se font
+sous un verrou `flock` sur le répertoire des segments : une fusion en
+arrière-plan et l'indexation suivante ne perdent pas leurs modifications.
+"""
+import contextlib
+import fcntl
+import heapq
+import json
+import logging
+import os
+import shutil
+import threading
+import numpy as np
+
+from .inverted_index import IndexBuilder, InvertedIndex, Vocabulary
+
+MANIFEST = "segments.json"
+ARRAYS = ["term_offsets", "doc_ids", "term_freqs", "doc_table", "doc_lengths", "position_offsets", "positions"]
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {"segments": [], "next_segment": 1}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    """Remplace le manifeste de façon atomique (les workers ne voient jamais un fichier partiel)."""
+    path = os.path.join(directory, MANIFEST)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def manifest_lock(directory):
+    """Verrou exclusif (entre processus) sur le manifeste du répertoire des segments."""
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # Libère le verrou
+
+
+def reserve_segment_name(directory):
+    """Réserve le nom du prochain segment dans le manifeste."""
+    with manifest_lock(directory):
+        manifest = read_manifest(directory)
+        name = f"segment_{manifest['next_segment']:06d}"
+        manifest["next_segment"] += 1
+        write_manifest(directory, manifest)
+    return name
+
+
+def save_segment(index, path):
+    """Écrit les tableaux d'un `InvertedIndex` dans le répertoire `path`."""
+    tmp_path = f"{path}.tmp"
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "vocabulary_data.npy"), index.vocabulary.data)
+    np.save(os.path.join(tmp_path, "vocabulary_offsets.npy"), index.vocabulary.offsets)
+    for name in ARRAYS:
+        array = getattr(index, name)
+        if array is not None:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"terms": len(index), "postings": len(index.doc_ids), "books": index.num_docs}, f)
+    os.rename(tmp_path, path)
+
+
+def open_segment(path):
+    """Ouvre un segment en mémoire mappée (aucune copie des tableaux)."""
+    def load(name):
+        file_path = os.path.join(path, f"{name}.npy")
+        return np.load(file_path, mmap_mode="r") if os.path.exists(file_path) else None
+
+    vocabulary = Vocabulary(load("vocabulary_data"), load("vocabulary_offsets"))
+    return InvertedIndex(vocabulary, *(load(name) for name in ARRAYS))
+
+
+def write_segment(index, directory, deleted_ids=()):
+    """Ajoute un nouveau segment au répertoire et l'enregistre dans le manifeste.
+
+    `deleted_ids` : livres supprimés, masqués dans les segments plus anciens.
+    """
+    name = reserve_segment_name(directory)
+    save_segment(index, os.path.join(directory, name))
+    with manifest_lock(directory):
+        manifest = read_manifest(directory)
+        manifest["segments"].append(name)
+        if deleted_ids:
+            manifest.setdefault("deleted", {})[name] = sorted(int(book_id) for book_id in deleted_ids)
+        write_manifest(directory, manifest)
+    logging.info(f"Segment {name} écrit : {len(index)} termes, {index.num_docs} livres, "
+                 f"{len(deleted_ids)} livres supprimés.")
+    return name
+
+
+def update_segments(indexed_ids, removed_ids, directory, merge_threshold=8):
+    """Écrit le segment d'une indexation (`Scripts/fetch_index.py --segments`).
+
+    Sans manifeste, le premier segment contient toute la table `Index` :
+    l'indexation étant incrémentale, `indexed_ids` ne couvre que les livres
+    nouveaux ou modifiés. Retourne le thread de fusion s'il a été lancé.
+    """
+    if read_manifest(directory)["segments"]:
+        if not indexed_ids and not removed_ids:
+            logging.info("Aucun livre indexé ni supprimé : pas de nouveau segment.")
+            return None
+        write_segment(InvertedIndex.from_index_table(book_ids=indexed_ids), directory, deleted_ids=removed_ids)
+    else:
+        write_segment(InvertedIndex.from_index_table(), directory)
+
+    # Fusion en arrière-plan : les workers continuent de lire les anciens segments
+    if len(read_manifest(directory)["segments"]) >= merge_threshold:
+        merge_thread = threading.Thread(target=merge_segments, args=(directory,), name="segment-merge")
+        merge_thread.start()
+        return merge_thread
+    return None
+
+
+class SegmentedIndex:
+    """Vue unique sur plusieurs segments, avec la même interface que `InvertedIndex`."""
+
+    def __init__(self, segments, deletions=None):
+        self.segments = segments
+        deletions = deletions or [()] * len(segments)
+        # Livres remplacés par un segment plus récent ou supprimés depuis, ignorés à la lecture
+        self.deleted = []
+        hidden = np.zeros(0, dtype=np.uint32)
+        live = []
+        for segment, deleted_ids in zip(reversed(segments), reversed(deletions)):
+            self.deleted.insert(0, np.intersect1d(segment.doc_table, hidden))
+            live.append(np.setdiff1d(segment.doc_table, hidden))
+            hidden = np.union1d(hidden, np.union1d(segment.doc_table, np.asarray(deleted_ids, dtype=np.uint32)))
+        self.doc_table = np.unique(np.concatenate(live)) if live else hidden
+        self.has_positions = bool(segments) and all(segment.positions is not None for segment in segments)
+
+    @classmethod
+    def open(cls, directory):
+        manifest = read_manifest(directory)
+        deleted = manifest.get("deleted", {})
+        return cls([open_segment(os.path.join(directory, name)) for name in manifest["segments"]],
+                   [deleted.get(name, ()) for name in manifest["segments"]])
+
+    def __len__(self):
+        return max((len(segment) for segment in self.segments), default=0)
+
+    @property
+    def num_docs(self):
+        return len(self.doc_table)
+
+    def _live(self, i, doc_ids):
+        if len(self.deleted[i]) == 0:
+            return np.ones(len(doc_ids), dtype=bool)
+        return ~np.isin(doc_ids, self.deleted[i])
+
+    def postings(self, word):
+        if len(self.segments) == 1:
+            return self.segments[0].postings(word)
+        doc_ids, term_freqs = [], []
+        for i, segment in enumerate(self.segments):
+            segment_doc_ids, segment_freqs = segment.postings(word)
+            live = self._live(i, segment_doc_ids)
+            doc_ids.append(segment_doc_ids[live])
+            term_freqs.append(segment_freqs[live])
+        doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.uint32)
+        term_freqs = np.concatenate(term_freqs) if term_freqs else np.zeros(0, dtype=np.uint32)
+        order = np.argsort(doc_ids, kind="stable")
+        return doc_ids[order], term_freqs[order]
+
+    def book_ids(self, word):
+        return self.postings(word)[0]
+
+    def occurrences(self, word):
+        doc_ids, term_freqs = self.postings(word)
+        return dict(zip(doc_ids.tolist(), term_freqs.tolist()))
+
+    def document_frequency(self, word):
+        return len(self.book_ids(word))
+
+    def _segment_of(self, book_id):
+        """Segment le plus récent contenant le livre (None s'il a été supprimé)."""
+        for segment, deleted in zip(reversed(self.segments), reversed(self.deleted)):
+            i = np.searchsorted(segment.doc_table, book_id)
+            if i < len(segment.doc_table) and segment.doc_table[i] == book_id:
+                j = np.searchsorted(deleted, book_id)
+                return None if j < len(deleted) and deleted[j] == book_id else segment
+        return None
+
+    def doc_length(self, book_id):
+        segment = self._segment_of(book_id)
+        return segment.doc_length(book_id) if segment is not None else 0
+
+    def all_doc_ids(self):
+        return self.doc_table
+
+    def doc_lengths_for(self, doc_ids):
+        lengths = np.zeros(len(doc_ids), dtype=np.uint32)
+        for segment in self.segments:  # Du plus ancien au plus récent : le dernier l'emporte
+            present = np.isin(doc_ids, segment.doc_table)
+            lengths[present] = segment.doc_lengths_for(doc_ids[present])
+        return lengths
+
+    def average_doc_length(self):
+        if not self.num_docs:
+            return 0.0
+        return float(self.doc_lengths_for(self.doc_table).mean())
+
+    def positions_for(self, word, book_id):
+        segment = self._segment_of(book_id)
+        if not self.has_positions:
+            return None
+        if segment is None:
+            return np.zeros(0, dtype=np.int64)
+        return segment.positions_for(word, book_id)
+
+    def terms(self):
+        """Termes de tous les segments, triés et sans doublons."""
+        previous = None
+        for term in heapq.merge(*(iter(segment.vocabulary) for segment in self.segments)):
+            if term != previous:
+                yield term
+                previous = term
+
+    def terms_matching(self, pattern, limit=None):
+        if len(self.segments) == 1:
+            return self.segments[0].terms_matching(pattern, limit=limit)
+        terms = sorted({term for segment in self.segments for term in segment.terms_matching(pattern, limit=limit)})
+        return terms[:limit] if limit is not None else terms
+
+    def terms_with_prefix(self, prefix, limit=None):
+        terms = sorted({term for segment in self.segments for term in segment.terms_with_prefix(prefix, limit=limit)})
+        return terms[:limit] if limit is not None else terms
+
+    def union_occurrences(self, words):
+        counts = {}
+        for word in words:
+            for book_id, tf in self.occurrences(word).items():
+                counts[book_id] = counts.get(book_id, 0) + tf
+        return counts
+
+    def memory_usage(self):
+        """Taille en octets des segments mappés (partagés entre workers)."""
+        return sum(segment.memory_usage() for segment in self.segments)
+
+    def merged(self):
+        """Fusionne les segments (postings vivants uniquement) en un `InvertedIndex`."""
+        with_positions = self.has_positions
+        builder = IndexBuilder(with_positions=with_positions)
+        for term in self.terms():
+            doc_ids, term_freqs = self.postings(term)
+            for book_id, tf in zip(doc_ids.tolist(), term_freqs.tolist()):
+                positions = self.positions_for(term, book_id) if with_positions else None
+                builder.add(term, book_id, occurrences=tf,
+                            positions=positions.tolist() if positions is not None else None)
+        return builder.build()
+
+
+def merge_segments(directory):
+    """Fusionne tous les segments actifs en un seul, puis supprime les anciens.
+
+    Les workers gardent l'ancien mapping tant qu'ils n'ont pas relu le
+    manifeste : supprimer un fichier mappé est sans danger sous POSIX.
+    """
+    manifest = read_manifest(directory)
+    old_segments = manifest["segments"]
+    if len(old_segments) < 2:
+        return None
+    # Réserver le nom du segment fusionné avant le (long) calcul de la fusion
+    name = reserve_segment_name(directory)
+
+    deleted = manifest.get("deleted", {})
+    merged = SegmentedIndex([open_segment(os.path.join(directory, old)) for old in old_segments],
+                            [deleted.get(old, ()) for old in old_segments]).merged()
+    save_segment(merged, os.path.join(directory, name))
+
+    with manifest_lock(directory):
+        current = read_manifest(directory)
+        if not set(old_segments) <= set(current["segments"]):
+            # Une autre fusion a déjà remplacé ces segments
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+            return None
+        # Des segments ont pu être ajoutés pendant la fusion : on les conserve
+        current["segments"] = [name] + [s for s in current["segments"] if s not in old_segments]
+        # Les suppressions des segments fusionnés sont appliquées dans le nouveau segment
+        current["deleted"] = {s: ids for s, ids in current.get("deleted", {}).items() if s not in old_segments}
+        write_manifest(directory, current)
+    for old in old_segments:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    logging.info(f"{len(old_segments)} segments fusionnés dans {name}.")
+    return name
@@ -2,19 +2,52 @@
 from rest_framework import serializers
 from .models import Author, Book, Index
 
+
+def query_param_list(request, name):
+    """Valeurs d'un paramètre de requête séparées par des virgules (`?fields=id,title`)."""
+    if request is None:
+        return set()
+    return {value.strip() for value in request.query_params.get(name, "").split(",") if value.strip()}
+
+
+class SparseFieldsMixin:
+    """Champs à la demande : `?fields=id,title` restreint la réponse, `?expand=text_content`
+    ajoute les champs coûteux listés dans `Meta.expandable_fields`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        expand = query_param_list(request, "expand")
+        for name in getattr(self.Meta, "expandable_fields", []):
+            if name not in expand:
+                self.fields.pop(name, None)
+        fields = query_param_list(request, "fields")
+        if fields:
+            for name in set(self.fields) - fields - expand:
+                self.fields.pop(name)
+
+
 class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = ['id', 'name', 'birth_year', 'death_year']
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     authors = AuthorSerializer(many=True)
     
     class Meta:
         model = Book
         fields = ['id', 'title', 'authors', 'language', 'description', 'subjects', 'bookshelves', 'cover_image', 'download_count', 'copyright', 'text_content']
 
+class BookSummarySerializer(BookSerializer):
+    """Listes et recherches : sans le texte du livre, sauf avec `?expand=text_content`."""
+
+    class Meta(BookSerializer.Meta):
+        expandable_fields = ['text_content']
+
 class IndexSerializer(serializers.ModelSerializer):
+    positions = serializers.ListField(source="get_positions", child=serializers.IntegerField(), read_only=True)
+
     class Meta:
         model = Index
         fields = ['id', 'word', 'book', 'occurrences_count','positions']
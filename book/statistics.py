@@ -0,0 +1,70 @@
+import logging
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, Sum
+from .models import BookWordForms, Index, LanguageTerm, Term, WordForm
+
+BATCH_SIZE = 5000
+
+
+def _replace_all(model, rows):
+    with transaction.atomic():
+        model.objects.all().delete()
+        batch = []
+        for row in rows:
+            batch.append(model(**row))
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+
+
+def update_term_statistics():
+    """Recalcule la fréquence documentaire et le nombre total d'occurrences de chaque mot,
+    sur tout le corpus et par langue."""
+    stats = (
+        Index.objects.values("word")
+        .annotate(document_frequency=Count("id"), total_occurrences=Sum("occurrences_count"))
+        .order_by()
+    )
+    _replace_all(Term, stats.iterator(chunk_size=BATCH_SIZE))
+    update_language_term_statistics()
+    update_word_form_statistics()
+    logging.info(f"Statistiques recalculées pour {Term.objects.count()} mots.")
+
+
+def update_language_term_statistics():
+    """Statistiques des mots par langue : un livre compte dans chacune des langues de `Book.language`."""
+    stats = defaultdict(lambda: [0, 0])
+    rows = (
+        Index.objects.values_list("word", "book__language")
+        .annotate(document_frequency=Count("id"), total_occurrences=Sum("occurrences_count"))
+        .order_by()
+    )
+    for word, languages, document_frequency, total_occurrences in rows.iterator(chunk_size=BATCH_SIZE):
+        for language in {language.strip().lower() for language in (languages or "").split(",")} - {""}:
+            entry = stats[(language, word)]
+            entry[0] += document_frequency
+            entry[1] += total_occurrences
+    _replace_all(LanguageTerm, (
+        {"language": language, "word": word, "document_frequency": df, "total_occurrences": total}
+        for (language, word), (df, total) in stats.items()
+    ))
+
+
+def update_word_form_statistics():
+    """Statistiques des mots tels qu'ils s'écrivent (suggestions, expansion des termes),
+    sur tout le corpus (langue vide) et par langue, d'après `BookWordForms`."""
+    stats = defaultdict(lambda: [0, 0])
+    rows = BookWordForms.objects.values_list("forms", "book__language")
+    for forms, languages in rows.iterator(chunk_size=100):
+        languages = {""} | {language.strip().lower() for language in (languages or "").split(",")}
+        for word, count in forms.items():
+            for language in languages:
+                entry = stats[(language, word)]
+                entry[0] += 1
+                entry[1] += count
+    _replace_all(WordForm, (
+        {"language": language, "word": word, "document_frequency": df, "total_occurrences": total}
+        for (language, word), (df, total) in stats.items()
+    ))
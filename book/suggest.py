@@ -0,0 +1,136 @@
+"""Suggestions de requêtes (`/books/suggest/?prefix=`) : mots du vocabulaire classés par fréquence.
+
+Les suggestions portent sur les mots tels qu'ils s'écrivent (table
+`WordForm`), pas sur les racines de l'index : `happin` complète en
+`happiness`. Chaque worker garde en mémoire, pour le corpus entier et pour
+chaque langue demandée, les mots triés et leur rang (nombre de livres, puis
+nombre total d'occurrences). L'intervalle des
+mots d'un préfixe est trouvé par dichotomie, puis ses `limit` meilleurs
+mots par sélection partielle (`np.argpartition`). Pour les préfixes courts
+(`SUGGEST_PRECOMPUTED_PREFIX_LENGTH` caractères au plus), dont les
+intervalles couvrent une grande partie du vocabulaire, les
+`SUGGEST_TOP_K` meilleurs mots sont précalculés.
+
+Les suggestions sont reconstruites quand la génération de l'index change
+(`Scripts/fetch_index.py`, voir `book/cache.py`).
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+import numpy as np
+from django.conf import settings
+
+from .cache import current_generation
+from .inverted_index import Vocabulary
+from .models import WordForm
+
+# Plus grand code point : borne supérieure de tous les mots commençant par un préfixe
+LAST_CHARACTER = "\U0010ffff"
+
+
+class Suggester:
+    def __init__(self, words, document_frequencies, total_occurrences, top_k=20, prefix_length=2):
+        order = sorted(range(len(words)), key=words.__getitem__)
+        self.words = [words[i] for i in order]
+        self.document_frequencies = np.asarray(document_frequencies, dtype=np.int64)[order]
+        self.total_occurrences = np.asarray(total_occurrences, dtype=np.int64)[order]
+        # Rang d'un mot : nombre de livres, puis nombre d'occurrences, en un seul entier
+        self.ranks = (self.document_frequencies << 32) | np.minimum(self.total_occurrences, 2 ** 32 - 1)
+        self.top_k = top_k
+        self.prefix_length = prefix_length
+        self.precomputed = {}
+        self._vocabulary = None
+        for length in range(1, prefix_length + 1):
+            start = 0
+            while start < len(self.words):
+                if len(self.words[start]) < length:
+                    start += 1
+                    continue
+                prefix = self.words[start][:length]
+                end = self._end(prefix, start)
+                self.precomputed[prefix] = self._best(start, end, top_k)
+                start = end
+
+    @classmethod
+    def from_queryset(cls, queryset, **kwargs):
+        rows = list(queryset.values_list("word", "document_frequency", "total_occurrences"))
+        return cls([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows], **kwargs)
+
+    def __len__(self):
+        return len(self.words)
+
+    def _end(self, prefix, start):
+        return bisect_left(self.words, prefix + LAST_CHARACTER, start)
+
+    def _best(self, start, end, limit):
+        """Identifiants des `limit` meilleurs mots de l'intervalle, du meilleur au moins bon."""
+        ranks = self.ranks[start:end]
+        if end - start > limit:
+            threshold = ranks[np.argpartition(-ranks, limit - 1)[limit - 1]]
+            # À égalité avec le dernier retenu, les premiers mots par ordre alphabétique
+            above = np.flatnonzero(ranks > threshold)
+            chosen = np.concatenate([above, np.flatnonzero(ranks == threshold)[:limit - len(above)]])
+        else:
+            chosen = np.arange(end - start)
+        # À rang égal, ordre alphabétique (les identifiants suivent l'ordre des mots)
+        chosen = chosen[np.lexsort((chosen, -ranks[chosen]))]
+        return (chosen + start).tolist()
+
+    def _entries(self, ids):
+        return [(self.words[i], int(self.document_frequencies[i]), int(self.total_occurrences[i])) for i in ids]
+
+    def with_prefix(self, prefix, limit=None):
+        """Mots commençant par `prefix`, par ordre alphabétique : `[(mot, nombre de livres, occurrences)]`."""
+        start = bisect_left(self.words, prefix)
+        end = self._end(prefix, start)
+        return self._entries(range(start, end if limit is None else min(end, start + limit)))
+
+    def matching(self, pattern, limit=None):
+        """Mots correspondant à la regex (`re.search`), par ordre alphabétique."""
+        if self._vocabulary is None:
+            # Ordre des code points = ordre des octets UTF-8 : les mots sont déjà triés
+            self._vocabulary = Vocabulary.from_terms(self.words)
+        return self._entries(self._vocabulary.match(pattern, limit=limit))
+
+    def suggest(self, prefix, limit=10):
+        """Meilleurs mots commençant par `prefix` : `[(mot, nombre de livres, occurrences)]`."""
+        if not prefix or limit <= 0:
+            return []
+        if len(prefix) <= self.prefix_length and limit <= self.top_k:
+            best = self.precomputed.get(prefix, [])[:limit]
+        else:
+            start = bisect_left(self.words, prefix)
+            best = self._best(start, self._end(prefix, start), limit)
+        return self._entries(best)
+
+
+_suggesters = {}
+_suggesters_generation = None
+_suggesters_lock = threading.Lock()
+
+
+def get_suggester(language=None):
+    """Suggestions du processus courant pour une langue (ou tout le corpus), reconstruites après indexation."""
+    global _suggesters_generation
+    generation = current_generation()
+    with _suggesters_lock:
+        if generation != _suggesters_generation:
+            _suggesters.clear()
+            _suggesters_generation = generation
+        if language not in _suggesters:
+            start = time.perf_counter()
+            queryset = WordForm.objects.filter(language=language or "")
+            _suggesters[language] = Suggester.from_queryset(
+                queryset, top_k=getattr(settings, "SUGGEST_TOP_K", 20),
+                prefix_length=getattr(settings, "SUGGEST_PRECOMPUTED_PREFIX_LENGTH", 2))
+            logging.info(f"Suggestions ({language or 'toutes langues'}) : {len(_suggesters[language])} mots "
+                         f"chargés en {time.perf_counter() - start:.2f}s.")
+        return _suggesters[language]
+
+
+def reset_suggesters():
+    global _suggesters_generation
+    with _suggesters_lock:
+        _suggesters.clear()
+        _suggesters_generation = None
@@ -0,0 +1,64 @@
+import re
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from .query import query_terms
+from .suggest import get_suggester
+
+
+class TermListView(APIView):
+    """Expansion de termes sur le vocabulaire : `?prefix=bal` (autocomplétion) ou `?regex=^bal.*e$`.
+
+    Les mots sont renvoyés tels qu'ils s'écrivent, avec les termes indexés
+    correspondants (`terms`, racines analysées comme les requêtes).
+    """
+    default_limit = 20
+    max_limit = 1000
+
+    def get(self, request):
+        prefix = request.query_params.get("prefix", "").strip().lower()
+        pattern = request.query_params.get("regex", "").strip()
+        if not prefix and not pattern:
+            return Response({"detail": "No prefix or regex provided."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get("limit", self.default_limit)), self.max_limit)
+        except ValueError:
+            return Response({"detail": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Mots tels qu'ils s'écrivent (l'index ne contient que leurs racines)
+        vocabulary = get_suggester()
+        try:
+            entries = (vocabulary.with_prefix(prefix, limit=limit) if prefix
+                       else vocabulary.matching(pattern, limit=limit))
+        except re.error as e:
+            return Response({"detail": f"Invalid regex: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        results = [{"word": word, "document_frequency": document_frequency, "terms": query_terms(word)}
+                   for word, document_frequency, _ in entries]
+        return Response({"count": len(results), "results": results})
+
+
+class SuggestView(APIView):
+    """Suggestions de requêtes : `?prefix=moby di` complète le dernier mot par les mots les plus fréquents."""
+    default_limit = 10
+    max_limit = 100
+
+    def get(self, request):
+        prefix = request.query_params.get("prefix", "").lower()
+        language = request.query_params.get("lang", "").strip().lower() or None
+        if not prefix.strip():
+            return Response({"detail": "No prefix provided."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get("limit", self.default_limit)), self.max_limit)
+        except ValueError:
+            return Response({"detail": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Mots déjà saisis, et début du dernier mot (aucun si la requête finit par une espace)
+        head, _, last = prefix.lstrip().rpartition(" ")
+        head = " ".join(head.split())
+        suggestions = get_suggester(language).suggest(last, limit) if last else []
+        results = [
+            {"query": f"{head} {word}" if head else word, "word": word,
+             "document_frequency": document_frequency, "total_occurrences": total_occurrences}
+            for word, document_frequency, total_occurrences in suggestions
+        ]
+        return Response({"count": len(results), "results": results})
@@ -1,3 +1,1102 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from aiohttp import web
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from . import async_views
+from .analysis import analyze_book, extract_words_with_positions, get_analyzer
+from .cache import bump_index_generation, get_result_cache, reset_result_cache
+from .graph import SimilarityGraph, build_book_graph, compute_pagerank
+from .fuzzy import get_bk_tree
+from .harvester import Harvester, save_authors, save_books
+from .highlighting import load_positions
+from .indexing import (INDEX_VERSION, books_to_index, bulk_create_postings, content_hash, copy_postings, index_books,
+                       write_batch)
+from .inverted_index import InvertedIndex, get_index, reset_index
+from .minhash import estimated_similarity, minhash_signature, save_signatures, similar_books
+from .models import Author, Book, BookSimilarity, BookText, BookWordForms, Index, MinHashBand, TokenOffsets
+from .positions import decode_positions, encode_positions
+from .query import (And, Not, Or, Phrase, QuerySyntaxError, Term, min_span, parse_query, query_terms,
+                    reset_indexed_languages, search_query)
+from .scoring import RankedResults, bm25_search
+from .segments import (SegmentedIndex, manifest_lock, merge_segments, read_manifest, update_segments,
+                       write_segment)
+from .statistics import update_term_statistics
+from .suggest import reset_suggesters
+from .text_storage import TextReader, compress, decompress
+from .trigram import TrigramIndex, regex_search_books, required_trigrams, trigram_index_path
+
+
+@override_settings(SEARCH_INMEMORY_INDEX=False, SEARCH_CACHE_SIZE=0)
+class BookSearchSimilarBooksTests(TestCase):
+    """Les livres similaires d'une page sont calculés en lot, sans requête par livre."""
+
+    # bm25_search (4) + livres de la page (1) + auteurs (1) + mots ou arêtes des livres (1)
+    QUERY_BUDGET = 7
+
+    def setUp(self):
+        reset_index()
+        author = Author.objects.create(name="Melville, Herman")
+        self.books = []
+        for i in range(12):
+            words = ["whale", "sea", f"word{i % 3}", f"unique{i}"]
+            book = Book.objects.create(title=f"Book {i}", language="en", text_content=" ".join(words),
+                                       token_count=len(words))
+            book.authors.add(author)
+            Index.objects.bulk_create(
+                Index(word=word, book=book, occurrences_count=1, positions=[0]) for word in words
+            )
+            self.books.append(book)
+
+    def search(self, **params):
+        return self.client.get(reverse("book-search"), {"q": "whale", **params})
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for page_size in (3, 12):
+            with self.assertNumQueries(self.QUERY_BUDGET):
+                response = self.search(page_size=page_size)
+            self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_similar_books_are_lightweight_references(self):
+        results = self.search(page_size=12).data["results"]
+        titles = {book.id: book.title for book in self.books}
+        for result in results:
+            self.assertTrue(result["similar_books"])
+            for neighbour in result["similar_books"]:
+                self.assertEqual(set(neighbour), {"id", "title", "jaccard_similarity"})
+                self.assertEqual(neighbour["title"], titles[neighbour["id"]])
+                self.assertNotEqual(neighbour["id"], result["id"])
+
+    def test_stored_graph_is_used_when_built(self):
+        Book.objects.update(graph_updated_at=timezone.now())
+        first, second = self.books[:2]
+        BookSimilarity.objects.create(source=first, target=second, jaccard_similarity=0.9)
+        BookSimilarity.objects.create(source=second, target=first, jaccard_similarity=0.9)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            results = self.search(page_size=12).data["results"]
+        neighbours = {result["id"]: result["similar_books"] for result in results}
+        self.assertEqual(neighbours[first.id], [{"id": second.id, "title": second.title, "jaccard_similarity": 0.9}])
+        self.assertEqual(neighbours[self.books[5].id], [])
+
+
+@override_settings(SEARCH_INMEMORY_INDEX=False, SEARCH_CACHE_SIZE=0)
+@override_settings(SEARCH_CACHE_SIZE=0, SEARCH_CACHE_GENERATION_CHECK_INTERVAL=0)
+class BM25Tests(TestCase):
+    TEXTS = ["whale whale whale sea", "whale sea sea sea ship ship ship ship", "sea", "ship"]
+
+    def setUp(self):
+        reset_index()
+        self.addCleanup(reset_index)
+        self.books = [self.index(f"Book {i}", text) for i, text in enumerate(self.TEXTS)]
+        update_term_statistics()
+
+    def index(self, title, text):
+        word_positions, _ = extract_words_with_positions(text, "en")
+        book = Book.objects.create(title=title, language="en", text_content=text,
+                                   token_count=sum(map(len, word_positions.values())))
+        Index.objects.bulk_create(Index(word=word, book=book, occurrences_count=len(ranks), positions=ranks)
+                                  for word, ranks in word_positions.items())
+        return book
+
+    def test_ranking(self):
+        a, b, c, d = (book.id for book in self.books)
+        scores, occurrences = bm25_search(["whale"])
+        self.assertEqual(occurrences, {a: 3, b: 1})
+        # idf = ln(1 + 2,5 / 2,5), longueur moyenne 3,5, k1 = 1,2, b = 0,75
+        norm = 1.2 * (0.25 + 0.75 * 4 / 3.5)
+        self.assertAlmostEqual(scores[a], math.log(2) * 3 * 2.2 / (3 + norm))
+        self.assertEqual(RankedResults(scores).top(2), [a, b])
+        scores, _ = bm25_search(["sea", "ship"])
+        # « ship » est plus rare que « sea » : le livre D passe devant C
+        self.assertEqual(RankedResults(scores).top(4), [b, d, c, a])
+
+    def test_index_and_orm_agree(self):
+        index = InvertedIndex.from_index_table()
+        for terms in (["whale"], ["sea", "ship"], ["whale", "sea", "ship"], ["absent"]):
+            orm_scores, orm_occurrences = bm25_search(terms)
+            index_scores, index_occurrences = bm25_search(terms, index=index)
+            self.assertEqual(index_occurrences, orm_occurrences, terms)
+            self.assertEqual(set(index_scores), set(orm_scores), terms)
+            for book_id, score in orm_scores.items():
+                self.assertAlmostEqual(index_scores[book_id], score, msg=terms)
+
+    def test_pages(self):
+        for i in range(23):
+            self.index(f"Extra {i}", " ".join(["whale"] * (1 + i % 5) + ["sea"] * (i % 3)))
+        update_term_statistics()
+        bump_index_generation()
+        scores, _ = bm25_search(["whale"])
+        expected = sorted(scores, key=lambda book_id: (-scores[book_id], book_id))
+        ranked = RankedResults(scores)
+        self.assertEqual([book.id for book in ranked[10:20]], expected[10:20])
+        self.assertEqual(ranked[0].id, expected[0])
+        for inmemory in (True, False):
+            with override_settings(SEARCH_INMEMORY_INDEX=inmemory):
+                reset_index()
+                ids = []
+                for page in (1, 2, 3):
+                    response = self.client.get(reverse("book-search"), {"q": "whale", "page": page, "page_size": 10})
+                    ids += [book["id"] for book in response.data["results"]]
+                self.assertEqual(ids, expected, inmemory)
+                self.assertEqual(response.data["count"], len(expected))
+
+
+class KeysetPaginationTests(TestCase):
+    """Pagination par curseur : même ordre que par numéro de page, liens suivant et précédent."""
+
+    def setUp(self):
+        reset_index()
+        for i in range(7):
+            book = Book.objects.create(title=f"Book {i}", language="en", text_content="whale", token_count=1 + i % 3)
+            Index.objects.create(word="whale", book=book, occurrences_count=1, positions=[0])
+
+    def walk(self, name, params):
+        response = self.client.get(reverse(name), {**params, "pagination": "cursor", "page_size": 3})
+        ids, pages = [], []
+        while True:
+            pages.append(response.data)
+            ids += [book["id"] for book in response.data["results"]]
+            if not response.data["next"]:
+                return ids, pages
+            response = self.client.get(response.data["next"])
+
+    def test_cursor_pages_follow_ranking(self):
+        for name, params in (("book-list", {}), ("book-search", {"q": "whale"})):
+            ids, pages = self.walk(name, params)
+            expected = [book["id"] for book in self.client.get(reverse(name), {**params, "page_size": 10}).data["results"]]
+            self.assertEqual(ids, expected)
+            self.assertEqual([len(page["results"]) for page in pages], [3, 3, 1])
+            previous = self.client.get(pages[-1]["previous"]).data
+            self.assertEqual(previous["results"], pages[1]["results"])
+
+    def test_count_is_optional(self):
+        params = {"pagination": "cursor"}
+        self.assertIsNone(self.client.get(reverse("book-list"), params).data["count"])
+        self.assertEqual(self.client.get(reverse("book-list"), {**params, "count": "exact"}).data["count"], 7)
+        self.assertEqual(self.client.get(reverse("book-list"), {"cursor": "not-a-cursor"}).status_code, 404)
+
+
+@override_settings(
+    SEARCH_INMEMORY_INDEX=False, SEARCH_CACHE_SIZE=10, SEARCH_CACHE_BACKEND="search",
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "search": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "search"}},
+)
+class SearchResultCacheTests(TestCase):
+    """Réponses de recherche en cache, invalidées par la génération de l'index."""
+
+    def setUp(self):
+        reset_index()
+        reset_result_cache()
+        self.addCleanup(reset_result_cache)
+        book = Book.objects.create(title="Moby Dick", language="en", text_content="whale sea", token_count=2)
+        Index.objects.bulk_create(Index(word=word, book=book, occurrences_count=1, positions=[0])
+                                  for word in ("whale", "sea"))
+
+    def test_repeated_query_is_served_from_cache(self):
+        first = self.client.get(reverse("book-search"), {"q": "whale", "page_size": 5})
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("book-search"), {"q": "  whale ", "page_size": 5})
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.client.get(reverse("book-search"), {"q": "whale", "page_size": 6})["X-Cache"], "MISS")
+        stats = self.client.get(reverse("search-cache-stats")).data
+        self.assertEqual((stats["hits"], stats["misses"]), ({"local": 1, "shared": 0}, 2))
+
+    def test_partial_responses_are_not_cached(self):
+        with mock.patch("book.book_views.full_text_matches", return_value=([], True)):
+            for _ in range(2):
+                response = self.client.get(reverse("advanced-search"), {"q": "wha.e"})
+                self.assertTrue(response.data["partial"])
+                self.assertEqual(response["X-Cache"], "MISS")
+        response = self.client.get(reverse("advanced-search"), {"q": "wha.e"})
+        self.assertFalse(response.data["partial"])
+        self.assertEqual(self.client.get(reverse("advanced-search"), {"q": "wha.e"})["X-Cache"], "HIT")
+
+    def test_shared_tier_and_generation_invalidation(self):
+        self.client.get(reverse("book-highlight-search"), {"q": "whale"})
+        get_result_cache().local.clear()  # Autre worker : seul le cache partagé a la réponse
+        self.assertEqual(self.client.get(reverse("book-highlight-search"), {"q": "whale"})["X-Cache"], "HIT")
+        self.assertEqual(get_result_cache().hits["shared"], 1)
+        bump_index_generation()
+        self.assertEqual(self.client.get(reverse("book-highlight-search"), {"q": "whale"})["X-Cache"], "MISS")
+
+
+@override_settings(SEARCH_INMEMORY_INDEX=False, SEARCH_CACHE_SIZE=0)
+class AsyncSearchViewTests(TransactionTestCase):
+    """Vues asynchrones : mêmes résultats que les vues synchrones, résultats partiels à l'échéance."""
+
+    def setUp(self):
+        reset_index()
+        author = Author.objects.create(name="Melville, Herman")
+        for i in range(4):
+            book = Book.objects.create(title=f"Book {i}", language="en", text_content="whale ship", token_count=2 + i)
+            if i % 2:
+                book.authors.add(author)
+            Index.objects.bulk_create(Index(word=word, book=book, occurrences_count=1, positions=[0])
+                                      for word in ("whale", "ship"))
+            BookWordForms.objects.create(book=book, forms={"whale": 1, "ship": 1})
+        update_term_statistics()
+
+    def results(self, name, params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return [book["id"] for book in response.json()["results"]], response.json()
+
+    def test_same_results_as_sync_views(self):
+        for sync_name, async_name, params in (
+                ("book-search", "async-book-search", {"q": "whale", "author": "melville"}),
+                ("advanced-search", "async-advanced-search", {"q": "wha.e"})):
+            expected, _ = self.results(sync_name, params)
+            ids, data = self.results(async_name, params)
+            self.assertEqual(ids, expected)
+            self.assertFalse(data["partial"])
+        self.assertEqual(self.client.get(reverse("async-advanced-search"), {"q": "(a"}).status_code, 400)
+
+    def test_cold_caches(self):
+        # Génération et langues des livres pas encore lues par ce worker : aucun accès ORM dans la boucle
+        reset_indexed_languages()
+        with mock.patch("book.cache._generation", None):
+            ids, _ = self.results("async-book-search", {"q": "whale"})
+        self.assertEqual(len(ids), 4)
+
+    def test_slow_branch_is_abandoned_at_deadline(self):
+        def slow_full_text(query, index):
+            time.sleep(1)
+            return [], False
+
+        with mock.patch.object(async_views, "full_text_matches", slow_full_text):
+            started = time.monotonic()
+            ids, data = self.results("async-advanced-search", {"q": "wha.e", "deadline": "0.2"})
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertEqual((data["partial"], data["timed_out"]), (True, ["full_text"]))
+        self.assertEqual(len(ids), 4)  # Résultats des termes du vocabulaire
+
+
+class HarvesterTests(TransactionTestCase):
+    """Import depuis un faux serveur Gutendex local (pages, textes, erreurs temporaires, reprise)."""
+
+    PAGE_SIZE = 2
+
+    def setUp(self):
+        self.books = [
+            {"id": 11 + i, "title": f"Book {i}", "languages": ["en"], "download_count": i,
+             "authors": [{"name": "Melville, Herman" if i % 2 else "Austen, Jane", "birth_year": 1800,
+                          "death_year": 1890}]}
+            for i in range(5)
+        ]
+        self.texts = {book["id"]: "whale " * 20 for book in self.books}
+        self.texts[12] = "too short"
+        self.failures = {13: 1}  # Une erreur 503 avant le texte du livre 13
+        self.malformed_pages = {}  # {page: nombre de réponses JSON invalides}
+        self.requests = []
+        checkpoint = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        checkpoint.close()
+        os.remove(checkpoint.name)
+        self.checkpoint = checkpoint.name
+        self.addCleanup(lambda: os.path.exists(self.checkpoint) and os.remove(self.checkpoint))
+
+    async def list_books(self, request):
+        self.requests.append(request.path_qs)
+        page = int(request.query.get("page", 1))
+        if self.malformed_pages.get(page):
+            self.malformed_pages[page] -= 1
+            return web.Response(text='{"count": ', content_type="application/json")
+        results = [
+            {**book, "formats": {"text/plain; charset=utf-8": str(request.url.with_path(f"/texts/{book['id']}.txt"))}}
+            for book in self.books[(page - 1) * self.PAGE_SIZE:page * self.PAGE_SIZE]
+        ]
+        return web.json_response({"count": len(self.books), "results": results})
+
+    async def book_text(self, request):
+        book_id = int(request.match_info["book_id"])
+        self.requests.append(request.path)
+        if self.failures.get(book_id):
+            self.failures[book_id] -= 1
+            return web.Response(status=503)
+        if book_id not in self.texts:
+            return web.Response(status=404)
+        return web.Response(text=self.texts[book_id])
+
+    def harvest(self, **kwargs):
+        async def run():
+            app = web.Application()
+            app.router.add_get("/books/", self.list_books)
+            app.router.add_get("/texts/{book_id}.txt", self.book_text)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = runner.addresses[0][1]
+            try:
+                harvester = Harvester(base_url=f"http://127.0.0.1:{port}/books/", checkpoint=self.checkpoint,
+                                      min_words=10, rate_limit=0, backoff=0, progress=False,
+                                      **{"max_books": 10, "batch_size": 2, **kwargs})
+                return await harvester.run()
+            finally:
+                await runner.cleanup()
+        return asyncio.run(run())
+
+    def test_imports_books_and_authors(self):
+        self.assertEqual(self.harvest(), 4)
+        self.assertEqual(set(Book.objects.values_list("id", flat=True)), {11, 13, 14, 15})
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Book.objects.get(id=14).authors.get().name, "Melville, Herman")
+        self.assertEqual(self.requests.count("/texts/13.txt"), 2)
+        with open(self.checkpoint) as f:
+            checkpoint = json.load(f)
+        self.assertEqual(checkpoint, {"pages_done": [1, 2, 3], "skipped": [12]})
+
+    def test_resumes_from_checkpoint(self):
+        self.assertEqual(self.harvest(max_books=1, batch_size=1), 1)
+        self.requests.clear()
+        self.assertEqual(self.harvest(), 3)
+        self.assertEqual(Book.objects.count(), 4)
+        # Le livre déjà importé n'est pas retéléchargé
+        self.assertNotIn("/texts/11.txt", self.requests)
+        self.requests.clear()
+        self.assertEqual(self.harvest(), 0)
+        self.assertEqual(self.requests, ["/books/?page=1"])
+
+    def test_malformed_page_is_retried_and_missing_text_skipped(self):
+        self.malformed_pages = {2: 1}
+        del self.texts[14]
+        self.assertEqual(self.harvest(), 3)
+        self.assertEqual(set(Book.objects.values_list("id", flat=True)), {11, 13, 15})
+        self.assertEqual(self.requests.count("/books/?page=2"), 2)
+        with open(self.checkpoint) as f:
+            checkpoint = json.load(f)
+        # Le texte introuvable (404) est écarté : la page 2 est terminée
+        self.assertEqual(checkpoint, {"pages_done": [1, 2, 3], "skipped": [12, 14]})
+        self.requests.clear()
+        self.assertEqual(self.harvest(), 0)
+        self.assertEqual(self.requests, ["/books/?page=1"])
+
+    def test_stores_compressed_full_text(self):
+        self.texts[11] = "  " + " ".join(f"word{i}" for i in range(500))
+        self.assertEqual(self.harvest(max_books=1, max_length=100, codec="gzip"), 1)
+        book = Book.objects.get(id=11)
+        self.assertEqual(book.text_content, self.texts[11].strip()[:100])
+        self.assertEqual(book.get_text(), self.texts[11].strip())
+        self.assertEqual(BookText.objects.get(book=book).length, len(self.texts[11].strip()))
+        response = self.client.get(reverse("book-text", args=[11]), {"offset": 6, "length": 5})
+        self.assertEqual(response.data["text"], "word1")
+        self.assertEqual(response.data["total_length"], len(self.texts[11].strip()))
+
+
+class SaveBooksTests(TestCase):
+    def record(self, book_id, *authors):
+        reader = TextReader()
+        reader.feed(b"whale ship", final=True)
+        return {"id": book_id, "title": f"Book {book_id}", "languages": ["en"],
+                "authors": [{"name": name, "birth_year": 1800, "death_year": 1890} for name in authors]}, reader
+
+    def test_batches_and_author_cache(self):
+        author_ids = {}
+        with self.assertNumQueries(6):  # Quelle que soit la taille du lot (transaction comprise)
+            created = save_books([self.record(1, "Melville, Herman"), self.record(2, "Melville, Herman", "Austen, Jane"),
+                                  self.record(3, "Austen, Jane")], author_ids)
+        self.assertEqual(created, 3)
+        self.assertEqual(author_ids, dict(Author.objects.values_list("name", "id")))
+        self.assertEqual(sorted(Book.objects.get(id=2).authors.values_list("name", flat=True)),
+                         ["Austen, Jane", "Melville, Herman"])
+        # Livre déjà en base ignoré ; auteur connu lu dans le cache, sans nouvel upsert
+        self.assertEqual(save_books([self.record(1, "Melville, Herman"), self.record(4, "Melville, Herman")],
+                                    author_ids), 1)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Book.objects.get(id=4).authors.get().id, author_ids["Melville, Herman"])
+
+    def test_upsert_returns_existing_ids(self):
+        melville = Author.objects.create(name="Melville, Herman")
+        ids = save_authors({"Melville, Herman": {"birth_year": 1819, "death_year": 1891}}, {})
+        self.assertEqual(ids, {"Melville, Herman": melville.id})
+        melville.refresh_from_db()
+        self.assertEqual((melville.birth_year, melville.death_year), (1819, 1891))
+        self.assertEqual(Author.objects.count(), 1)
+
+
+class UniqueAuthorMigrationTests(TransactionTestCase):
+    before = [("book", "0008_book_text")]
+    after = [("book", "0009_unique_author_name")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.addCleanup(lambda: MigrationExecutor(connection).migrate(executor.loader.graph.leaf_nodes()))
+        executor.migrate(self.before)
+
+    def test_duplicate_authors_are_merged(self):
+        apps = MigrationExecutor(connection).loader.project_state(self.before).apps
+        Author, Book = apps.get_model("book", "Author"), apps.get_model("book", "Book")
+        first = Author.objects.create(name="Melville, Herman")
+        second = Author.objects.create(name="Melville, Herman", birth_year=1819, death_year=1891)
+        other = Author.objects.create(name="Austen, Jane")
+        moby, typee = Book.objects.create(title="Moby Dick"), Book.objects.create(title="Typee")
+        moby.authors.add(first, second)
+        typee.authors.add(second, other)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Author, Book = apps.get_model("book", "Author"), apps.get_model("book", "Book")
+        self.assertEqual(sorted(Author.objects.values_list("id", "name", "birth_year")),
+                         [(first.id, "Melville, Herman", 1819), (other.id, "Austen, Jane", None)])
+        self.assertEqual(list(Book.objects.get(id=moby.id).authors.values_list("id", flat=True)), [first.id])
+        self.assertEqual(sorted(Book.objects.get(id=typee.id).authors.values_list("id", flat=True)),
+                         [first.id, other.id])
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title="Moby Dick", language="en", text_content="Call me Ishmael.")
+        self.book.authors.add(Author.objects.create(name="Melville, Herman"))
+
+    def fields(self, name, params, args=()):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.data["results"][0] if "results" in response.data else response.data
+        return set(data), data
+
+    def test_list_fields_and_expand(self):
+        keys, _ = self.fields("book-list", {})
+        self.assertNotIn("text_content", keys)
+        self.assertIn("authors", keys)
+        self.assertEqual(self.fields("book-list", {"fields": "id, title"})[0], {"id", "title"})
+        keys, data = self.fields("book-list", {"expand": "text_content"})
+        self.assertEqual(data["text_content"], "Call me Ishmael.")
+        self.assertEqual(self.fields("book-list", {"fields": "id", "expand": "text_content"})[0], {"id", "text_content"})
+        # Champ inconnu ignoré
+        self.assertEqual(self.fields("book-list", {"fields": "id,nope"})[0], {"id"})
+
+    def test_detail_fields(self):
+        keys, _ = self.fields("book-detail", {}, args=[self.book.id])
+        self.assertIn("text_content", keys)
+        _, data = self.fields("book-detail", {"fields": "title,authors"}, args=[self.book.id])
+        self.assertEqual(data, {"title": "Moby Dick", "authors": [
+            {"id": self.book.authors.get().id, "name": "Melville, Herman", "birth_year": None, "death_year": None}]})
+
+
+class BookTextViewTests(TestCase):
+    def setUp(self):
+        self.text = " ".join(f"word{i}" for i in range(500))
+        self.book = Book.objects.create(title="Long", text_content=self.text[:100])
+        BookText.objects.create(book=self.book, codec="gzip", data=compress(self.text, "gzip"), length=len(self.text))
+        self.url = reverse("book-text", args=[self.book.id])
+
+    def test_decompresses_only_past_text_content(self):
+        with mock.patch("book.book_views.decompress", wraps=decompress) as decompressed:
+            response = self.client.get(self.url, {"offset": 6, "length": 5})
+            self.assertEqual((response.data["text"], response.data["total_length"]), ("word1", len(self.text)))
+            self.assertEqual(self.client.get(self.url, {"length": "x"}).status_code, 400)
+            response = self.client.get(self.url, HTTP_RANGE="bytes=0-4")
+            self.assertEqual((response.content, response["Content-Range"]), (b"word0", f"bytes 0-4/{len(self.text)}"))
+            self.assertEqual(decompressed.call_count, 0)
+            response = self.client.get(self.url, {"offset": 95, "length": 12})
+            self.assertEqual(response.data["text"], self.text[95:107])
+            response = self.client.get(self.url, HTTP_RANGE="bytes=-7")
+            self.assertEqual(response.content, b"word499")
+            self.assertEqual(decompressed.call_count, 2)
+
+
+class PlainBookTextViewTests(TestCase):
+    """Texte non compressé : morceaux lus avec `SUBSTR`, plages d'octets UTF-8."""
+
+    def setUp(self):
+        self.text = "Héllo wörld"
+        self.book = Book.objects.create(title="Short", text_content=self.text)
+        self.url = reverse("book-text", args=[self.book.id])
+        self.size = len(self.text.encode("utf-8"))
+
+    def test_offset_and_length(self):
+        for params, expected in (({}, self.text), ({"offset": 1, "length": 4}, "éllo"), ({"offset": 6}, "wörld"),
+                                 ({"offset": -3, "length": 2}, "Hé"), ({"offset": 50}, ""), ({"length": 0}, "")):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.data["text"], response.data["length"], response.data["total_length"]),
+                             (expected, len(expected), len(self.text)), params)
+        self.assertEqual(self.client.get(self.url, {"offset": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("book-text", args=[999])).status_code, 404)
+
+    def test_byte_ranges(self):
+        for header, content, content_range in (("bytes=0-2", "Hé".encode(), f"bytes 0-2/{self.size}"),
+                                               ("bytes=7-", "wörld".encode(), f"bytes 7-{self.size - 1}/{self.size}"),
+                                               ("bytes=-3", b"rld", f"bytes {self.size - 3}-{self.size - 1}/{self.size}"),
+                                               ("bytes=0-999", self.text.encode(), f"bytes 0-{self.size - 1}/{self.size}")):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual((response.content, response["Content-Range"]), (content, content_range), header)
+            self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        for header in ("bytes=50-60", "bytes=5-2", "bytes=-", "items=0-1"):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response["Content-Range"], f"bytes */{self.size}")
+        self.assertEqual(self.client.get(reverse("book-text", args=[999]), HTTP_RANGE="bytes=0-1").status_code, 404)
+
+
+class TextReaderTests(TestCase):
+    def test_counts_words_across_chunks_and_stops_early(self):
+        reader = TextReader("utf-8", max_length=8, min_words=3)
+        for chunk in ["\n  wh".encode(), "ale sé".encode()[:-1], "é".encode()[-1:] + b" sea"]:
+            self.assertFalse(reader.done)
+            reader.feed(chunk)
+        self.assertEqual(reader.word_count, 3)
+        self.assertTrue(reader.done)
+        self.assertEqual(reader.text, "whale sé")
+
+
+class PackedPositionsTests(TestCase):
+    def test_round_trip_and_in_memory_index(self):
+        book = Book.objects.create(title="Moby Dick", text_content="")
+        sparse, dense = [70000, 3, 3, 300], list(range(0, 2000, 7))
+        Index.objects.create(word="sea", book=book, occurrences_count=3, positions=sparse)
+        Index.objects.create(word="whale", book=book, occurrences_count=len(dense), positions=dense)
+        self.assertEqual(encode_positions(dense)[0], 1)
+        stored = {entry.word: entry.get_positions() for entry in Index.objects.all()}
+        self.assertEqual(stored, {"sea": [3, 300, 70000], "whale": dense})
+        index = InvertedIndex.from_index_table()
+        self.assertEqual(index.positions_for("sea", book.id).tolist(), [3, 300, 70000])
+        self.assertEqual(index.positions_for("whale", book.id).tolist(), dense)
+
+
+@override_settings(SEARCH_CACHE_SIZE=0)
+class TokenPositionsTests(TestCase):
+    def setUp(self):
+        texts = ["The whale, and the sea.", "A whale met the old sea.", "Sea whale sea."]
+        self.books = [Book.objects.create(title=f"Book {i}", text_content=text) for i, text in enumerate(texts)]
+        for book in self.books:
+            word_positions, offsets = extract_words_with_positions(book.text_content, "en")
+            Index.objects.bulk_create(Index(word=word, book=book, occurrences_count=len(ranks), positions=ranks)
+                                      for word, ranks in word_positions.items())
+            TokenOffsets.objects.create(book=book, offsets=offsets)
+        self.index = InvertedIndex.from_index_table()
+
+    def test_phrases_are_exact_and_count_stopwords(self):
+        for index in (self.index, None):
+            scores, _ = search_query('"whale and the sea"', index=index)
+            self.assertEqual(list(scores), [self.books[0].id])
+            scores, _ = search_query('"whale sea"', index=index)
+            self.assertEqual(list(scores), [self.books[2].id])
+
+    def test_index_without_positions(self):
+        index = InvertedIndex.from_index_table(with_positions=False)
+        scores, _ = search_query('"whale and the sea"', index=index)
+        self.assertEqual(list(scores), [self.books[0].id])
+        # Positions lues dans la table Index : même bonus de proximité
+        self.assertEqual(search_query("whale sea", index=index)[0], search_query("whale sea", index=self.index)[0])
+        with override_settings(SEARCH_INDEX_POSITIONS=False, SEARCH_CACHE_SIZE=0):
+            reset_index()
+            self.addCleanup(reset_index)
+            response = self.client.get(reverse("book-search"), {"q": '"whale sea"'})
+            self.assertEqual([book["id"] for book in response.data["results"]], [self.books[2].id])
+            response = self.client.get(reverse("advanced-search"), {"q": "whale sea"})
+            self.assertEqual([book["id"] for book in response.data["results"]], [self.books[2].id])
+
+    def test_proximity_boost_and_highlighting(self):
+        self.assertEqual(min_span([[1, 50], [3, 60], [7, 40]]), 7)
+        scores, _ = search_query("whale sea", index=self.index)
+        self.assertGreater(scores[self.books[2].id], scores[self.books[1].id])
+        positions = load_positions(["whale", "sea"], [self.books[1].id], index=self.index)
+        self.assertEqual(positions[self.books[1].id], {"whale": [2], "sea": [20]})
+
+
+def query_tree(node):
+    """Arbre de requête sous forme de tuples, pour les comparaisons."""
+    if node is None:
+        return None
+    if isinstance(node, Term):
+        return node.word
+    if isinstance(node, Phrase):
+        return ("PHRASE", *node.words)
+    if isinstance(node, Not):
+        return ("NOT", query_tree(node.child))
+    return ("AND" if isinstance(node, And) else "OR", *(query_tree(child) for child in node.children))
+
+
+class BooleanQueryTests(TestCase):
+    def setUp(self):
+        texts = ["The whale and the sea.", "A shark in the sea.", "A whale on a raft.", "The ship."]
+        self.books = [Book.objects.create(title=f"Book {i}", text_content=text) for i, text in enumerate(texts)]
+        for book in self.books:
+            word_positions, _ = extract_words_with_positions(book.text_content, "en")
+            Index.objects.bulk_create(Index(word=word, book=book, occurrences_count=len(ranks), positions=ranks)
+                                      for word, ranks in word_positions.items())
+        self.index = InvertedIndex.from_index_table()
+
+    def parse(self, query):
+        return query_tree(parse_query(query, "en"))
+
+    def test_precedence(self):
+        self.assertEqual(self.parse("whale shark"), ("AND", "whale", "shark"))
+        self.assertEqual(self.parse("whale OR shark raft"), ("OR", "whale", ("AND", "shark", "raft")))
+        self.assertEqual(self.parse("whale AND shark OR raft"), ("OR", ("AND", "whale", "shark"), "raft"))
+        self.assertEqual(self.parse("NOT whale OR shark"), ("OR", ("NOT", "whale"), "shark"))
+
+    def test_minus_and_parentheses(self):
+        self.assertEqual(self.parse("whale -shark"), ("AND", "whale", ("NOT", "shark")))
+        self.assertEqual(self.parse("whale -shark"), self.parse("whale NOT shark"))
+        self.assertEqual(self.parse("(whale OR shark) raft"), ("AND", ("OR", "whale", "shark"), "raft"))
+        self.assertEqual(self.parse('"whale sea" -(shark OR ship)'),
+                         ("AND", ("PHRASE", "whale", "sea"), ("NOT", ("OR", "shark", "ship"))))
+        # Les stopwords disparaissent de l'arbre
+        self.assertEqual(self.parse("the whale"), "whale")
+        self.assertIsNone(self.parse("the"))
+
+    def test_not_only_queries(self):
+        self.assertEqual(self.parse("-shark"), ("NOT", "shark"))
+        self.assertEqual(self.parse("NOT shark NOT whale"), ("AND", ("NOT", "shark"), ("NOT", "whale")))
+        for index in (self.index, None):
+            scores, _ = search_query("-shark", index=index, language="en")
+            self.assertEqual(sorted(scores), [self.books[0].id, self.books[2].id, self.books[3].id])
+            scores, _ = search_query("NOT shark NOT whale", index=index, language="en")
+            self.assertEqual(sorted(scores), [self.books[3].id])
+
+    def test_syntax_errors(self):
+        for query in ("whale OR", "(whale shark", "whale)", "AND whale", "whale OR OR shark", "whale NOT"):
+            with self.assertRaises(QuerySyntaxError, msg=query):
+                parse_query(query, "en")
+            response = self.client.get(reverse("book-search"), {"q": query})
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_evaluation(self):
+        whale, shark, raft, ship = (book.id for book in self.books)
+        expected = {
+            "whale sea": [whale],
+            "whale OR shark": [whale, shark, raft],
+            "sea -shark": [whale],
+            "(whale OR shark) sea": [whale, shark],
+            "whale NOT (sea OR ship)": [raft],
+            '"whale sea"': [],  # "and the" sépare les deux mots
+            '"shark in the sea" OR ship': [shark, ship],
+            "whale shark": [],
+        }
+        for query, ids in expected.items():
+            for index in (self.index, None):
+                scores, _ = search_query(query, index=index, language="en")
+                self.assertEqual(sorted(scores), ids, (query, index))
+
+
+@override_settings(SEARCH_CACHE_GENERATION_CHECK_INTERVAL=0)
+class SuggestViewTests(TestCase):
+    def setUp(self):
+        reset_result_cache()
+        reset_suggesters()
+        english = Book.objects.create(title="Moby Dick", language="en", text_content="")
+        french = Book.objects.create(title="Les Misérables", language="fr, en", text_content="")
+        BookWordForms.objects.create(book=english, forms={"whale": 5, "whaler": 9})
+        BookWordForms.objects.create(book=french, forms={"whale": 1, "wharf": 2})
+        update_term_statistics()
+
+    def suggest(self, **params):
+        response = self.client.get(reverse("book-suggest"), params)
+        self.assertEqual(response.status_code, 200)
+        return [(result["query"], result["document_frequency"]) for result in response.data["results"]]
+
+    def test_ranked_by_frequency_and_filtered_by_language(self):
+        self.assertEqual(self.suggest(prefix="wha"), [("whale", 2), ("whaler", 1), ("wharf", 1)])
+        self.assertEqual(self.suggest(prefix="moby  wha", limit=1), [("moby whale", 2)])
+        self.assertEqual(self.suggest(prefix="w", lang="fr"), [("wharf", 1), ("whale", 1)])
+        self.assertEqual(self.suggest(prefix="whale "), [])
+
+    def test_rebuilt_after_indexing(self):
+        self.assertEqual(self.suggest(prefix="sea"), [])
+        BookWordForms.objects.filter(book=Book.objects.first()).update(forms={"whale": 5, "whaler": 9, "sea": 1})
+        update_term_statistics()
+        bump_index_generation()
+        self.assertEqual(self.suggest(prefix="sea"), [("sea", 1)])
+
+
+@override_settings(SEARCH_CACHE_SIZE=0, SEARCH_CACHE_GENERATION_CHECK_INTERVAL=0)
+class WordFormTests(TestCase):
+    """Suggestions et expansion des termes sur un corpus racinisé : les mots tels qu'ils s'écrivent."""
+
+    def setUp(self):
+        reset_suggesters()
+        reset_indexed_languages()
+        reset_index()
+        self.addCleanup(reset_index)
+        self.joyful = Book.objects.create(title="Joyful", language="en",
+                                          text_content="Happiness and happy running in cities. The runner runs.")
+        self.whales = Book.objects.create(title="Whales", language="en", text_content="Happy cities, happy whales.")
+        index_books(workers=1)
+        update_term_statistics()
+        bump_index_generation()
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_suggestions_complete_surface_words(self):
+        self.assertEqual(get_analyzer("en").term("happiness"), "happi")
+        for prefix, expected in (("happ", ["happy", "happiness"]), ("happin", ["happiness"]),
+                                 ("runn", ["runner", "running"]), ("cities", ["cities"])):
+            self.assertEqual([result["query"] for result in self.get("book-suggest", prefix=prefix)], expected, prefix)
+
+    def test_terms_are_words_with_their_indexed_terms(self):
+        self.assertEqual(self.get("term-list", prefix="happin"),
+                         [{"word": "happiness", "document_frequency": 1, "terms": ["happi"]}])
+        self.assertEqual([result["word"] for result in self.get("term-list", regex="^run")],
+                         ["runner", "running", "runs"])
+
+    def test_regex_expansion_matches_words(self):
+        # « cities » est indexé sous la racine « citi » : la regex porte sur le mot
+        results = self.get("advanced-search", q="^citie")
+        self.assertEqual(sorted(book["id"] for book in results), [self.joyful.id, self.whales.id])
+        results = self.get("advanced-search", q="ness$")
+        self.assertEqual(sorted(book["id"] for book in results), [self.joyful.id, self.whales.id])
+
+    def test_statistics_follow_reindexing(self):
+        Book.objects.filter(id=self.whales.id).update(text_content="Whales only.")
+        index_books(workers=1)
+        update_term_statistics()
+        bump_index_generation()
+        self.assertEqual([(result["query"], result["document_frequency"])
+                          for result in self.get("book-suggest", prefix="happ")], [("happiness", 1), ("happy", 1)])
+
+
+class AnalyzerTests(TestCase):
+    def test_same_stemming_at_index_and_query_time(self):
+        analyzer = get_analyzer("en")
+        self.assertIs(analyzer, get_analyzer("en"))
+        self.assertEqual(analyzer.terms("Running runs"), [("run", 0), ("run", 1)])
+        self.assertEqual(get_analyzer("xx").terms("Running"), [("running", 0)])
+        book = Book.objects.create(title="Moby Dick", language="en", text_content="Ahab kept running after whales.")
+        index = InvertedIndex.from_books(Book.objects.all())
+        for query in ("whale", "runs"):
+            scores, _ = bm25_search(query_terms(query), index=index)
+            self.assertEqual(list(scores), [book.id], query)
+        scores, _ = search_query('"running after whaling"', index=index)
+        self.assertEqual(list(scores), [book.id])
+
+    def test_queries_without_language_match_every_indexed_language(self):
+        reset_indexed_languages()
+        french = Book.objects.create(title="Candide", language="fr", text_content="Candide mangeait des citrons.")
+        both = Book.objects.create(title="Bilingue", language="en, fr", text_content="Running, la mangeait.")
+        Book.objects.create(title="Moby Dick", language="en", text_content="Ahab kept running after whales.")
+        index = InvertedIndex.from_books(Book.objects.all())
+        self.assertEqual(set(query_terms("mangeait")), {"mangeait", "mang"})
+        for query in ("mangeait", "Mangeaient"):
+            scores, _ = bm25_search(query_terms(query), index=index)
+            self.assertEqual(set(scores), {french.id, both.id}, query)
+        self.assertEqual(list(bm25_search(query_terms("mangeait", "en"), index=index)[0]), [both.id])
+        scores, _ = search_query('"la mangeait" OR citrons', index=index)
+        self.assertEqual(set(scores), {french.id, both.id})
+        # Mot vide dans l'une des langues du livre : ignoré à l'indexation comme dans la requête
+        scores, _ = search_query("running la", index=index)
+        self.assertEqual(len(scores), 2)
+
+
+@override_settings(ALLOWED_HOSTS=[])
+class BenchmarkCommandTests(TestCase):
+    def test_generate_corpus_and_benchmark(self):
+        call_command("generate_corpus", books=12, vocabulary=300, words_per_book=200, workers=1, stdout=io.StringIO())
+        self.assertEqual(Book.objects.count(), 12)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "bench.json")
+            call_command("benchmark_search", count=30, warmup=2, memory_sample=2, output=output, compare=output,
+                         stdout=io.StringIO())
+            with open(output) as f:
+                report = json.load(f)
+        self.assertEqual(report["meta"]["books"], 12)
+        self.assertEqual(sum(stats["requests"] for stats in report["endpoints"].values()), 30)
+        for endpoint, stats in report["endpoints"].items():
+            self.assertEqual(stats["status"], {"200": stats["requests"]}, endpoint)
+            self.assertEqual(stats["errors"], 0)
+            self.assertEqual(len(stats["latency_ms"]), 5)
+            self.assertIn("p99", stats["latency_ms"])
+
+
+class MinHashTests(TestCase):
+    def setUp(self):
+        words = [f"word{i}" for i in range(300)]
+        self.moby, self.copy, self.other = (Book.objects.create(title=title) for title in ("Moby Dick", "Copy", "Other"))
+        # Jaccard : copie 180 / 200 = 0,9 ; aucun mot commun avec le troisième livre
+        save_signatures({self.moby.id: words[:190], self.copy.id: words[10:200], self.other.id: words[200:]})
+
+    def test_signatures_estimate_jaccard(self):
+        words = [f"word{i}" for i in range(200)]
+        signature = minhash_signature(words)
+        self.assertEqual(signature.tolist(), minhash_signature(list(reversed(words))).tolist())
+        # Jaccard(0-99, 50-149) = 1 / 3
+        others = np.stack([minhash_signature(words[:100]), minhash_signature(words[50:150])])
+        self.assertAlmostEqual(float(estimated_similarity(others[0], others[1:])[0]), 1 / 3, delta=0.12)
+        self.assertEqual(estimated_similarity(signature, signature[None, :]).tolist(), [1.0])
+
+    def test_band_candidates(self):
+        self.moby.refresh_from_db()
+        results = similar_books(self.moby)
+        self.assertEqual([book.id for book, _ in results], [self.copy.id])  # Aucune bande commune avec l'autre
+        self.assertAlmostEqual(results[0][1], 0.9, delta=0.1)
+
+    def test_view(self):
+        response = self.client.get(reverse("book-similar", args=[self.moby.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["id"] for result in response.data["results"]], [self.copy.id])
+        for limit in ("0", "-1", "abc"):
+            response = self.client.get(reverse("book-similar", args=[self.moby.id]), {"limit": limit})
+            self.assertEqual(response.status_code, 400, limit)
+        self.assertEqual(self.client.get(reverse("book-similar", args=[999])).status_code, 404)
+
+
+class IndexBooksTests(TestCase):
+    TEXTS = ["The whale and the sea.", "Running whales, running ships.", "A ship at sea, a ship in port."]
+
+    def setUp(self):
+        self.books = [Book.objects.create(title=f"Book {i}", language="en", text_content=text)
+                      for i, text in enumerate(self.TEXTS)]
+        Book.objects.create(title="No text", language="en")
+
+    def assert_indexed(self, book):
+        book.refresh_from_db()
+        word_positions, offsets = extract_words_with_positions(book.text_content, "en")
+        rows = {word: (count, decode_positions(positions)) for word, count, positions in
+                Index.objects.filter(book=book).values_list("word", "occurrences_count", "positions")}
+        self.assertEqual(rows, {word: (len(ranks), ranks) for word, ranks in word_positions.items()})
+        self.assertEqual(TokenOffsets.objects.get(book=book).get_offsets(), offsets)
+        self.assertEqual((book.token_count, book.content_hash, book.index_version),
+                         (sum(map(len, word_positions.values())), content_hash(book.text_content), INDEX_VERSION))
+        self.assertIsNotNone(book.minhash)
+        self.assertTrue(MinHashBand.objects.filter(book=book).exists())
+
+    def test_process_pool_and_batches(self):
+        with mock.patch("book.indexing.write_batch", wraps=write_batch) as write:
+            indexed = index_books(workers=2, batch_size=2)
+        self.assertEqual(sorted(indexed), [book.id for book in self.books])
+        self.assertEqual([len(call.args[0]) for call in write.call_args_list], [2, 1])
+        for book in self.books:
+            self.assert_indexed(book)
+        self.assertEqual(BookWordForms.objects.get(book=self.books[1]).forms, {"running": 2, "whales": 1, "ships": 1})
+
+    def test_write_batch_replaces_postings(self):
+        book = self.books[0]
+        Index.objects.create(word="stale", book=book, occurrences_count=1, positions=[0])
+        write_batch([analyze_book(book.id, book.text_content, "en")], {book.id: content_hash(book.text_content)})
+        self.assert_indexed(book)
+
+    def test_unchanged_books_are_skipped(self):
+        ids = sorted(book.id for book in self.books)
+        self.assertEqual(sorted(index_books(workers=1)), ids)
+        self.assertEqual(index_books(workers=1), [])
+        # Nouvelle version de l'analyse : le livre est réindexé
+        Book.objects.filter(id=self.books[2].id).update(index_version=INDEX_VERSION - 1)
+        self.assertEqual(index_books(workers=1), [self.books[2].id])
+        self.assertEqual(sorted(index_books(workers=1, force=True)), ids)
+
+    def test_changed_book_loses_stale_postings(self):
+        index_books(workers=1)
+        others = list(Index.objects.exclude(book=self.books[0]).order_by("id").values_list("id", flat=True))
+        book = self.books[0]
+        book.text_content = "Ahab hunted the white whale."
+        book.save()
+        self.assertEqual(index_books(workers=1), [book.id])
+        self.assertEqual(sorted(Index.objects.filter(book=book).values_list("word", flat=True)),
+                         ["ahab", "hunt", "whale", "white"])
+        self.assert_indexed(book)
+        # Les postings des autres livres ne sont pas réécrits
+        self.assertEqual(list(Index.objects.exclude(book=book).order_by("id").values_list("id", flat=True)), others)
+
+    def test_since_and_book_ids(self):
+        since = timezone.now()
+        self.assertEqual(list(books_to_index(since=since)), [])
+        book = self.books[1]
+        book.save()
+        self.assertEqual(list(books_to_index(since=since)), [book])
+        self.assertEqual(list(books_to_index(book_ids=[self.books[0].id, self.books[2].id])),
+                         [self.books[0], self.books[2]])
+        self.assertEqual(index_books(books_to_index(since=since), workers=1), [book.id])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "COPY : PostgreSQL uniquement")
+    def test_copy_matches_bulk_create(self):
+        results = [analyze_book(book.id, book.text_content, "en") for book in self.books]
+        rows = []
+        for write in (bulk_create_postings, copy_postings):
+            Index.objects.all().delete()
+            write(results)
+            rows.append(sorted((word, book_id, count, bytes(positions)) for word, book_id, count, positions in
+                               Index.objects.values_list("word", "book_id", "occurrences_count", "positions")))
+        self.assertEqual(rows[0], rows[1])
+        self.assertEqual(len(rows[0]), sum(len(result[1]) for result in results))
+
+
+class IndexSegmentsTests(TestCase):
+    def index(self, title, text):
+        book = Book.objects.create(title=title, text_content=text)
+        word_positions, _ = extract_words_with_positions(text, "en")
+        Index.objects.bulk_create(Index(word=word, book=book, occurrences_count=len(ranks), positions=ranks)
+                                  for word, ranks in word_positions.items())
+        return book
+
+    def test_base_segment_and_removed_books(self):
+        moby, kon_tiki = self.index("Moby Dick", "whale sea"), self.index("Kon-Tiki", "whale raft")
+        with tempfile.TemporaryDirectory() as directory:
+            # Premier passage sans livre modifié : segment de base avec toute la table Index
+            update_segments([], [], directory)
+            self.assertEqual(SegmentedIndex.open(directory).book_ids("whale").tolist(), [moby.id, kon_tiki.id])
+
+            Index.objects.filter(book=kon_tiki).delete()
+            jaws = self.index("Jaws", "whale shark")
+            update_segments([jaws.id], [kon_tiki.id], directory)
+            for _ in range(2):  # Avant et après la fusion
+                index = SegmentedIndex.open(directory)
+                self.assertEqual(index.book_ids("whale").tolist(), [moby.id, jaws.id])
+                self.assertEqual(index.book_ids("raft").tolist(), [])
+                self.assertEqual(index.all_doc_ids().tolist(), [moby.id, jaws.id])
+                self.assertEqual(index.doc_length(kon_tiki.id), 0)
+                merge_segments(directory)
+            self.assertEqual(read_manifest(directory)["deleted"], {})
+
+    def test_write_open_and_merge(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_segment(InvertedIndex.from_postings({"whale": {1: [0], 2: [3]}, "sea": {1: [1]}}), directory)
+            # Le livre 2 est réindexé dans le segment suivant : seule sa nouvelle version compte
+            write_segment(InvertedIndex.from_postings({"whale": {3: [0]}, "raft": {2: [0]}}), directory)
+            self.assertEqual(read_manifest(directory)["segments"], ["segment_000001", "segment_000002"])
+            for _ in range(2):  # Avant et après la fusion
+                index = SegmentedIndex.open(directory)
+                self.assertEqual(index.book_ids("whale").tolist(), [1, 3])
+                self.assertEqual(index.book_ids("raft").tolist(), [2])
+                self.assertEqual(index.book_ids("sea").tolist(), [1])
+                merge_segments(directory)
+            self.assertEqual(read_manifest(directory)["segments"], ["segment_000003"])
+            self.assertEqual(sorted(e for e in os.listdir(directory) if e.startswith("segment_")), ["segment_000003"])
+
+    def test_segment_written_during_merge_is_kept(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for book_id in (1, 2):
+                write_segment(InvertedIndex.from_postings({"whale": {book_id: [0]}}), directory)
+            merged = SegmentedIndex.merged
+
+            def merged_with_concurrent_write(index):
+                write_segment(InvertedIndex.from_postings({"whale": {3: [0]}}), directory)
+                return merged(index)
+
+            with mock.patch.object(SegmentedIndex, "merged", merged_with_concurrent_write):
+                name = merge_segments(directory)
+            self.assertEqual(read_manifest(directory)["segments"], [name, "segment_000004"])
+            self.assertEqual(SegmentedIndex.open(directory).book_ids("whale").tolist(), [1, 2, 3])
+
+    def test_manifest_lock_blocks_writers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = threading.Thread(target=write_segment,
+                                      args=(InvertedIndex.from_postings({"whale": {1: [0]}}), directory))
+            with manifest_lock(directory):
+                writer.start()
+                writer.join(0.2)
+                self.assertTrue(writer.is_alive())
+            writer.join(5)
+            self.assertFalse(writer.is_alive())
+            self.assertEqual(read_manifest(directory)["segments"], ["segment_000001"])
+
+
+class TrigramTests(TestCase):
+    def test_required_trigrams(self):
+        self.assertEqual(required_trigrams("(?i)WHale"), {"wha", "hal", "ale"})
+        self.assertEqual(required_trigrams("moby.*dick"), {"mob", "oby", "dic", "ick"})
+        self.assertEqual(required_trigrams("sea(?:s)?horse"), {"sea", "hor", "ors", "rse"})
+        self.assertEqual(required_trigrams("wha(le|ling)"), {"wha", "hal"})
+        for pattern in ("a|b", "wh[ae]le", "x{0,3}yz"):
+            self.assertEqual(required_trigrams(pattern), set(), pattern)
+
+    def test_candidates_and_books_added_later(self):
+        moby = Book.objects.create(title="Moby Dick", text_content="Call me Ishmael. The WHALE.")
+        jaws = Book.objects.create(title="Jaws", text_content="The shark and the whaler.")
+        Book.objects.create(title="Kon-Tiki", text_content="A raft on the sea.")
+        index = TrigramIndex.from_books()
+        self.assertEqual(index.candidates("whale").tolist(), [moby.id, jaws.id])
+        self.assertEqual(index.candidates("ishmael.*whale").tolist(), [moby.id])
+        self.assertEqual(index.candidates("zzz").tolist(), [])
+        self.assertIsNone(index.candidates("wh.le"))
+        with tempfile.TemporaryDirectory() as directory, override_settings(SEARCH_SEGMENTS_DIR=directory):
+            index.save(trigram_index_path())
+            later = Book.objects.create(title="Whale Rider", text_content="Whale rider.")
+            self.assertEqual(regex_search_books("[Ww]hale ", 10), ([later.id], False))
+            self.assertEqual(regex_search_books("(?i)whale", 10), ([moby.id, jaws.id, later.id], False))
+
+
+class PageRankTests(TestCase):
+    def test_known_graph(self):
+        # Chemin a - b - c : x_a = x_c = 0,07125 / 0,2775 et x_b = 0,05 + 1,7 x_a
+        path = SimilarityGraph(np.array([1, 2, 3]), np.array([0, 1, 1, 2]), np.array([1, 0, 2, 1]),
+                               np.full(4, 0.5))
+        scores = compute_pagerank(path, tol=1e-12, max_iter=1000)
+        self.assertAlmostEqual(scores[1], 0.07125 / 0.2775, places=6)
+        self.assertAlmostEqual(scores[2], 0.05 + 1.7 * 0.07125 / 0.2775, places=6)
+        self.assertAlmostEqual(scores[3], scores[1])
+
+    def test_build_book_graph_from_stored_edges(self):
+        books = [Book.objects.create(title=f"Book {i}", text_content=text)
+                 for i, text in enumerate(["whale sea ship", "whale sea harpoon", "raft island"])]
+        for book in books:
+            Index.objects.bulk_create(Index(word=word, book=book, occurrences_count=1, positions=[rank])
+                                      for rank, word in enumerate(book.text_content.split()))
+        graph = build_book_graph()
+        self.assertEqual((graph.number_of_nodes(), graph.number_of_edges()), (3, 1))
+        self.assertEqual(BookSimilarity.objects.count(), 2)
+        scores = dict(Book.objects.values_list("id", "pagerank_score"))
+        self.assertAlmostEqual(sum(scores.values()), 1.0)
+        self.assertAlmostEqual(scores[books[0].id], scores[books[1].id])
+        self.assertGreater(scores[books[0].id], scores[books[2].id])
+        for book_id, score in compute_pagerank(graph.to_networkx()).items():
+            self.assertAlmostEqual(score, scores[book_id])
+
+
+@override_settings(SEARCH_FUZZY_MIN_DOCUMENT_FREQUENCY=1, SEARCH_CACHE_SIZE=0, SEARCH_CACHE_GENERATION_CHECK_INTERVAL=0)
+class FuzzySearchTests(TestCase):
+    def test_misspelling_matches_with_penalty(self):
+        harpoon = Book.objects.create(title="A", text_content="The captain threw the harpoon.")
+        harpon = Book.objects.create(title="B", text_content="Le harpon du capitaine.")
+        Book.objects.create(title="C", text_content="A raft on the sea.")
+        index = InvertedIndex.from_books(Book.objects.all())
+        self.assertEqual(search_query("harpooon", index=index), ({}, {}))
+        scores, _ = search_query("harpooon", index=index, fuzzy=True)
+        # Une modification (harpoon) avant deux (harpon)
+        self.assertEqual(sorted(scores, key=scores.get, reverse=True), [harpoon.id, harpon.id])
+        scores, _ = search_query("harpon", index=index, fuzzy=True)
+        self.assertEqual(sorted(scores, key=scores.get, reverse=True), [harpon.id, harpoon.id])
+
+    def test_tree_follows_the_index_generation(self):
+        book = Book.objects.create(title="A", text_content="whale")
+        self.assertEqual(get_bk_tree(InvertedIndex.from_books(Book.objects.all())).search("whalr", 1), {"whale": 1})
+        # Même taille de vocabulaire : seule la génération distingue le nouvel index
+        Book.objects.filter(pk=book.pk).update(text_content="shark")
+        bump_index_generation()
+        self.assertEqual(get_bk_tree(InvertedIndex.from_books(Book.objects.all())).search("sharc", 1), {"shark": 1})
+
+
+@override_settings(SEARCH_INMEMORY_INDEX=True, SEARCH_SEGMENTS_DIR=None, SEARCH_CACHE_GENERATION_CHECK_INTERVAL=0)
+class IndexReloadTests(TestCase):
+    def setUp(self):
+        reset_index()
+        self.addCleanup(reset_index)
+        self.book = Book.objects.create(title="Moby Dick", text_content="whale ship")
+        Index.objects.create(word="whale", book=self.book, occurrences_count=1, positions=[0])
+
+    def test_retries_after_failure(self):
+        with override_settings(SEARCH_INDEX_RETRY_INTERVAL=3600), \
+                mock.patch.object(InvertedIndex, "from_index_table", side_effect=RuntimeError("no table")) as load:
+            self.assertIsNone(get_index())
+            self.assertIsNone(get_index())
+            self.assertEqual(load.call_count, 1)
+        with override_settings(SEARCH_INDEX_RETRY_INTERVAL=0):
+            self.assertEqual(get_index().book_ids("whale").tolist(), [self.book.id])
+
+    def test_reloaded_when_generation_changes(self):
+        index = get_index()
+        self.assertIs(get_index(), index)
+        Index.objects.create(word="ship", book=self.book, occurrences_count=1, positions=[1])
+        self.assertEqual(get_index().book_ids("ship").tolist(), [])
+        bump_index_generation()
+        self.assertEqual(get_index().book_ids("ship").tolist(), [self.book.id])
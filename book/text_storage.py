@@ -0,0 +1,134 @@
+"""Lecture en continu et stockage compressé des textes des livres.
+
+Un texte téléchargé est décodé et compté par morceaux (`TextReader`) : le
+téléchargement s'arrête dès que le seuil de mots et la limite de
+`Book.text_content` sont atteints. Si `BOOK_TEXT_COMPRESSION` vaut
+`"gzip"` ou `"zstd"`, le texte est lu jusqu'au bout et compressé au fil
+de l'eau dans la table `BookText` ; `Book.get_text()` le décompresse.
+`"zstd"` nécessite le paquet `zstandard` (`pip install zstandard`).
+"""
+import codecs
+import re
+import zlib
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ("gzip", "zstd")
+NON_SPACE = re.compile(r"\S+")
+
+
+def storage_codec():
+    """Codec de stockage des textes complets configuré, ou `None`."""
+    codec = getattr(settings, "BOOK_TEXT_COMPRESSION", None) or None
+    if codec is not None:
+        _check_codec(codec)
+    return codec
+
+
+def _check_codec(codec):
+    if codec not in CODECS:
+        raise ImproperlyConfigured(f"Codec de texte inconnu : {codec!r} (attendu : {', '.join(CODECS)}).")
+    if codec == "zstd" and zstandard is None:
+        raise ImproperlyConfigured("Le codec 'zstd' nécessite le paquet zstandard.")
+
+
+def compressor(codec):
+    """Compresseur incrémental (`compress(octets)` puis `flush()`)."""
+    _check_codec(codec)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compressobj()
+    return zlib.compressobj(9, zlib.DEFLATED, 31)  # wbits=31 : format gzip
+
+
+def compress(text, codec):
+    stream = compressor(codec)
+    return stream.compress(text.encode("utf-8")) + stream.flush()
+
+
+def stored_size(data, codec):
+    """Taille en octets du texte décompressé, sans le décompresser ; None si elle n'est pas écrite."""
+    _check_codec(codec)
+    data = bytes(data)
+    if codec == "zstd":
+        size = zstandard.frame_content_size(data)
+        return size if size >= 0 else None
+    # Champ ISIZE de la fin du flux gzip (taille modulo 2**32, les textes sont bien plus petits)
+    return int.from_bytes(data[-4:], "little") if len(data) >= 18 else None
+
+
+def decompress(data, codec):
+    _check_codec(codec)
+    data = bytes(data)
+    if codec == "zstd":
+        # Pas de decompress() : la taille du texte n'est pas écrite dans une trame produite en continu
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data).decode("utf-8")
+    return zlib.decompress(data, 31).decode("utf-8")
+
+
+class TextReader:
+    """Décode un texte reçu par morceaux, compte ses mots et garde ses `max_length` premiers caractères.
+
+    Les blancs de début de texte sont ignorés. Avec `codec`, le texte complet est aussi compressé.
+    """
+
+    def __init__(self, encoding="utf-8", max_length=100000, min_words=0, codec=None):
+        try:
+            self.decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.max_length = max_length
+        self.min_words = min_words
+        self.codec = codec
+        self.compressor = compressor(codec) if codec else None
+        self.word_count = 0
+        self.length = 0  # Caractères lus (texte complet)
+        self.complete = False
+        self._parts = []
+        self._kept = 0
+        self._in_word = False
+        self._compressed = []
+
+    @property
+    def done(self):
+        """Plus rien à apprendre du reste du texte (sauf pour le stocker en entier)."""
+        return (self.compressor is None and self.word_count >= self.min_words
+                and self._kept >= self.max_length)
+
+    def feed(self, data, final=False):
+        chunk = self.decoder.decode(data, final)
+        if not self.length:
+            chunk = chunk.lstrip()
+        if not chunk:
+            return
+        words = NON_SPACE.findall(chunk)
+        self.word_count += len(words)
+        if self._in_word and not chunk[0].isspace():
+            self.word_count -= 1  # Mot coupé entre deux morceaux
+        self._in_word = not chunk[-1].isspace()
+        self.length += len(chunk)
+        if self._kept < self.max_length:
+            kept = chunk[:self.max_length - self._kept]
+            self._parts.append(kept)
+            self._kept += len(kept)
+        if self.compressor is not None:
+            self._compressed.append(self.compressor.compress(chunk.encode("utf-8")))
+
+    def finish(self):
+        """Fin du flux : le texte a été lu en entier."""
+        self.feed(b"", final=True)
+        self.complete = True
+
+    @property
+    def text(self):
+        """Début du texte (`Book.text_content`)."""
+        text = "".join(self._parts)
+        return text.rstrip() if self.complete and self.length <= self.max_length else text
+
+    def compressed(self):
+        """Texte complet compressé (après `finish()`)."""
+        return b"".join(self._compressed) + self.compressor.flush()
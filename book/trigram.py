@@ -0,0 +1,214 @@
+"""Préfiltre par trigrammes pour la recherche par expression régulière.
+
+Une regex est décomposée en trigrammes obligatoires (ceux des suites de
+caractères littéraux qu'elle impose) ; seuls les livres contenant tous ces
+trigrammes sont candidats, et la vraie regex n'est vérifiée que sur eux.
+
+`TrigramIndex` associe à chaque trigramme (texte mis en minuscules) un
+bitset des livres qui le contiennent. Il est construit par
+`Scripts/fetch_index.py --trigrams`, reconstruit à chaque indexation
+ensuite, et ouvert en `mmap` par les workers. Les livres ajoutés depuis sa
+construction (identifiant plus grand que le dernier de l'index) sont
+toujours candidats.
+"""
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from .inverted_index import Vocabulary
+from .models import Book
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT} | (
+    {sre_parse.POSSESSIVE_REPEAT} if hasattr(sre_parse, "POSSESSIVE_REPEAT") else set()
+)
+
+
+def _literal_runs(parsed, runs, current):
+    """Ajoute à `runs` les suites de caractères littéraux imposées par la regex."""
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            current.append(chr(av))
+        elif op is sre_parse.AT:
+            continue  # Ancre (^, $, \b) : ne consomme aucun caractère
+        elif op is sre_parse.SUBPATTERN:
+            current = _literal_runs(av[-1], runs, current)
+        else:
+            runs.append("".join(current))
+            current = []
+            if op in REPEATS and av[0] >= 1:
+                # Le motif répété apparaît au moins une fois
+                runs.append("".join(_literal_runs(av[2], runs, [])))
+    return current
+
+
+def required_trigrams(pattern):
+    """Trigrammes (en minuscules) présents dans tout texte correspondant à la regex."""
+    runs = []
+    runs.append("".join(_literal_runs(sre_parse.parse(pattern), runs, [])))
+    return {run.lower()[i:i + 3] for run in runs for i in range(len(run) - 2)}
+
+
+def literal_prefix(pattern):
+    """Préfixe littéral d'une regex ancrée au début (`^abc...`), sinon chaîne vide."""
+    prefix = []
+    parsed = list(sre_parse.parse(pattern))
+    if not parsed or parsed[0][0] is not sre_parse.AT or parsed[0][1] not in (
+            sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING):
+        return ""
+    for op, av in parsed[1:]:
+        if op is not sre_parse.LITERAL:
+            break
+        prefix.append(chr(av))
+    # Un quantificateur peut porter sur le dernier caractère (ex. `^abc?`)
+    if len(prefix) < len(parsed) - 1 and parsed[len(prefix) + 1][0] in REPEATS:
+        prefix = prefix[:-1]
+    return "".join(prefix)
+
+
+def text_trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Bitsets « trigramme -> livres » (une ligne de bits par trigramme)."""
+
+    def __init__(self, trigrams, bitsets, doc_ids):
+        self.trigrams = trigrams
+        self.bitsets = bitsets
+        self.doc_ids = doc_ids
+
+    @classmethod
+    def from_books(cls, books=None):
+        if books is None:
+            books = Book.objects.filter(text_content__isnull=False).order_by("id")
+        doc_ids, rows = [], {}
+        for book_id, text in books.values_list("id", "text_content").iterator(chunk_size=50):
+            for trigram in text_trigrams(text or ""):
+                rows.setdefault(trigram, []).append(len(doc_ids))
+            doc_ids.append(book_id)
+
+        terms = sorted(rows, key=lambda trigram: trigram.encode("utf-8"))
+        bitsets = np.zeros((len(terms), (len(doc_ids) + 7) // 8), dtype=np.uint8)
+        for i, trigram in enumerate(terms):
+            positions = np.array(rows.pop(trigram), dtype=np.int64)
+            np.bitwise_or.at(bitsets[i], positions >> 3, (128 >> (positions & 7)).astype(np.uint8))
+        return cls(Vocabulary.from_terms(terms), bitsets, np.array(doc_ids, dtype=np.uint32))
+
+    def save(self, path):
+        """Écrit l'index dans `path` en remplaçant l'ancien de façon atomique."""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "trigrams_data.npy"), self.trigrams.data)
+        np.save(os.path.join(tmp_path, "trigrams_offsets.npy"), self.trigrams.offsets)
+        np.save(os.path.join(tmp_path, "bitsets.npy"), self.bitsets)
+        np.save(os.path.join(tmp_path, "doc_ids.npy"), self.doc_ids)
+        old_path = f"{path}.old"
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def open(cls, path):
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        return cls(Vocabulary(load("trigrams_data"), load("trigrams_offsets")), load("bitsets"), load("doc_ids"))
+
+    def candidates(self, pattern):
+        """Livres pouvant correspondre à la regex, ou None si elle n'impose aucun trigramme."""
+        trigrams = required_trigrams(pattern)
+        if not trigrams:
+            return None
+        rows = [self.trigrams.find(trigram) for trigram in trigrams]
+        if min(rows) < 0:
+            return np.zeros(0, dtype=np.uint32)
+        matches = np.bitwise_and.reduce(self.bitsets[rows], axis=0)
+        return self.doc_ids[np.flatnonzero(np.unpackbits(matches)[:len(self.doc_ids)])]
+
+
+_trigram_index = None
+_trigram_mtime = None
+_trigram_lock = threading.Lock()
+
+
+def trigram_index_path():
+    directory = getattr(settings, "SEARCH_SEGMENTS_DIR", None)
+    return os.path.join(directory, "trigrams") if directory else None
+
+
+def get_trigram_index():
+    """Index de trigrammes du processus courant (rechargé s'il a été reconstruit), ou None."""
+    global _trigram_index, _trigram_mtime
+    path = trigram_index_path()
+    if not path or not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _trigram_index is None or mtime != _trigram_mtime:
+        with _trigram_lock:
+            try:
+                _trigram_index, _trigram_mtime = TrigramIndex.open(path), mtime
+            except (OSError, ValueError) as e:
+                logging.error(f"Impossible d'ouvrir l'index de trigrammes : {e}")
+                return None
+    return _trigram_index
+
+
+def regex_search_books(pattern, max_results):
+    """Livres dont le texte correspond à la regex.
+
+    Retourne `(book_ids, partial)` : `partial` est vrai si le nombre maximal
+    de candidats (`ADVANCED_SEARCH_MAX_CANDIDATES`) ou le budget de temps
+    (`ADVANCED_SEARCH_TIME_BUDGET`, en secondes) a été atteint.
+    """
+    regex = re.compile(pattern)
+    max_candidates = getattr(settings, "ADVANCED_SEARCH_MAX_CANDIDATES", 500)
+    time_budget = getattr(settings, "ADVANCED_SEARCH_TIME_BUDGET", 2.0)
+    trigram_index = get_trigram_index()
+    candidates = trigram_index.candidates(pattern) if trigram_index is not None else None
+    if candidates is not None:
+        # Livres ajoutés après la construction de l'index de trigrammes : vérifiés directement
+        last_id = int(trigram_index.doc_ids[-1]) if len(trigram_index.doc_ids) else 0
+        newer = Book.objects.filter(id__gt=last_id, text_content__isnull=False).order_by("id")
+        candidates = np.concatenate([candidates, np.array(list(newer.values_list("id", flat=True)),
+                                                          dtype=candidates.dtype)])
+
+    if candidates is None:
+        # Pas de préfiltre possible : la base parcourt les textes, sous limite de temps
+        books = Book.objects.filter(text_content__regex=pattern).values_list("id", flat=True)[:max_results]
+        try:
+            with transaction.atomic():
+                if connection.vendor == "postgresql":
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET LOCAL statement_timeout = %s", [int(time_budget * 1000)])
+                return list(books), False
+        except OperationalError:
+            if connection.vendor == "postgresql":  # statement_timeout dépassé
+                return [], True
+            raise
+
+    partial = len(candidates) > max_candidates
+    candidates = candidates[:max_candidates].tolist()
+    deadline = time.monotonic() + time_budget
+    matches = []
+    for start in range(0, len(candidates), 20):
+        if time.monotonic() > deadline:
+            partial = True
+            break
+        texts = Book.objects.filter(id__in=candidates[start:start + 20]).values_list("id", "text_content")
+        matches.extend(book_id for book_id, text in texts if text and regex.search(text))
+        if len(matches) >= max_results:
+            break
+    return sorted(matches)[:max_results], partial
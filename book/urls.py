@@ -1,7 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .book_views import BookListView, BookDetailView, BookSearchView, BookAdvancedSearchView, BookHighlightSearchView
+from .book_views import BookListView, BookDetailView, BookSearchView, BookAdvancedSearchView, BookHighlightSearchView, BookSimilarView, BookTextView, SearchCacheStatsView
 from .author_views import AuthorListView, AuthorDetailView
+from .term_views import SuggestView, TermListView
+from .async_views import AsyncBookAdvancedSearchView, AsyncBookSearchView
 
 
 
@@ -10,7 +12,14 @@ urlpatterns = [
     path('authors/<int:pk>/', AuthorDetailView.as_view(), name='author-detail'),
     path('books/', BookListView.as_view(), name='book-list'),
     path('books/<int:pk>/', BookDetailView.as_view(), name='book-detail'),
+    path('books/<int:pk>/text/', BookTextView.as_view(), name='book-text'),
+    path('books/<int:pk>/similar/', BookSimilarView.as_view(), name='book-similar'),
     path('books/search/', BookSearchView.as_view(), name='book-search'),
     path('books/advanced-search/', BookAdvancedSearchView.as_view(), name='advanced-search'),
     path('books/highlight-search/', BookHighlightSearchView.as_view(), name='book-highlight-search'),
+    path('books/terms/', TermListView.as_view(), name='term-list'),
+    path('books/suggest/', SuggestView.as_view(), name='book-suggest'),
+    path('books/async/search/', AsyncBookSearchView.as_view(), name='async-book-search'),
+    path('books/async/advanced-search/', AsyncBookAdvancedSearchView.as_view(), name='async-advanced-search'),
+    path('books/search/cache-stats/', SearchCacheStatsView.as_view(), name='search-cache-stats'),
 ]
\ No newline at end of file
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mygutenberg.settings')
 
 application = get_asgi_application()
+
+# Charger l'index inversé en mémoire au démarrage du worker
+from book.inverted_index import load_index  # noqa: E402
+
+load_index()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -104,6 +105,15 @@ DATABASES = {
     }
 }
 
+# Base SQLite locale au lieu de PostgreSQL (benchmarks, développement) : MYGUTENBERG_SQLITE=chemin/base.sqlite3
+if os.environ.get('MYGUTENBERG_SQLITE'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ['MYGUTENBERG_SQLITE'],
+        }
+    }
+
 
 
 # Password validation
@@ -148,4 +158,68 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # CORS settings
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Moteur de recherche
+# Index inversé chargé en mémoire dans chaque worker (repli sur l'ORM si désactivé)
+SEARCH_INMEMORY_INDEX = True
+# Conserver les positions des mots (surlignage) dans l'index en mémoire
+SEARCH_INDEX_POSITIONS = True
+# Délai (en secondes) avant un nouvel essai de chargement de l'index après un échec (base pas prête)
+SEARCH_INDEX_RETRY_INTERVAL = 30
+# Segments d'index sur disque, partagés entre workers par mmap (prioritaires sur la table Index)
+SEARCH_SEGMENTS_DIR = BASE_DIR / 'index_segments'
+# Fréquence (en secondes) de vérification du manifeste des segments par les workers
+SEARCH_SEGMENTS_CHECK_INTERVAL = 10
+# Nombre de segments à partir duquel fetch_index.py lance une fusion
+SEARCH_SEGMENTS_MERGE_THRESHOLD = 8
+# Paramètres du classement BM25
+SEARCH_BM25_K1 = 1.2
+SEARCH_BM25_B = 0.75
+# Langue d'analyse des requêtes sans `?lang=` quand la base ne contient aucun livre
+# (sinon les requêtes sont analysées dans toutes les langues des livres)
+SEARCH_DEFAULT_LANGUAGE = 'en'
+# Bonus de proximité des requêtes de plusieurs mots : score * (1 + poids * mots / plus petite fenêtre),
+# calculé pour les meilleurs livres seulement
+SEARCH_PROXIMITY_WEIGHT = 0.5
+SEARCH_PROXIMITY_CANDIDATES = 100
+# Recherche approchée (fuzzy=1) : distance de Levenshtein maximale, pénalité par modification,
+# nombre maximal de termes proches par mot et nombre minimal de livres d'un terme proposé
+SEARCH_FUZZY_MAX_DISTANCE = 2
+SEARCH_FUZZY_PENALTY = 0.5
+SEARCH_FUZZY_MAX_EXPANSIONS = 50
+SEARCH_FUZZY_MIN_DOCUMENT_FREQUENCY = 2
+# Surlignage : nombre d'extraits par livre et taille d'un extrait (en caractères)
+HIGHLIGHT_SNIPPETS = 3
+HIGHLIGHT_SNIPPET_SIZE = 200
+# Signatures MinHash (/books/<pk>/similar/) : nombre de fonctions de hachage et de bandes LSH.
+# Avec r = NUM_PERM / BANDS lignes par bande, le seuil de similarité est proche de (1 / BANDS) ** (1 / r).
+MINHASH_NUM_PERM = 128
+MINHASH_BANDS = 64
+# Recherche par regex : nombre maximal de livres candidats vérifiés et budget de temps (secondes)
+ADVANCED_SEARCH_MAX_CANDIDATES = 500
+ADVANCED_SEARCH_TIME_BUDGET = 2.0
+# Nombre maximal de termes du vocabulaire retenus pour une regex
+ADVANCED_SEARCH_MAX_TERMS = 1000
+# Import des livres (Scripts/fetch_books.py) : connexions HTTP simultanées, requêtes par seconde
+# et par hôte, livres par écriture en base et fichier de reprise
+HARVEST_CONCURRENCY = 10
+HARVEST_RATE_LIMIT = 5
+HARVEST_BATCH_SIZE = 50
+HARVEST_CHECKPOINT = BASE_DIR / 'harvest_checkpoint.json'
+# Stockage compressé des textes complets hors de la ligne Book : None, 'gzip' ou 'zstd' (paquet zstandard).
+# Sans stockage, seuls les 100 000 premiers caractères sont conservés et le téléchargement s'arrête là.
+BOOK_TEXT_COMPRESSION = None
+# Cache des résultats de recherche (book/cache.py) : réponses gardées en mémoire par worker,
+# alias optionnel d'un cache partagé de CACHES (ex. Redis) et durée de vie dans ce cache (secondes).
+# Les entrées sont invalidées par la génération de l'index, relue au plus toutes les N secondes.
+SEARCH_CACHE_SIZE = 1000
+SEARCH_CACHE_BACKEND = None
+SEARCH_CACHE_TIMEOUT = 300
+SEARCH_CACHE_GENERATION_CHECK_INTERVAL = 2
+# Vues de recherche asynchrones (ASGI) : échéance par requête en secondes, au-delà de laquelle
+# les sous-requêtes en cours sont abandonnées et la réponse est marquée partielle
+SEARCH_ASYNC_DEADLINE = 2.0
+# Suggestions (/books/suggest/) : nombre de mots précalculés pour les préfixes d'au plus N caractères
+SUGGEST_TOP_K = 20
+SUGGEST_PRECOMPUTED_PREFIX_LENGTH = 2
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mygutenberg.settings')
 
 application = get_wsgi_application()
+
+# Charger l'index inversé en mémoire au démarrage du worker
+from book.inverted_index import load_index  # noqa: E402
+
+load_index()